@@ -1,50 +1,168 @@
+import argparse
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from pathlib import Path
+from catalogue import Catalogue
 
 # === File paths ===
 COMPARE_CSV = "group_comparison_results.csv"
-INVENTORY_XLSX = "D:/workspace/working_inventory - Copy.xlsx"
-OUTPUT_XLSX = "working_inventory_with_actions.xlsx"
+INVENTORY_PATH = "D:/workspace/working_inventory - Copy.xlsx"
+OUTPUT_PATH = "working_inventory_with_actions.csv"
+CHUNK_ROWS = 100_000  # Rows per CSV write / Parquet row group
+EXCEL_MAX_ROWS = 1_048_575  # Sheet limit minus the header row
 
-# === Step 1: Load data ===
-compare_df = pd.read_csv(COMPARE_CSV)
-inventory_df = pd.read_excel(INVENTORY_XLSX, engine="openpyxl")
 
-# === Step 2: Filter for exact matches and collect file groups ===
-exact_matches = compare_df[compare_df["Result"] == "Exact match"]
+# === Inventory I/O: .parquet (typed, column-projected), .sqlite catalogue, .csv or .xlsx ===
+def load_inventory(path, columns=None):
+    suffix = Path(path).suffix.lower()
+    if suffix in (".sqlite", ".db"):
+        with Catalogue(path) as catalogue:
+            labels, rows = catalogue.inventory_rows(columns)
+            return pd.DataFrame(list(rows), columns=labels)
+    if suffix == ".parquet":
+        return pd.read_parquet(path, columns=columns)
+    if suffix == ".csv":
+        return pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False)
+    return pd.read_excel(path, engine="openpyxl", usecols=columns)
+
+
+def _chunks(df, size=CHUNK_ROWS):
+    for start in range(0, len(df), size):
+        yield df.iloc[start:start + size]
+
+
+# --- Streamed writers: the output is written chunk by chunk, never as one more full copy of the table ---
+def _write_csv(df, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for i, chunk in enumerate(_chunks(df)):
+            chunk.to_csv(f, index=False, header=i == 0)
+
+
+def _write_parquet(df, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(str(path), schema, compression="zstd") as writer:
+        for chunk in _chunks(df):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_xlsx(df, path):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)  # Rows go straight to the sheet XML, no cell objects kept
+    sheet = workbook.create_sheet()
+    sheet.append(list(df.columns))
+    for chunk in _chunks(df):
+        # Blank cells for NaN/NaT, which openpyxl would otherwise write as invalid numbers
+        for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+    workbook.save(path)
+
 
-group_to_files = defaultdict(set)
+def save_inventory(df, path):
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix in (".xlsx", ".xlsm") and len(df) > EXCEL_MAX_ROWS:
+        path = path.with_suffix(".csv")
+        print(f"⚠️ {len(df)} rows exceed Excel's sheet limit; writing CSV instead")
+        suffix = ".csv"
+    if suffix == ".parquet":
+        _write_parquet(df, path)
+    elif suffix in (".xlsx", ".xlsm"):
+        _write_xlsx(df, path)
+    else:
+        _write_csv(df, path)
+    return path
 
-for _, row in exact_matches.iterrows():
-    group = row["Group_ID"]
-    group_to_files[group].add(row["File_1"])
-    group_to_files[group].add(row["File_2"])
 
-# === Step 3: Build action map using File_1 as canonical ===
-action_map = {}
+# --- Join key: either separator; only Windows drive paths (C:\...) are case-folded, since on the
+# --- case-sensitive archive volumes Report.xls and report.xls are different files ---
+def normalize_paths(paths):
+    paths = paths.astype(str).str.strip().str.replace("\\", "/", regex=False)
+    drive = paths.str.match(r"[A-Za-z]:/", na=False)
+    return paths.where(~drive, paths.str.lower())
 
-for _, row in exact_matches.iterrows():
-    file_1 = str(row["File_1"]).strip().replace("/", "\\")
-    file_2 = str(row["File_2"]).strip().replace("/", "\\")
 
-    action_map[file_1] = "Keep"  # always keep File_1
-    if file_2 != file_1:
-        action_map[file_2] = "Delete"  # delete duplicates
+# === Union-find over exact-match pairs, vectorised ===
+def component_roots(left, right, n):
+    """Every node ends up pointing at the smallest node of its connected component."""
+    parent = np.arange(n)
+    while True:
+        root_left, root_right = parent[left], parent[right]
+        if (root_left == root_right).all():
+            return parent
+        # Hook each root onto the smaller root across its edges
+        low = np.minimum(root_left, root_right)
+        np.minimum.at(parent, root_left, low)
+        np.minimum.at(parent, root_right, low)
+        # Pointer jumping until every node points straight at a root
+        while True:
+            jumped = parent[parent]
+            if (jumped == parent).all():
+                break
+            parent = jumped
 
-# Normalize paths in Full_Path to match the keys
-inventory_df["Normalized_Path"] = inventory_df["Full_Path"].str.strip().replace("/", "\\", regex=False)
-inventory_df["Action"] = inventory_df["Normalized_Path"].map(action_map).fillna("")
-inventory_df.drop(columns=["Normalized_Path"], inplace=True)
 
-missing_paths = set(action_map.keys()) - set(inventory_df["Full_Path"].str.strip().replace("/", "\\", regex=False))
-if missing_paths:
+# --- One row per file in an exact-match chain: Keep for one canonical file per component, Delete for the rest ---
+def assign_actions(exact_matches, inventory_keys):
+    pairs = exact_matches[["File_1", "File_2"]].dropna()
+    # Interleaved File_1, File_2, File_1, ... so codes follow first appearance: the
+    # smallest code in a chain is the File_1 of its earliest pair, as before
+    originals = pd.Series(pairs.to_numpy().ravel())
+    codes, paths = pd.factorize(normalize_paths(originals), sort=False)
+    roots = component_roots(codes[0::2], codes[1::2], len(paths))
+    first_seen = np.unique(codes, return_index=True)[1]
+
+    members = pd.DataFrame({"Normalized_Path": paths, "Code": np.arange(len(paths)), "Root": roots,
+                            "Original_Path": originals.to_numpy()[first_seen]})
+    members = members.merge(inventory_keys.drop_duplicates().rename("Normalized_Path").to_frame(),
+                            on="Normalized_Path", how="left", indicator="Found", sort=False)
+    members["Found"] = members["Found"].eq("both")
+
+    # Canonical copy: the earliest-appearing file of each chain that is actually in the inventory
+    found = members[members["Found"]]
+    canonical = found.groupby("Root")["Code"].min()
+    found = found.assign(Action=np.where(found["Code"].to_numpy() == canonical.reindex(found["Root"]).to_numpy(),
+                                         "Keep", "Delete"))
+    # Missing files are reported as written in the comparison results
+    return found[["Normalized_Path", "Action"]], members.loc[~members["Found"], "Original_Path"]
+
+
+parser = argparse.ArgumentParser(description="Mark exact duplicates in the inventory as Keep/Delete.")
+parser.add_argument("--compare", default=COMPARE_CSV, help="Results from batch_compare_groups.py")
+parser.add_argument("--inventory", default=INVENTORY_PATH, help="Inventory (.parquet, .csv or .xlsx) or catalogue (.sqlite)")
+parser.add_argument("--output", default=OUTPUT_PATH,
+                    help="Where to write the inventory with actions (.csv, .parquet, or .xlsx up to Excel's row limit)")
+parser.add_argument("--columns", nargs="+",
+                    help="Only load and write these inventory columns (Full_Path is always included)")
+args = parser.parse_args()
+
+# === Step 1: Load data ===
+compare_df = pd.read_csv(args.compare, usecols=["Group_ID", "File_1", "File_2", "Result"], dtype=str)
+columns = None
+if args.columns:
+    columns = ["Full_Path"] + [c for c in args.columns if c != "Full_Path"]
+inventory_df = load_inventory(args.inventory, columns)
+
+# === Step 2: Chain exact matches (A=B, B=C) into one component per set of identical files ===
+exact_matches = compare_df[compare_df["Result"] == "Exact match"]
+inventory_keys = normalize_paths(inventory_df["Full_Path"])
+actions, missing_paths = assign_actions(exact_matches, inventory_keys)
+
+# === Step 3: Join actions onto the inventory by normalised path ===
+inventory_df = (inventory_df.assign(Normalized_Path=inventory_keys.to_numpy())
+                .merge(actions, on="Normalized_Path", how="left", sort=False)
+                .drop(columns=["Normalized_Path"]))
+inventory_df["Action"] = inventory_df["Action"].fillna("")
+
+if len(missing_paths):
     print("⚠️ These paths from the comparison results weren't found in the inventory:")
     for path in sorted(missing_paths):
         print("-", path)
 
+# === Step 4: Save updated inventory (format follows the output extension) ===
+output_path = save_inventory(inventory_df, args.output)
 
-# === Step 5: Save updated inventory as XLSX ===
-inventory_df.to_excel(OUTPUT_XLSX, index=False)
-
-print(f"✅ Done. Output saved to: {OUTPUT_XLSX}")
-print(f"📊 Summary: {list(action_map.values()).count('Keep')} kept, {list(action_map.values()).count('Delete')} marked for deletion.")
+action_counts = actions["Action"].value_counts()
+print(f"✅ Done. Output saved to: {output_path}")
+print(f"📊 Summary: {action_counts.get('Keep', 0)} kept, {action_counts.get('Delete', 0)} marked for deletion.")
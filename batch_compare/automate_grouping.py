@@ -1,52 +1,121 @@
+import argparse
 import pandas as pd
 from pathlib import Path
-from collections import defaultdict
+from catalogue import Catalogue
 
 # === CONFIGURATION ===
 INPUT_PATH = "D:/workspace/xls_to_convert.csv"
 OUTPUT_PATH = Path(__file__).resolve().parent.parent / "batch_compare" / "comparison_groups.xlsx"
+EXCEL_MAX_ROWS = 1_048_575  # Sheet limit minus the header row
+
+# === GROUPING KEYS: files sharing every listed column form a group ===
+GROUP_KEYS = {
+    "name": ["Base_Name"],
+    "name+parent": ["Base_Name", "Parent"],  # Same file name in a same-named folder, whatever the grandparent
+    "size": ["Size"],
+    "hash": ["Content_Hash"],
+}
+# Inventory columns behind the non-path keys
+INVENTORY_COLUMNS = {"Size": "Size_(bytes)", "Content_Hash": "Content_Hash"}
+CATALOGUE_COLUMNS = {"Size": "size", "Content_Hash": "content_hash"}
+
+parser = argparse.ArgumentParser(description="Group files for batch_compare_groups.py.")
+parser.add_argument("--input", default=INPUT_PATH,
+                    help="Headerless CSV of paths, or an inventory (.csv with header, .parquet) from file_inventory.py")
+parser.add_argument("--output", default=str(OUTPUT_PATH),
+                    help="Where to write the groups (.xlsx, or .csv/.parquet for large lists)")
+parser.add_argument("--catalogue", help="SQLite catalogue from file_inventory.py; replaces --input")
+parser.add_argument("--ext", nargs="+", help="With --catalogue, only group these extensions (e.g. .xls .xlsx)")
+parser.add_argument("--key", nargs="+", choices=GROUP_KEYS, default=["name+parent"],
+                    help="What files must share to be grouped; several keys combine (e.g. --key name size)")
+args = parser.parse_args()
+OUTPUT_PATH = Path(args.output)
 OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-# === LOAD AND PARSE PATHS ===
-df = pd.read_csv(INPUT_PATH, header=None, names=["File_Path"], encoding="latin1")
-df["File_Path"] = df["File_Path"].astype(str)
+key_columns = list(dict.fromkeys(column for key in args.key for column in GROUP_KEYS[key]))
+extra_columns = [column for column in key_columns if column in INVENTORY_COLUMNS]
+
+
+# === LOAD PATHS (plus size / content hash when a key needs them) ===
+def load_paths(path):
+    path = Path(path)
+    wanted = ["Full_Path"] + [INVENTORY_COLUMNS[column] for column in extra_columns]
+    if path.suffix.lower() == ".parquet":
+        df = pd.read_parquet(path, columns=wanted)
+    else:
+        # Inventories from file_inventory.py / find_duplicates.py are UTF-8 (utf-8-sig drops a BOM);
+        # only the legacy headerless path list is latin1
+        with open(path, encoding="utf-8-sig", errors="replace") as f:
+            has_header = f.readline().startswith("Full_Path")
+        if has_header:
+            df = pd.read_csv(path, usecols=wanted, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        elif extra_columns:
+            raise SystemExit(f"❌ Error: --key {' '.join(args.key)} needs an inventory with "
+                             f"{', '.join(wanted[1:])}, not a plain path list.")
+        else:
+            return pd.read_csv(path, header=None, names=["File_Path"], dtype=str, encoding="latin1")
+    return df.rename(columns={"Full_Path": "File_Path", **{v: k for k, v in INVENTORY_COLUMNS.items()}})
 
-def extract_parts(path_str):
-    p = Path(path_str)
-    return {
-        "Base_Name": p.name.strip().lower(),
-        "Parent": p.parent.name.strip().lower(),
-        "Grandparent": p.parent.parent.name.strip().lower()
-    }
 
-df_parts = df["File_Path"].apply(extract_parts).apply(pd.Series)
-df = pd.concat([df, df_parts], axis=1)
+def load_catalogue(catalogue_path):
+    with Catalogue(catalogue_path) as catalogue:
+        if key_columns == GROUP_KEYS["name+parent"]:
+            # Same-name/same-parent candidates come from an indexed query; nothing else is loaded
+            rows = [(path,) for _, _, path in catalogue.same_name_groups(args.ext)]
+        else:
+            columns = ["full_path"] + [CATALOGUE_COLUMNS[column] for column in extra_columns]
+            rows = list(catalogue.find(columns, extensions=args.ext))
+    return pd.DataFrame(rows, columns=["File_Path"] + extra_columns)
 
-# === GROUPING ===
-rows = []
-group_counter = 1
 
-for base_name, group_df in df.groupby("Base_Name"):
-    # Create (Grandparent, Parent) mapping
-    parent_map = defaultdict(list)
-    for _, row in group_df.iterrows():
-        parent_map[(row["Grandparent"], row["Parent"])].append(row["File_Path"])
+# === PATH PARTS: one vectorised split of every path, either separator ===
+def add_path_parts(df):
+    parts = df["File_Path"].str.replace("\\", "/", regex=False).str.rsplit("/", n=2)
+    return df.assign(**{
+        column: parts.str.get(position).fillna("").str.strip().str.lower()
+        for column, position in (("Base_Name", -1), ("Parent", -2))
+    })
 
-    # Now merge groups that have different grandparents but same parent name
-    merged_groups = defaultdict(list)
 
-    for (grandparent, parent), files in parent_map.items():
-        merged_groups[parent].extend(files)
+# === GROUPING: one groupby over the key columns, numbered with ngroup ===
+def group_files(df, key_columns):
+    keyed = df.dropna(subset=key_columns)
+    for column in key_columns:
+        # Blank names/hashes and empty files would lump unrelated files together
+        values = keyed[column].astype(str).str.strip()
+        keyed = keyed[values.ne("") & ~(values.eq("0") & (column == "Size"))]
+    keyed = keyed[keyed.groupby(key_columns, sort=False)["File_Path"].transform("size") > 1]
+    group_numbers = keyed.groupby(key_columns, sort=True).ngroup() + 1
+    order = group_numbers.sort_values(kind="stable").index
+    return pd.DataFrame({
+        "Group_ID": "grp_" + group_numbers.astype(str).str.zfill(4),
+        "File_Path": keyed["File_Path"],
+    }).loc[order]
+
+
+def save_groups(grouped_df, output_path):
+    suffix = output_path.suffix.lower()
+    if suffix == ".xlsx" and len(grouped_df) > EXCEL_MAX_ROWS:
+        output_path = output_path.with_suffix(".csv")
+        print(f"⚠️ {len(grouped_df)} rows exceed Excel's sheet limit; writing CSV instead")
+        suffix = ".csv"
+    if suffix == ".csv":
+        grouped_df.to_csv(output_path, index=False)
+    elif suffix == ".parquet":
+        grouped_df.to_parquet(output_path, index=False)
+    else:
+        grouped_df.to_excel(output_path, index=False)
+    return output_path
+
+
+df = load_catalogue(args.catalogue) if args.catalogue else load_paths(args.input)
+df["File_Path"] = df["File_Path"].astype(str)
+if "Base_Name" in key_columns or "Parent" in key_columns:
+    df = add_path_parts(df)
 
-    for file_group in merged_groups.values():
-        if len(file_group) > 1:
-            group_id = f"grp_{group_counter:04d}"
-            for f in file_group:
-                rows.append({"Group_ID": group_id, "File_Path": f})
-            group_counter += 1
+grouped_df = group_files(df, key_columns)
 
 # === SAVE ===
-grouped_df = pd.DataFrame(rows)
-grouped_df.to_excel(OUTPUT_PATH, index=False)
-print(f"✅ Grouping complete. Saved to: {OUTPUT_PATH}")
-print(f"🔢 Total groups: {len(grouped_df['Group_ID'].unique())}")
+OUTPUT_PATH = save_groups(grouped_df, OUTPUT_PATH)
+print(f"✅ Grouping complete ({' + '.join(args.key)}). Saved to: {OUTPUT_PATH}")
+print(f"🔢 Total groups: {grouped_df['Group_ID'].nunique()}")
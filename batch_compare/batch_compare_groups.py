@@ -1,48 +1,245 @@
 import pandas as pd
+import csv
 import itertools
+import os
 import traceback
+import argparse
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, Future
 from pathlib import Path
-from compare_spreadsheets import load_excel, exact_comparison, sorted_comparison, similarity_score
+from compare_spreadsheets import (load_workbook, workbook_exact_comparison, workbook_sorted_comparison,
+                                  workbook_similarity, fingerprint_workbook, configure_cache, DEFAULT_CACHE_BYTES,
+                                  stream_fingerprint_workbook, stream_workbook_similarity)
 
 INPUT_PATH = Path(__file__).resolve().parent / "comparison_groups.xlsx"
 OUTPUT_CSV = Path(__file__).resolve().parent / "group_comparison_results.csv"
+RESULT_COLUMNS = ["Group_ID", "File_1", "File_2", "Result"]
+GROUPS_AHEAD_PER_WORKER = 2  # Fingerprint mode: groups queued per worker beyond the one being collected
 
-df = pd.read_excel(INPUT_PATH)
 
-results = []
+# === Pairwise mode: load both workbooks for every pair ===
+def compare_pair(file1, file2):
+    print(f"➡️ Comparing: {file1} vs {file2}")
+    try:
+        sheets1 = load_workbook(file1)
+        sheets2 = load_workbook(file2)
 
-# Group by Group_ID
-for group_id, group_df in df.groupby("Group_ID"):
-    print(f"\n🔎 Processing group: {group_id}")
-    file_paths = group_df["File_Path"].tolist()
+        if workbook_exact_comparison(sheets1, sheets2):
+            return "Exact match"
+        elif workbook_sorted_comparison(sheets1, sheets2):
+            return "Same data, different order"
+        else:
+            score, _ = workbook_similarity(sheets1, sheets2)
+            return f"Fuzzy match: {score:.2f}%"
 
-    # Compare all pairs in the group
+    except Exception as e:
+        print(f"❌ {e}")
+        print(traceback.format_exc())
+        return f"Error: {e}"
+
+
+def compare_group_pairwise(file_paths):
+    return [(file1, file2, compare_pair(file1, file2)) for file1, file2 in itertools.combinations(file_paths, 2)]
+
+
+# === Fingerprint mode: parse each workbook once, hash-join, and only score the leftovers ===
+def fingerprint_file(path, stream=False):
+    """Return the WorkbookFingerprint (all sheets), or an "Error: ..." string if the workbook can't be read."""
+    try:
+        if stream:
+            return stream_fingerprint_workbook(path)
+        return fingerprint_workbook(load_workbook(path))
+    except Exception as e:
+        print(f"❌ {e}")
+        return f"Error: {e}"
+
+
+def score_pair(file1, file2, print1=None, print2=None, stream=False):
+    # Sheets whose fingerprints already match are counted as identical without a diff
+    print(f"➡️ Scoring: {file1} vs {file2}")
+    try:
+        if stream:
+            score, _ = stream_workbook_similarity(file1, file2, print1, print2)
+        else:
+            score, _ = workbook_similarity(load_workbook(file1), load_workbook(file2), print1, print2)
+        return f"Fuzzy match: {score:.2f}%"
+    except Exception as e:
+        print(f"❌ {e}")
+        return f"Error: {e}"
+
+
+def classify_group(file_paths, prints, score):
+    """Resolve every pair from fingerprints; score(file1, file2, key) handles pairs that still differ."""
+    rows = []
     for file1, file2 in itertools.combinations(file_paths, 2):
-        print(f"➡️ Comparing: {file1} vs {file2}")
+        print1, print2 = prints[file1], prints[file2]
+        if isinstance(print1, str) or isinstance(print2, str):
+            result = print1 if isinstance(print1, str) else print2
+        elif print1[0] == print2[0]:
+            result = "Exact match"
+        elif print1[1] == print2[1]:
+            result = "Same data, different order"
+        else:
+            # Identical workbooks share an exact hash, so one score covers every pair across two hash buckets
+            result = score(file1, file2, (print1[0], print2[0]))
+        rows.append((file1, file2, result))
+    return rows
+
+
+def compare_group_fingerprints(file_paths, stream=False):
+    prints = {path: fingerprint_file(path, stream) for path in dict.fromkeys(file_paths)}
+    scores = {}
+
+    def score(file1, file2, key):
+        if key not in scores:
+            scores[key] = score_pair(file1, file2, prints[file1], prints[file2], stream)
+        return scores[key]
+
+    return classify_group(file_paths, prints, score)
+
+
+# === Multiprocess runs: results are yielded group by group in input order ===
+def run_parallel(groups, fingerprint_mode, workers, cache_bytes, parse_cache, stream=False):
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_cache,
+                             initargs=(cache_bytes, parse_cache)) as pool:
+        if not fingerprint_mode:
+            # One task per group
+            all_paths = [file_paths for _, file_paths in groups]
+            for (group_id, _), rows in zip(groups, pool.map(compare_group_pairwise, all_paths)):
+                yield group_id, rows
+            return
+
+        # Fingerprints are submitted a few groups ahead of the one being collected, so each group is
+        # classified, scored and yielded (and checkpointed) as soon as its own workbooks are done
+        prints = {}
+        scores = {}
+        pending = deque()
+        remaining = iter(groups)
+
+        def submit_next_group():
+            group = next(remaining, None)
+            if group is None:
+                return
+            for path in group[1]:
+                if path not in prints:
+                    prints[path] = pool.submit(fingerprint_file, path, stream)
+            pending.append(group)
+
+        def score(file1, file2, key):
+            if key not in scores:
+                scores[key] = pool.submit(score_pair, file1, file2, prints[file1], prints[file2], stream)
+            return scores[key]
+
+        for _ in range(workers * GROUPS_AHEAD_PER_WORKER):
+            submit_next_group()
+        while pending:
+            group_id, file_paths = pending.popleft()
+            for path in file_paths:
+                if isinstance(prints[path], Future):
+                    prints[path] = prints[path].result()
+            rows = classify_group(file_paths, prints, score)
+            submit_next_group()
+            yield group_id, [(file1, file2, result.result() if isinstance(result, Future) else result)
+                             for file1, file2, result in rows]
+
+
+def run_serial(groups, fingerprint_mode, stream=False):
+    compare_group = partial(compare_group_fingerprints, stream=stream) if fingerprint_mode else compare_group_pairwise
+    for group_id, file_paths in groups:
+        print(f"\n🔎 Processing group: {group_id}")
+        yield group_id, compare_group(file_paths)
+
+
+# === Checkpointing: a group's Group_ID is recorded only after all of its rows are on disk ===
+def checkpoint_path_for(output_csv):
+    return Path(output_csv).with_suffix(".checkpoint")
+
+
+def load_checkpoint(checkpoint_path):
+    if not checkpoint_path.exists():
+        return set()
+    with open(checkpoint_path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def trim_results(output_csv, completed):
+    """Drop rows left behind by a group that was interrupted before it was checkpointed."""
+    output_csv = Path(output_csv)
+    if not output_csv.exists():
+        return
+    tmp_path = output_csv.with_name(output_csv.name + ".tmp")
+    with open(output_csv, newline="", encoding="utf-8") as src, \
+            open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        writer.writerow(next(reader, RESULT_COLUMNS))
+        writer.writerows(row for row in reader if row and row[0] in completed)
+    os.replace(tmp_path, output_csv)
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare every pair of spreadsheets within each group.")
+    parser.add_argument("--input", default=str(INPUT_PATH), help="Grouping workbook or CSV with Group_ID and File_Path")
+    parser.add_argument("--output", default=str(OUTPUT_CSV), help="Where to write the comparison results")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="Parse each workbook once and match by content hash before scoring leftovers")
+    parser.add_argument("--stream", action="store_true",
+                        help="Fingerprint and score row by row without loading whole sheets (implies --fingerprint)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"Worker processes (e.g. {os.cpu_count()} to use every core; 1 = run in-process)")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_BYTES // 1_048_576,
+                        help="Memory budget (per process) for parsed workbooks kept between comparisons")
+    parser.add_argument("--parse-cache", help="Folder for an on-disk parse cache reused across runs")
+    parser.add_argument("--resume", action="store_true",
+                        help="Skip groups already completed by an earlier (interrupted) run and append to its output")
+    args = parser.parse_args()
+    fingerprint_mode = args.fingerprint or args.stream
+
+    cache_bytes = args.cache_mb * 1_048_576
+    configure_cache(max_bytes=cache_bytes, disk_dir=args.parse_cache)
+    # Group lists from find_duplicates.py / find_near_duplicates.py are CSV; automate_grouping.py writes xlsx
+    df = pd.read_csv(args.input) if Path(args.input).suffix.lower() == ".csv" else pd.read_excel(args.input)
+    groups = [(group_id, group_df["File_Path"].tolist()) for group_id, group_df in df.groupby("Group_ID")]
+
+    checkpoint_path = checkpoint_path_for(args.output)
+    if args.resume:
+        completed = load_checkpoint(checkpoint_path)
+        trim_results(args.output, completed)
+        groups = [(group_id, file_paths) for group_id, file_paths in groups if str(group_id) not in completed]
+        print(f"⏩ Resuming: {len(completed)} groups already done, {len(groups)} to go")
+    resuming = args.resume and Path(args.output).exists()
+
+    if args.workers > 1:
+        print(f"⚙️ Comparing {len(groups)} groups on {args.workers} worker processes")
+        group_results = run_parallel(groups, fingerprint_mode, args.workers, cache_bytes, args.parse_cache,
+                                     args.stream)
+    else:
+        group_results = run_serial(groups, fingerprint_mode, args.stream)
+
+    # Append results as each group finishes, then checkpoint it
+    with open(args.output, "a" if resuming else "w", newline="", encoding="utf-8") as f, \
+            open(checkpoint_path, "a" if args.resume else "w", encoding="utf-8") as checkpoint:
+        writer = csv.writer(f)
+        if not resuming:
+            writer.writerow(RESULT_COLUMNS)
         try:
-            df1 = load_excel(file1)
-            df2 = load_excel(file2)
-
-            if exact_comparison(df1, df2):
-                result = "Exact match"
-            elif sorted_comparison(df1, df2):
-                result = "Same data, different order"
-            else:
-                score = similarity_score(df1, df2)
-                result = f"Fuzzy match: {score:.2f}%"
-
-        except Exception as e:
-            print(f"❌ {e}")
-            print(traceback.format_exc())
-            result = f"Error: {e}"
-
-        results.append({
-            "Group_ID": group_id,
-            "File_1": file1,
-            "File_2": file2,
-            "Result": result
-        })
-
-# Save results
-pd.DataFrame(results).to_csv(OUTPUT_CSV, index=False)
-print(f"\n✅ Summary saved to: {OUTPUT_CSV}")
+            for group_id, rows in group_results:
+                writer.writerows((group_id, file1, file2, result) for file1, file2, result in rows)
+                _sync(f)
+                checkpoint.write(f"{group_id}\n")
+                _sync(checkpoint)
+        except KeyboardInterrupt:
+            print("\n⏸️ Interrupted. Completed groups are saved; rerun with --resume to continue.")
+            raise
+
+    print(f"\n✅ Summary saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
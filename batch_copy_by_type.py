@@ -1,78 +1,268 @@
 import os
-import shutil
 import csv
-from pathlib import Path
-from collections import defaultdict
+import sys
+import argparse
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePath
+from typing import NamedTuple
 
-# === Ask for source and extensions ===
-source_input = input("Enter full path to the source folder: ").strip('"')
-SOURCE_DIR = Path(source_input).resolve()
+from copy_engine import CopyEngine, CopyJob, NameRegistry, DEFAULT_STAGE_MODE, STAGE_MODES
+from detect_cache import DetectionCache
+from scan_engine import scan_files, DEFAULT_WORKERS
 
-extensions_input = input("Enter file extensions to isolate (comma-separated, no dots): ")
-extensions = [f".{ext.strip().lower()}" for ext in extensions_input.split(",")]
+try:
+    import magic
+    HAS_MAGIC = True
+except ImportError:
+    HAS_MAGIC = False
 
-# === Define fixed staging and logging paths ===
-EXCLUDE_DIR = SOURCE_DIR / "workspace"
-STAGING_ROOT = SOURCE_DIR / "workspace" / "staging"
-LOG_PATH = STAGING_ROOT / "copy_log.csv"
+# --- MIME classes that can be selected instead of (or as well as) extensions ---
+MIME_CLASSES = {
+    "excel": {
+        "application/vnd.ms-excel",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "application/vnd.ms-excel.sheet.macroenabled.12",
+    },
+    "word": {
+        "application/msword",
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    },
+    "powerpoint": {
+        "application/vnd.ms-powerpoint",
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    },
+    "ole2": {"application/cdfv2", "application/x-ole-storage", "application/vnd.ms-office"},
+    "pdf": {"application/pdf"},
+    "image": {"image/"},
+    "video": {"video/"},
+    "audio": {"audio/"},
+}
 
-# === Prepare folders and logs ===
-STAGING_ROOT.mkdir(parents=True, exist_ok=True)
-log_entries = []
-name_counter = defaultdict(int)
+LOG_NAME = "copy_log.csv"
+DRY_RUN_LOG_NAME = "copy_plan.csv"
 
 
-def is_within_exclude(path):
+class CopySummary(NamedTuple):
+    source: Path
+    planned: int
+    staged: int
+    failed: int
+    methods: dict
+    log_path: Path
+    entries: list
+
+
+# --- Decides which staging folder a file belongs in (None = not selected); shared with pipeline.py ---
+class TypeSelector:
+    def __init__(self, extensions=(), mime_classes=(), cache: DetectionCache | None = None):
+        self.extensions = {f".{ext.strip().lower().lstrip('.')}" for ext in extensions if ext.strip()}
+        unknown = [name for name in mime_classes if name.lower() not in MIME_CLASSES]
+        if unknown:
+            raise ValueError(f"Unknown MIME classes: {', '.join(unknown)} (choose from {', '.join(MIME_CLASSES)})")
+        self.mime_classes = [name.lower() for name in mime_classes]
+        if self.mime_classes and not HAS_MAGIC:
+            raise RuntimeError("python-magic is required to select files by MIME class")
+        self.cache = cache
+
+    def _mime(self, path: str, stat) -> str:
+        def detect():
+            return magic.from_file(path, mime=True)
+        try:
+            if self.cache is not None:
+                return (self.cache.lookup("mime", path, stat, detect) or "").lower()
+            return detect().lower()
+        except Exception:
+            return ""
+
+    def folder_for(self, path: str, stat=None) -> str | None:
+        ext = PurePath(path).suffix.lower()
+        if ext in self.extensions:
+            return ext.strip(".")
+        if self.mime_classes:
+            mime = self._mime(path, stat)
+            for name in self.mime_classes:
+                if any(mime == m or (m.endswith("/") and mime.startswith(m)) for m in MIME_CLASSES[name]):
+                    # Keep the file's own extension as the folder when it has one
+                    return ext.strip(".") or name
+        return None
+
+
+# --- Encode provenance into the staged filename ---
+def staged_name(rel_parts) -> str:
+    return "_".join(rel_parts)
+
+
+# --- Walk source, claim a staging name for every selected file, and return the copy jobs ---
+def plan_copies(source: Path, staging_root: Path, selector: TypeSelector, names: NameRegistry,
+                scan_workers: int = DEFAULT_WORKERS) -> list[CopyJob]:
+    # Skip the workspace (and the staging folder, wherever it is) so staged files are never re-staged
+    excluded = {os.path.normcase(str(source / "workspace")), os.path.normcase(str(staging_root))}
+
+    def prune_dir(entry):
+        return os.path.normcase(entry.path) in excluded
+
+    jobs = []
+    for entry in scan_files(source, prune_dir=prune_dir, workers=scan_workers):
+        folder = selector.folder_for(entry.path, entry.stat)
+        if folder is None:
+            continue
+        ext_dir = staging_root / folder
+        dest_name = names.claim(ext_dir, staged_name(entry.rel_parts))
+        size = entry.stat.st_size if entry.stat is not None else 0
+        jobs.append(CopyJob(Path(entry.path), ext_dir / dest_name, size))
+    return jobs
+
+
+def copy_by_type(source, extensions=(), mime_classes=(), dest=None, workers: int | None = None,
+                 mode: str = DEFAULT_STAGE_MODE, dry_run: bool = False, names: NameRegistry | None = None,
+                 cache: DetectionCache | None = None, label: str | None = None,
+                 write_log: bool = True) -> CopySummary:
+    """Stage every selected file under source into <dest>/<ext>/ and log original → staged paths.
+
+    dest defaults to <source>/workspace/staging. Pass the same NameRegistry to runs
+    that share a destination so they never hand out the same name.
+    """
+    source = Path(source).resolve()
+    staging_root = Path(dest).resolve() if dest else source / "workspace" / "staging"
+    staging_root.mkdir(parents=True, exist_ok=True)
+    selector = TypeSelector(extensions, mime_classes, cache)
+    names = names or NameRegistry()
+
+    jobs = plan_copies(source, staging_root, selector, names)
+    log_entries = []
+    failures = []
+    methods = {}
+
+    if dry_run:
+        log_path = staging_root / DRY_RUN_LOG_NAME
+        log_entries = [(str(job.src), str(job.dst)) for job in jobs]
+        print(f"[DRY RUN] {source}: would stage {len(jobs)} files "
+              f"({sum(job.size for job in jobs) / 1_048_576:.1f} MB) into {staging_root}")
+    else:
+        log_path = staging_root / LOG_NAME
+        engine = CopyEngine(workers=workers, dest=staging_root, mode=mode, label=label)
+        print(f"🚚 {source}: staging {len(jobs)} files ({mode}) with {engine.workers} workers "
+              f"({engine.large_workers} for large files)")
+        for job, error in engine.run(jobs):
+            if error is None:
+                log_entries.append((str(job.src), str(job.dst)))
+            else:
+                failures.append((job.src, error))
+        methods = dict(engine.methods)
+
+    if write_log:
+        write_copy_log(log_path, log_entries)
+    for src_path, error in failures:
+        print(f"⚠️ Failed to copy {src_path}: {error}")
+    return CopySummary(source, len(jobs), 0 if dry_run else len(log_entries), len(failures), methods,
+                       log_path, log_entries)
+
+
+def write_copy_log(log_path: Path, log_entries):
+    with open(log_path, mode='w', newline='', encoding='utf-8') as log_file:
+        writer = csv.writer(log_file)
+        writer.writerow(["original_path", "new_path"])
+        writer.writerows(log_entries)
+
+
+# --- Run several sources at once; each drive gets its own thread (and its own copy pool) ---
+def copy_sources(sources, parallel: bool = True, **options) -> list[CopySummary]:
+    names = NameRegistry()
+    labelled = len(sources) > 1
+
+    def run(source):
+        return copy_by_type(source, names=names, label=str(source) if labelled else None, write_log=False, **options)
+
+    if not parallel or len(sources) == 1:
+        summaries = [run(source) for source in sources]
+    else:
+        with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="source") as pool:
+            summaries = list(pool.map(run, sources))
+
+    # Sources sharing a --dest share one log
+    logs = {}
+    for summary in summaries:
+        logs.setdefault(summary.log_path, []).extend(summary.entries)
+    for log_path, entries in logs.items():
+        write_copy_log(log_path, entries)
+    return summaries
+
+
+# --- Settings from a TOML file; command-line values win ---
+def load_config(path) -> dict:
+    with open(path, "rb") as f:
+        config = tomllib.load(f)
+    known = {"sources", "extensions", "mime_classes", "dest", "workers", "mode", "dry_run", "sequential", "cache"}
+    unknown = set(config) - known
+    if unknown:
+        raise ValueError(f"Unknown keys in {path}: {', '.join(sorted(unknown))}")
+    if isinstance(config.get("sources"), str):
+        config["sources"] = [config["sources"]]
+    return config
+
+
+def _split(value) -> list[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [v.strip() for v in value if v.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stage files of chosen types into workspace/staging/<ext>/.")
+    parser.add_argument("sources", nargs="*", help="Source folders or drives (several run in parallel)")
+    parser.add_argument("--config", help="TOML file with any of: sources, extensions, mime_classes, dest, "
+                                         "workers, mode, dry_run, sequential, cache")
+    parser.add_argument("--ext", help="Extensions to stage (comma-separated, no dots)")
+    parser.add_argument("--mime", help=f"MIME classes to stage (comma-separated: {', '.join(MIME_CLASSES)})")
+    parser.add_argument("--dest", help="Staging folder (default: <source>/workspace/staging)")
+    parser.add_argument("--workers", type=int, help="Copy threads per source (default: sized for the staging drive)")
+    parser.add_argument("--mode", choices=STAGE_MODES, help="reflink (default) = reflink, else copy; auto also tries a hard link")
+    parser.add_argument("--dry-run", action="store_true", default=None, help="Write copy_plan.csv without copying")
+    parser.add_argument("--sequential", action="store_true", default=None, help="Process sources one at a time")
+    parser.add_argument("--cache", help="Detection cache for --mime (SQLite, shared with fix_unix.py)")
+    args = parser.parse_args()
+
+    config = load_config(args.config) if args.config else {}
+    sources = args.sources or config.get("sources") or []
+    extensions = _split(args.ext) or _split(config.get("extensions"))
+    mime_classes = _split(args.mime) or _split(config.get("mime_classes"))
+    if not sources:
+        print("❌ Error: no source folder given (pass it on the command line or as `sources` in --config).")
+        sys.exit(1)
+    if not (extensions or mime_classes):
+        print("❌ Error: nothing selected; pass --ext and/or --mime (or set them in --config).")
+        sys.exit(1)
+    missing = [s for s in sources if not Path(s).exists()]
+    if missing:
+        print(f"❌ Error: {', '.join(missing)} does not exist.")
+        sys.exit(1)
+
     try:
-        path.relative_to(EXCLUDE_DIR)
-        return True
-    except ValueError:
-        return False
-
-
-def safe_filename(base_name, dest_dir):
-    if not (dest_dir / base_name).exists():
-        return base_name
-    stem, ext = os.path.splitext(base_name)
-    while True:
-        name_counter[base_name] += 1
-        candidate = f"{stem}_{name_counter[base_name]}{ext}"
-        if not (dest_dir / candidate).exists():
-            return candidate
-
-
-# === Walk and copy ===
-for root, dirs, files in os.walk(SOURCE_DIR):
-    current_dir = Path(root)
-
-    # Skip the workspace directory itself (prevents recursive self-copying)
-    if is_within_exclude(current_dir):
-        continue
-
-    for file in files:
-        ext = Path(file).suffix.lower()
-        if ext in extensions:
-            src_path = current_dir / file
-            relative_path = src_path.relative_to(SOURCE_DIR)
-
-            # Create destination dir by extension
-            ext_dir = STAGING_ROOT / ext.strip(".")
-            ext_dir.mkdir(parents=True, exist_ok=True)
-
-            # Encode provenance into filename
-            path_parts = list(relative_path.parts)
-            dest_name = "_".join(path_parts)
-            dest_name = safe_filename(dest_name, ext_dir)
-
-            dest_path = ext_dir / dest_name
-            shutil.copy2(src_path, dest_path)
-
-            log_entries.append((str(src_path), str(dest_path)))
-
-# === Write log ===
-with open(LOG_PATH, mode='w', newline='', encoding='utf-8') as log_file:
-    writer = csv.writer(log_file)
-    writer.writerow(["original_path", "new_path"])
-    writer.writerows(log_entries)
-
-print(f"\n✅ Done! {len(log_entries)} files copied.\nLog saved to: {LOG_PATH}")
+        TypeSelector(extensions, mime_classes)
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    def option(name):
+        value = getattr(args, name)
+        return value if value is not None else config.get(name)
+
+    cache_path = option("cache")
+    detect_cache = DetectionCache(cache_path) if cache_path and mime_classes else None
+    try:
+        summaries = copy_sources(
+            [Path(s) for s in sources], parallel=not option("sequential"),
+            extensions=extensions, mime_classes=mime_classes, dest=option("dest"), workers=option("workers"),
+            mode=option("mode") or DEFAULT_STAGE_MODE, dry_run=bool(option("dry_run")), cache=detect_cache,
+        )
+    finally:
+        if detect_cache is not None:
+            detect_cache.close()
+
+    for summary in summaries:
+        methods = ", ".join(f"{count} {method}" for method, count in summary.methods.items())
+        print(f"\n✅ {summary.source}: {summary.staged}/{summary.planned} files staged ({methods or 'none'}), "
+              f"{summary.failed} failed.\nLog saved to: {summary.log_path}")
@@ -0,0 +1,292 @@
+import sqlite3
+import threading
+from pathlib import Path, PureWindowsPath
+from typing import Iterable, Iterator
+
+# --- Default location, next to the inventory and detection cache ---
+DEFAULT_CATALOGUE_PATH = Path("workspace/catalogue.sqlite")
+
+# --- Inventory columns as stored in the catalogue (same order as file_inventory.INVENTORY_COLUMNS) ---
+CATALOGUE_COLUMNS = [
+    'full_path', 'file_name', 'extension', 'has_multiple_dots', 'needs_conversion', 'convert_to',
+    'mime_type', 'is_empty', 'size', 'creation_time', 'modification_time', 'source', 'review_notes',
+]
+
+# --- Matching column headers in the inventory CSV/Parquet ---
+INVENTORY_LABELS = [
+    'Full_Path', 'File_Name', 'Extension', 'Has_Multiple_Dots', 'Needs_Conversion', 'Convert_To',
+    'Mime_Type', 'Is_Empty', 'Size_(bytes)', 'Creation_Time', 'Modification_Time', 'Source', 'Review_Notes',
+]
+
+# --- MIME types libmagic reports for legacy Office / OLE2 workbooks ---
+EXCEL_LIKE_MIMES = (
+    'application/vnd.ms-excel',
+    'application/vnd.ms-office',
+    'application/CDFV2',
+    'application/x-ole-storage',
+)
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS files (
+        full_path TEXT PRIMARY KEY,
+        norm_path TEXT NOT NULL,
+        base_name TEXT NOT NULL,
+        parent TEXT NOT NULL,
+        parent_path TEXT NOT NULL,
+        file_name TEXT,
+        extension TEXT NOT NULL,
+        has_multiple_dots TEXT,
+        needs_conversion TEXT,
+        convert_to TEXT,
+        mime_type TEXT,
+        is_empty TEXT,
+        size INTEGER,
+        creation_time TEXT,
+        modification_time TEXT,
+        source TEXT,
+        review_notes TEXT,
+        content_hash TEXT,
+        scan_id INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_files_norm_path ON files (norm_path);
+    CREATE INDEX IF NOT EXISTS idx_files_name_parent ON files (base_name, parent);
+    CREATE INDEX IF NOT EXISTS idx_files_parent_path ON files (parent_path);
+    CREATE INDEX IF NOT EXISTS idx_files_size ON files (size);
+    CREATE INDEX IF NOT EXISTS idx_files_ext_mime ON files (extension, mime_type);
+    CREATE INDEX IF NOT EXISTS idx_files_mime ON files (mime_type);
+    CREATE INDEX IF NOT EXISTS idx_files_hash ON files (content_hash) WHERE content_hash IS NOT NULL;
+    CREATE TABLE IF NOT EXISTS scans (
+        scan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        root TEXT NOT NULL,
+        started TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+# --- Case- and separator-insensitive form of a path, so Windows and POSIX spellings match ---
+def normalize_path(path: str) -> str:
+    return str(path).strip().replace('\\', '/').lower()
+
+
+# --- Bounds of every norm_path under a folder: "<root>/" up to "<root>0", the next byte after '/',
+# --- so names starting with any character (including ones outside the BMP) fall inside ---
+def subtree_range(root: str) -> tuple[str, str]:
+    prefix = normalize_path(root).rstrip('/') + '/'
+    return prefix, prefix[:-1] + chr(ord('/') + 1)
+
+
+# --- Lower-cased base name, parent folder name and parent path, as automate_grouping.py compares them ---
+def path_parts(path: str) -> tuple[str, str, str]:
+    p = PureWindowsPath(str(path).strip())
+    return p.name.lower(), p.parent.name.lower(), normalize_path(str(p.parent))
+
+
+class Catalogue:
+    """Indexed SQLite copy of the inventory that downstream scripts query instead of rescanning.
+
+    Rows are queued and written in batches, one transaction per batch. Each scan
+    gets a scan_id; finish_scan() drops files under the scanned root that the
+    scan did not see. Safe to share between threads.
+    """
+
+    def __init__(self, db_path=DEFAULT_CATALOGUE_PATH, batch_size: int = 5000):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.scan_id = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # === Writing (file_inventory.py, find_duplicates.py) ===
+    def begin_scan(self, root) -> int:
+        with self._lock:
+            cur = self._conn.execute("INSERT INTO scans (root) VALUES (?)", (str(root),))
+            self._conn.commit()
+            self.scan_id = cur.lastrowid
+        return self.scan_id
+
+    # --- Queue one inventory row (13 values, file_inventory.INVENTORY_COLUMNS order) ---
+    def add(self, row: list):
+        full_path = row[0]
+        base_name, parent, parent_path = path_parts(full_path)
+        size = int(row[8]) if str(row[8]).strip() not in ('', 'None') else None
+        record = (
+            full_path, normalize_path(full_path), base_name, parent, parent_path,
+            row[1], str(row[2]).lower(), row[3], row[4], row[5], row[6] or None, row[7], size,
+            row[9], row[10], row[11], row[12], self.scan_id or 0,
+        )
+        with self._lock:
+            self._pending.append(record)
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        # Upsert keeps the content hash of files whose size and mtime are unchanged
+        with self._conn:
+            self._conn.executemany("""
+                INSERT INTO files (full_path, norm_path, base_name, parent, parent_path, file_name, extension,
+                                   has_multiple_dots, needs_conversion, convert_to, mime_type, is_empty, size,
+                                   creation_time, modification_time, source, review_notes, scan_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (full_path) DO UPDATE SET
+                    file_name = excluded.file_name,
+                    extension = excluded.extension,
+                    has_multiple_dots = excluded.has_multiple_dots,
+                    needs_conversion = excluded.needs_conversion,
+                    convert_to = excluded.convert_to,
+                    mime_type = excluded.mime_type,
+                    is_empty = excluded.is_empty,
+                    content_hash = CASE
+                        WHEN files.size IS excluded.size AND files.modification_time IS excluded.modification_time
+                        THEN files.content_hash END,
+                    size = excluded.size,
+                    creation_time = excluded.creation_time,
+                    modification_time = excluded.modification_time,
+                    source = excluded.source,
+                    review_notes = excluded.review_notes,
+                    scan_id = excluded.scan_id
+            """, self._pending)
+        self._pending.clear()
+
+    # --- Drop files under root that the current scan didn't report; returns how many went ---
+    def finish_scan(self, root) -> int:
+        low, high = subtree_range(root)
+        with self._lock:
+            self._flush_locked()
+            with self._conn:
+                cur = self._conn.execute(
+                    "DELETE FROM files WHERE norm_path >= ? AND norm_path < ? AND scan_id != ?",
+                    (low, high, self.scan_id or 0)
+                )
+        return cur.rowcount
+
+    def set_hashes(self, hashes: dict[str, str]):
+        with self._lock:
+            self._flush_locked()
+            with self._conn:
+                self._conn.executemany("UPDATE files SET content_hash = ? WHERE full_path = ?",
+                                       ((digest, path) for path, digest in hashes.items()))
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # === Queries (all served from the indexes above) ===
+    def _query(self, sql: str, params: Iterable = ()) -> Iterator[tuple]:
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(sql, tuple(params)).fetchall()
+        return iter(rows)
+
+    def find(self, columns: Iterable[str] = ('full_path',), extensions: Iterable[str] | None = None,
+             mime_types: Iterable[str] | None = None, base_name: str | None = None,
+             content_hash: str | None = None, under=None) -> Iterator[tuple]:
+        """Select columns from files matching every filter that is given (extensions use '' for none)."""
+        columns = list(columns)
+        unknown = set(columns) - set(CATALOGUE_COLUMNS) - {'content_hash', 'base_name', 'parent', 'parent_path'}
+        if unknown:
+            raise ValueError(f"Unknown catalogue columns: {sorted(unknown)}")
+
+        clauses, params = [], []
+        if extensions is not None:
+            extensions = [e.lower() for e in extensions]
+            clauses.append(f"extension IN ({', '.join('?' * len(extensions))})")
+            params.extend(extensions)
+        if mime_types is not None:
+            mime_types = list(mime_types)
+            clauses.append(f"mime_type IN ({', '.join('?' * len(mime_types))})")
+            params.extend(mime_types)
+        if base_name is not None:
+            clauses.append("base_name = ?")
+            params.append(base_name.lower())
+        if content_hash is not None:
+            clauses.append("content_hash = ?")
+            params.append(content_hash)
+        if under is not None:
+            clauses.append("norm_path >= ? AND norm_path < ?")
+            params.extend(subtree_range(under))
+
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT {', '.join(columns)} FROM files{where} ORDER BY norm_path", params)
+
+    def inventory_rows(self, labels: Iterable[str] | None = None) -> tuple[list[str], Iterator[tuple]]:
+        """Return (labels, rows) for the given inventory column headers (default: all 13)."""
+        labels = list(labels or INVENTORY_LABELS)
+        to_column = dict(zip(INVENTORY_LABELS, CATALOGUE_COLUMNS))
+        unknown = [label for label in labels if label not in to_column]
+        if unknown:
+            raise ValueError(f"Unknown inventory columns: {unknown}")
+        return labels, self.find([to_column[label] for label in labels])
+
+    def extensionless_excel_like(self) -> Iterator[tuple]:
+        """(full_path, file_name, mime_type) for files with no extension that libmagic saw as Excel/OLE2."""
+        return self.find(('full_path', 'file_name', 'mime_type'), extensions=[''], mime_types=EXCEL_LIKE_MIMES)
+
+    def same_name_groups(self, extensions: Iterable[str] | None = None) -> Iterator[tuple]:
+        """(base_name, parent, full_path) for every base name + parent folder name shared by 2+ files."""
+        inner_where, outer_where, params = "", "", []
+        if extensions is not None:
+            extensions = [e.lower() for e in extensions]
+            marks = ', '.join('?' * len(extensions))
+            inner_where = f"WHERE extension IN ({marks})"
+            outer_where = f"WHERE f.extension IN ({marks})"
+            params = extensions * 2
+        return self._query(f"""
+            SELECT f.base_name, f.parent, f.full_path
+            FROM files f
+            JOIN (SELECT base_name, parent FROM files {inner_where}
+                  GROUP BY base_name, parent HAVING COUNT(*) > 1) g
+              ON f.base_name = g.base_name AND f.parent = g.parent
+            {outer_where}
+            ORDER BY f.base_name, f.parent, f.norm_path
+        """, params)
+
+    def same_name_different_parents(self) -> Iterator[tuple]:
+        """(base_name, parent_path, full_path) for base names found in more than one folder."""
+        return self._query("""
+            SELECT f.base_name, f.parent_path, f.full_path
+            FROM files f
+            JOIN (SELECT base_name FROM files GROUP BY base_name
+                  HAVING COUNT(DISTINCT parent_path) > 1) g ON f.base_name = g.base_name
+            ORDER BY f.base_name, f.norm_path
+        """)
+
+    def duplicate_hash_groups(self) -> Iterator[tuple]:
+        """(content_hash, size, full_path) for content hashes shared by 2+ files."""
+        return self._query("""
+            SELECT content_hash, size, full_path FROM files
+            WHERE content_hash IN (SELECT content_hash FROM files WHERE content_hash IS NOT NULL
+                                   GROUP BY content_hash HAVING COUNT(*) > 1)
+            ORDER BY content_hash, norm_path
+        """)
+
+    def lookup_paths(self, paths: Iterable[str]) -> dict[str, str]:
+        """Map each given path (any separator/case) to the catalogued full_path, skipping unknown ones."""
+        found = {}
+        with self._lock:
+            self._flush_locked()
+            for path in paths:
+                row = self._conn.execute("SELECT full_path FROM files WHERE norm_path = ?",
+                                         (normalize_path(path),)).fetchone()
+                if row:
+                    found[path] = row[0]
+        return found
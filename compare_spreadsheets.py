@@ -1,33 +1,538 @@
 import pandas as pd
 import numpy as np
 import argparse
+import datetime
+import difflib
+import hashlib
+import itertools
+import os
+import pickle
 import sys
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
 
-def load_excel(path):
-    """Load an Excel file and fill NaNs for cleaner comparisons."""
+# Parsed sheets are kept in an LRU bounded by their in-memory size, and optionally
+# pickled to disk, keyed by (path, size, mtime) so edited files are re-read.
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+class _FrameCache:
+    """LRU of parsed sheets bounded by total memory_usage(deep=True)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        # value is one DataFrame (first sheet) or a {sheet_name: DataFrame} dict (whole workbook)
+        frames = value.values() if isinstance(value, dict) else [value]
+        nbytes = sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+        if nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old[1]
+        self._entries[key] = (value, nbytes)
+        self.total_bytes += nbytes
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+_frame_cache = _FrameCache(DEFAULT_CACHE_BYTES)
+_disk_cache_dir = None
+
+def configure_cache(max_bytes=DEFAULT_CACHE_BYTES, disk_dir=None):
+    """Set the in-memory cache bound and (optionally) a folder for the on-disk parse cache."""
+    global _disk_cache_dir
+    _frame_cache.max_bytes = max_bytes
+    _frame_cache.clear()
+    _disk_cache_dir = Path(disk_dir) if disk_dir else None
+    if _disk_cache_dir:
+        _disk_cache_dir.mkdir(parents=True, exist_ok=True)
+
+def _disk_cache_path(abs_path, kind):
+    name = hashlib.blake2b(f"{kind}:{abs_path}".encode("utf-8"), digest_size=16).hexdigest()
+    return _disk_cache_dir / f"{name}.pkl"
+
+def _read_disk_cache(abs_path, kind, key):
+    try:
+        with open(_disk_cache_path(abs_path, kind), "rb") as f:
+            cached_key, value = pickle.load(f)
+        return value if cached_key == key else None
+    except Exception:
+        return None
+
+def _write_disk_cache(abs_path, kind, key, value):
+    # One file per workbook, replaced atomically when the workbook changes
+    target = _disk_cache_path(abs_path, kind)
+    tmp = target.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            pickle.dump((key, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, target)
+    except OSError as e:
+        print(f"⚠️ Could not write parse cache for '{abs_path}': {e}")
+
+def _read_excel(path, **kwargs):
     try:
         if path.endswith(".xls"):
-            return pd.read_excel(path, engine="xlrd").fillna("")
+            return pd.read_excel(path, engine="xlrd", **kwargs)
         else:
-            return pd.read_excel(path).fillna("")
+            return pd.read_excel(path, **kwargs)
     except Exception as e:
         raise RuntimeError(f"Failed to read '{path}': {e}")
 
+def _parse_excel(path):
+    return _read_excel(path).fillna("")
+
+def _parse_workbook(path):
+    # sheet_name=None parses every sheet in one pass over the file
+    return {str(name): df.fillna("") for name, df in _read_excel(path, sheet_name=None).items()}
+
+def _cached_parse(path, kind, parse):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return parse(path)
+
+    abs_path = os.path.abspath(path)
+    key = (kind, abs_path, stat.st_size, stat.st_mtime_ns)
+    value = _frame_cache.get(key)
+    if value is not None:
+        return value
+
+    if _disk_cache_dir:
+        value = _read_disk_cache(abs_path, kind, key)
+    if value is None:
+        value = parse(path)
+        if _disk_cache_dir:
+            _write_disk_cache(abs_path, kind, key, value)
+    _frame_cache.put(key, value)
+    return value
+
+def load_excel(path):
+    """Load the first sheet of an Excel file and fill NaNs for cleaner comparisons.
+
+    Results are cached while the file is unchanged, so treat the returned frame as read-only.
+    """
+    return _cached_parse(path, "first", _parse_excel)
+
+def load_workbook(path):
+    """Load every sheet of an Excel file as {sheet_name: DataFrame} (cached like load_excel)."""
+    return _cached_parse(path, "all", _parse_workbook)
+
 def exact_comparison(df1, df2):
     return df1.equals(df2)
 
 def sorted_comparison(df1, df2):
-    df1_sorted = df1.sort_index(axis=0).sort_index(axis=1)
-    df2_sorted = df2.sort_index(axis=0).sort_index(axis=1)
-    return df1_sorted.equals(df2_sorted)
+    """Same data once columns are sorted by header and rows by content (as fingerprint's sorted hash)."""
+    return _canonical_order(df1).equals(_canonical_order(df2))
+
+def _hash_rows(df):
+    """One uint64 per row covering every cell value in column order."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def _sort_columns(df):
+    return df.iloc[:, sorted(range(df.shape[1]), key=lambda i: str(df.columns[i]))]
+
+def _canonical_order(df):
+    # Rows ordered by their content hash: equal multisets of rows line up whatever the original order
+    sorted_df = _sort_columns(df)
+    row_order = np.argsort(_hash_rows(sorted_df), kind="stable")
+    return sorted_df.iloc[row_order].reset_index(drop=True)
+
+def _digest(df, row_hashes):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr([str(c) for c in df.columns]).encode("utf-8"))
+    h.update(repr([str(t) for t in df.dtypes]).encode("utf-8"))
+    h.update(row_hashes.tobytes())
+    return h.hexdigest()
+
+def fingerprint(df):
+    """Return (exact_hash, sorted_hash) for a sheet.
+
+    Equal exact hashes mean the same headers, dtypes and cells in the same order.
+    Equal sorted hashes mean the same data once columns are sorted by header and
+    rows are taken in any order, so both checks become a hash lookup.
+    """
+    exact_hash = _digest(df, _hash_rows(df))
+    sorted_df = _sort_columns(df)
+    sorted_hash = _digest(sorted_df, np.sort(_hash_rows(sorted_df)))
+    return exact_hash, sorted_hash
+
+class SimilarityReport(NamedTuple):
+    score: float
+    matched_cells: int
+    total_cells: int
+    rows_inserted: int
+    rows_deleted: int
+    cols_inserted: list
+    cols_deleted: list
+
+# Odd 64-bit multipliers used to fold per-cell hashes into one key per row
+_ROW_MIX = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93],
+                    dtype=np.uint64)
+
+def _hash_column(series):
+    """Hash cells in one canonical form whatever the column dtype: numbers as float64, the rest as text.
+
+    A numeric column turns into object dtype after fillna("") in the file that has a
+    blank, so numbers inside object columns must hash like the float column's cells.
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.util.hash_pandas_object(series.astype("float64"), index=False).to_numpy()
+    text_hash = pd.util.hash_pandas_object(series.astype(str), index=False).to_numpy()
+    if series.dtype != object:
+        return text_hash
+    is_number = series.map(lambda v: isinstance(v, (int, float, np.number)) and not isinstance(v, bool))
+    if not is_number.any():
+        return text_hash
+    numbers = pd.to_numeric(series.where(is_number), errors="coerce").astype("float64")
+    number_hash = pd.util.hash_pandas_object(numbers, index=False).to_numpy()
+    return np.where(is_number.to_numpy(), number_hash, text_hash)
+
+def _hash_cells(df, columns):
+    """Hash each cell of the given columns into an (n_rows, n_cols) uint64 matrix.
+
+    Numbers are hashed as float64 so 1 and 1.0 still match, in numeric and mixed
+    object columns alike; other cells go through pandas' value hashing instead of
+    Python object comparisons.
+    """
+    hashed = np.empty((len(df), len(columns)), dtype=np.uint64)
+    for j, column in enumerate(columns):
+        hashed[:, j] = _hash_column(df[column])
+    return hashed
+
+def _row_keys(hashed):
+    mix = np.resize(_ROW_MIX, hashed.shape[1]) + np.arange(hashed.shape[1], dtype=np.uint64) * np.uint64(2)
+    with np.errstate(over="ignore"):
+        return (hashed * mix).sum(axis=1, dtype=np.uint64)
+
+def _common_run(a, b):
+    """Length of the common prefix of two key arrays."""
+    n = min(len(a), len(b))
+    differ = np.flatnonzero(a[:n] != b[:n])
+    return int(differ[0]) if len(differ) else n
+
+def _row_opcodes(keys1, keys2):
+    """difflib opcodes over row keys, with the unchanged head and tail aligned directly.
+
+    autojunk stays off: blank and repeated rows are exactly the keys it would
+    discard on sheets of 200+ rows. Trimming the common prefix/suffix first keeps
+    the quadratic-prone matcher to the part of the sheet that actually changed.
+    """
+    head = _common_run(keys1, keys2)
+    tail = _common_run(keys1[head:][::-1], keys2[head:][::-1])
+    end1, end2 = len(keys1) - tail, len(keys2) - tail
+    if head:
+        yield "equal", 0, head, 0, head
+    if head < end1 or head < end2:
+        matcher = difflib.SequenceMatcher(None, keys1[head:end1].tolist(), keys2[head:end2].tolist(), autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            yield tag, i1 + head, i2 + head, j1 + head, j2 + head
+    if tail:
+        yield "equal", end1, len(keys1), end2, len(keys2)
+
+def similarity_report(df1, df2):
+    """Cell-level similarity that tolerates inserted/deleted rows and columns.
+
+    Columns are aligned by header and rows by a hash of their shared-column
+    content (difflib over row keys, autojunk off), then aligned cells are
+    compared as hashes.
+    The score is matched cells over the larger sheet's cell count.
+    """
+    labels1 = [str(c) for c in df1.columns]
+    labels2 = [str(c) for c in df2.columns]
+    common = [c for c in dict.fromkeys(labels1) if c in set(labels2)]
+    common_set = set(common)
+    cols_deleted = [c for c in labels1 if c not in common_set]
+    cols_inserted = [c for c in labels2 if c not in common_set]
+
+    total_cells = max(df1.size, df2.size)
+    if total_cells == 0:
+        return SimilarityReport(100.0, 0, 0, 0, 0, cols_inserted, cols_deleted)
+    if not common:
+        return SimilarityReport(0.0, 0, total_cells, len(df2), len(df1), cols_inserted, cols_deleted)
+
+    left = df1.set_axis(labels1, axis=1).loc[:, ~pd.Index(labels1).duplicated()]
+    right = df2.set_axis(labels2, axis=1).loc[:, ~pd.Index(labels2).duplicated()]
+    hashed1 = _hash_cells(left, common)
+    hashed2 = _hash_cells(right, common)
+    keys1 = _row_keys(hashed1)
+    keys2 = _row_keys(hashed2)
+
+    matched_cells = 0
+    rows_inserted = rows_deleted = 0
+    pairs1, pairs2 = [], []
+    for tag, i1, i2, j1, j2 in _row_opcodes(keys1, keys2):
+        if tag == "equal":
+            matched_cells += (i2 - i1) * len(common)
+        elif tag == "delete":
+            rows_deleted += i2 - i1
+        elif tag == "insert":
+            rows_inserted += j2 - j1
+        else:
+            # Changed rows are paired in order; any surplus counts as inserted/deleted
+            paired = min(i2 - i1, j2 - j1)
+            pairs1.append(np.arange(i1, i1 + paired))
+            pairs2.append(np.arange(j1, j1 + paired))
+            rows_deleted += (i2 - i1) - paired
+            rows_inserted += (j2 - j1) - paired
+
+    if pairs1:
+        rows1 = np.concatenate(pairs1)
+        rows2 = np.concatenate(pairs2)
+        matched_cells += int(np.count_nonzero(hashed1[rows1] == hashed2[rows2]))
+
+    score = matched_cells / total_cells * 100
+    return SimilarityReport(score, matched_cells, total_cells, rows_inserted, rows_deleted,
+                            cols_inserted, cols_deleted)
 
 def similarity_score(df1, df2):
-    if df1.shape != df2.shape:
-        print(f"⚠️ Shape mismatch: {df1.shape} vs {df2.shape}")
-        return 0.0
-    comparison_array = df1.values == df2.values
-    score = np.sum(comparison_array) / comparison_array.size * 100
-    return score
+    return similarity_report(df1, df2).score
+
+class WorkbookFingerprint(NamedTuple):
+    exact: str
+    sorted: str
+    sheets: dict
+
+def fingerprint_workbook(sheets):
+    """Fingerprint every sheet separately and combine them.
+
+    The exact hash covers sheet names and order; the sorted hash ignores sheet
+    order as well as row and column order within each sheet.
+    """
+    return _combine_sheet_prints({name: fingerprint(df) for name, df in sheets.items()})
+
+def _combine_sheet_prints(sheet_prints):
+    exact = hashlib.blake2b(digest_size=16)
+    for name, sheet_print in sheet_prints.items():
+        exact.update(f"{name}\0{sheet_print[0]}\0".encode("utf-8"))
+    unordered = hashlib.blake2b(digest_size=16)
+    for name in sorted(sheet_prints):
+        unordered.update(f"{name}\0{sheet_prints[name][1]}\0".encode("utf-8"))
+    return WorkbookFingerprint(exact.hexdigest(), unordered.hexdigest(), sheet_prints)
+
+def workbook_exact_comparison(sheets1, sheets2):
+    return list(sheets1) == list(sheets2) and all(exact_comparison(sheets1[n], sheets2[n]) for n in sheets1)
+
+def workbook_sorted_comparison(sheets1, sheets2):
+    """Same sheets holding the same data in any sheet, row or column order.
+
+    Agrees with the sorted hash of fingerprint_workbook: both compare each sheet
+    in the canonical order built by _canonical_order / fingerprint.
+    """
+    return set(sheets1) == set(sheets2) and all(sorted_comparison(sheets1[n], sheets2[n]) for n in sheets1)
+
+def workbook_similarity(sheets1, sheets2, prints1=None, prints2=None):
+    """Return (score, {sheet_name: SimilarityReport}) across all sheets.
+
+    Sheets with identical fingerprints count as fully matching without a diff;
+    only changed sheets go through similarity_report. A sheet present in just
+    one workbook contributes all of its cells as unmatched.
+    """
+    prints1 = prints1 or fingerprint_workbook(sheets1)
+    prints2 = prints2 or fingerprint_workbook(sheets2)
+    matched = total = 0
+    reports = {}
+    for name in dict.fromkeys([*sheets1, *sheets2]):
+        if name not in sheets1 or name not in sheets2:
+            total += (sheets1.get(name) if name in sheets1 else sheets2[name]).size
+            continue
+        if prints1.sheets[name][0] == prints2.sheets[name][0]:
+            matched += sheets1[name].size
+            total += sheets1[name].size
+            continue
+        report = similarity_report(sheets1[name], sheets2[name])
+        reports[name] = report
+        matched += report.matched_cells
+        total += report.total_cells
+    score = matched / total * 100 if total else 100.0
+    return score, reports
+
+# Streaming mode: rows are read lazily (openpyxl read-only for .xlsx, xlrd on-demand
+# for .xls) and hashed/diffed as they arrive, so memory stays at a few rows no matter
+# how large the sheet is. Cells are compared as raw values, so streamed fingerprints
+# are only comparable with other streamed fingerprints.
+MAX_DIFF_SAMPLES = 20
+
+class StreamingWorkbook:
+    """Lazy row access to each sheet of an .xlsx/.xlsm or .xls file."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            if path.lower().endswith(".xls"):
+                import xlrd
+                self._book = xlrd.open_workbook(path, on_demand=True)
+                self._xls = True
+                self.sheet_names = self._book.sheet_names()
+            else:
+                import openpyxl
+                self._book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+                self._xls = False
+                self.sheet_names = self._book.sheetnames
+        except Exception as e:
+            raise RuntimeError(f"Failed to read '{path}': {e}")
+
+    def rows(self, name):
+        """Yield each non-empty row as a list of normalised cell tokens."""
+        if self._xls:
+            import xlrd
+            sheet = self._book.sheet_by_name(name)
+            for i in range(sheet.nrows):
+                values = [
+                    xlrd.xldate_as_datetime(cell.value, self._book.datemode)
+                    if cell.ctype == xlrd.XL_CELL_DATE else cell.value
+                    for cell in sheet.row(i)
+                ]
+                tokens = _row_tokens(values)
+                if tokens:
+                    yield tokens
+            self._book.unload_sheet(name)
+        else:
+            for values in self._book[name].iter_rows(values_only=True):
+                tokens = _row_tokens(values)
+                if tokens:
+                    yield tokens
+
+    def close(self):
+        if self._xls:
+            self._book.release_resources()
+        else:
+            self._book.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def _cell_token(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, (int, float)):
+        return repr(float(value))
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+def _row_tokens(values):
+    tokens = [_cell_token(v) for v in values]
+    while tokens and tokens[-1] == "":
+        tokens.pop()
+    return tokens
+
+def _token_digest(tokens):
+    return hashlib.blake2b("\x1f".join(tokens).encode("utf-8"), digest_size=16).digest()
+
+def stream_fingerprint_sheet(rows):
+    """Return (exact_hash, sorted_hash, cell_count) for an iterable of token rows.
+
+    The first row is treated as the header. The sorted hash reorders cells by
+    header and combines row digests with a commutative sum, so it needs no
+    per-row memory.
+    """
+    exact = hashlib.blake2b(digest_size=16)
+    header = None
+    order = []
+    row_sum = 0
+    row_count = 0
+    cells = 0
+    for tokens in rows:
+        cells += len(tokens)
+        exact.update(_token_digest(tokens))
+        if header is None:
+            header = tokens
+            order = sorted(range(len(header)), key=lambda i: header[i])
+            continue
+        padded = tokens + [""] * (len(header) - len(tokens))
+        by_header = [padded[i] for i in order] + padded[len(header):]
+        row_sum = (row_sum + int.from_bytes(_token_digest(by_header), "little")) % (1 << 128)
+        row_count += 1
+
+    unordered = hashlib.blake2b(digest_size=16)
+    unordered.update("\x1f".join(sorted(header or [])).encode("utf-8"))
+    unordered.update(row_count.to_bytes(8, "little"))
+    unordered.update(row_sum.to_bytes(16, "little"))
+    return exact.hexdigest(), unordered.hexdigest(), cells
+
+def stream_fingerprint_workbook(path):
+    with StreamingWorkbook(path) as book:
+        return _combine_sheet_prints({name: stream_fingerprint_sheet(book.rows(name)) for name in book.sheet_names})
+
+class StreamSheetDiff(NamedTuple):
+    matched_cells: int
+    total_cells: int
+    rows_changed: int
+    rows_only_in_1: int
+    rows_only_in_2: int
+    samples: list
+
+def stream_compare_sheet(rows1, rows2):
+    """Compare two sheets row by row in lockstep, keeping only the current pair of rows."""
+    matched = total = changed = only1 = only2 = 0
+    samples = []
+    for row_number, (tokens1, tokens2) in enumerate(itertools.zip_longest(rows1, rows2), start=1):
+        if tokens2 is None:
+            only1 += 1
+            total += len(tokens1)
+            continue
+        if tokens1 is None:
+            only2 += 1
+            total += len(tokens2)
+            continue
+        width = max(len(tokens1), len(tokens2))
+        total += width
+        if tokens1 == tokens2:
+            matched += width
+            continue
+        padded1 = tokens1 + [""] * (width - len(tokens1))
+        padded2 = tokens2 + [""] * (width - len(tokens2))
+        differing = [i for i in range(width) if padded1[i] != padded2[i]]
+        matched += width - len(differing)
+        changed += 1
+        if len(samples) < MAX_DIFF_SAMPLES:
+            samples.append((row_number, differing))
+    return StreamSheetDiff(matched, total, changed, only1, only2, samples)
+
+def stream_workbook_similarity(path1, path2, prints1=None, prints2=None):
+    """Streaming counterpart of workbook_similarity; only sheets whose fingerprints differ are diffed."""
+    prints1 = prints1 or stream_fingerprint_workbook(path1)
+    prints2 = prints2 or stream_fingerprint_workbook(path2)
+    matched = total = 0
+    diffs = {}
+    with StreamingWorkbook(path1) as book1, StreamingWorkbook(path2) as book2:
+        for name in dict.fromkeys([*prints1.sheets, *prints2.sheets]):
+            if name not in prints1.sheets or name not in prints2.sheets:
+                total += (prints1.sheets.get(name) or prints2.sheets[name])[2]
+                continue
+            if prints1.sheets[name][0] == prints2.sheets[name][0]:
+                matched += prints1.sheets[name][2]
+                total += prints1.sheets[name][2]
+                continue
+            diff = stream_compare_sheet(book1.rows(name), book2.rows(name))
+            diffs[name] = diff
+            matched += diff.matched_cells
+            total += diff.total_cells
+    score = matched / total * 100 if total else 100.0
+    return score, diffs
 
 def difference_report(df1, df2):
     try:
@@ -35,38 +540,86 @@ def difference_report(df1, df2):
     except ValueError as e:
         return f"❌ Cannot compare: {e}"
 
+def stream_main(file1, file2):
+    print("\n🔍 Fingerprinting (streaming)...")
+    prints1 = stream_fingerprint_workbook(file1)
+    prints2 = stream_fingerprint_workbook(file2)
+    print(f"📑 Sheets: {len(prints1.sheets)} vs {len(prints2.sheets)}")
+
+    if prints1.exact == prints2.exact:
+        print("✅ Files are exactly the same (same sheets, same order, same values).")
+        return
+    print("❌ Files differ (at least some values or order).")
+
+    if prints1.sorted == prints2.sorted:
+        print("✅ Files have the same data but in different order.")
+        return
+    print("❌ Files still differ even after sorting.")
+
+    print("\n📊 Computing fuzzy similarity score (row by row)...")
+    score, diffs = stream_workbook_similarity(file1, file2, prints1, prints2)
+    print(f"🔢 Similarity: {score:.2f}% of cells match across all sheets")
+    for name, diff in diffs.items():
+        print(f"\n📄 Sheet '{name}': {diff.matched_cells}/{diff.total_cells} cells match")
+        print(f"   ✏️ Rows changed: {diff.rows_changed} | Only in file 1: {diff.rows_only_in_1} "
+              f"| Only in file 2: {diff.rows_only_in_2}")
+        for row_number, columns in diff.samples:
+            print(f"   ↳ Row {row_number}: columns {', '.join(str(c + 1) for c in columns)} differ")
+
 def main():
     parser = argparse.ArgumentParser(description="Compare two Excel spreadsheets for duplication.")
     parser.add_argument("file1", help="Path to first spreadsheet")
     parser.add_argument("file2", help="Path to second spreadsheet")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read rows lazily instead of loading whole sheets (for very large files)")
     args = parser.parse_args()
 
     file1, file2 = args.file1, args.file2
     print(f"\n📂 Comparing: {file1} ↔ {file2}")
 
-    df1 = load_excel(file1)
-    df2 = load_excel(file2)
+    if args.stream:
+        stream_main(file1, file2)
+        return
+
+    sheets1 = load_workbook(file1)
+    sheets2 = load_workbook(file2)
+    print(f"📑 Sheets: {len(sheets1)} vs {len(sheets2)}")
 
     print("\n🔍 Checking exact match...")
-    if exact_comparison(df1, df2):
-        print("✅ Files are exactly the same (same order, same values).")
+    if workbook_exact_comparison(sheets1, sheets2):
+        print("✅ Files are exactly the same (same sheets, same order, same values).")
         return
 
     print("❌ Files differ (at least some values or order).")
 
-    print("\n🔁 Checking sorted comparison (ignoring row/column order)...")
-    if sorted_comparison(df1, df2):
+    print("\n🔁 Checking sorted comparison (ignoring sheet/row/column order)...")
+    if workbook_sorted_comparison(sheets1, sheets2):
         print("✅ Files have the same data but in different order.")
     else:
         print("❌ Files still differ even after sorting.")
 
     print("\n📊 Computing fuzzy similarity score...")
-    score = similarity_score(df1, df2)
-    print(f"🔢 Similarity: {score:.2f}% of cells match")
+    prints1 = fingerprint_workbook(sheets1)
+    prints2 = fingerprint_workbook(sheets2)
+    score, reports = workbook_similarity(sheets1, sheets2, prints1, prints2)
+    print(f"🔢 Similarity: {score:.2f}% of cells match across all sheets")
 
-    print("\n📄 Differences:")
-    diff = difference_report(df1, df2)
-    print(diff)
+    for name in dict.fromkeys([*sheets1, *sheets2]):
+        if name not in sheets2:
+            print(f"\n📄 Sheet '{name}': only in file 1")
+        elif name not in sheets1:
+            print(f"\n📄 Sheet '{name}': only in file 2")
+        elif name not in reports:
+            print(f"\n📄 Sheet '{name}': identical")
+        else:
+            report = reports[name]
+            print(f"\n📄 Sheet '{name}': {report.score:.2f}% of cells match ({report.matched_cells}/{report.total_cells})")
+            print(f"   ➕ Rows inserted: {report.rows_inserted} | ➖ Rows deleted: {report.rows_deleted}")
+            if report.cols_inserted:
+                print(f"   ➕ Columns only in file 2: {', '.join(report.cols_inserted)}")
+            if report.cols_deleted:
+                print(f"   ➖ Columns only in file 1: {', '.join(report.cols_deleted)}")
+            print(difference_report(sheets1[name], sheets2[name]))
 
 if __name__ == "__main__":
     main()
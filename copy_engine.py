@@ -0,0 +1,314 @@
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+# --- Bytes moved per copy_file_range/sendfile call ---
+CHUNK_SIZE = 8 * 1024 * 1024
+# --- Files at least this big are bandwidth-bound and get their own small lane ---
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+# --- Seconds between progress lines ---
+PROGRESS_INTERVAL = 2.0
+
+# --- How staged files are created: share blocks (reflink), share the inode (hardlink), or duplicate bytes ---
+STAGE_MODES = ("auto", "reflink", "hardlink", "copy")
+STAGE_VERBS = {"reflink": "Reflinked", "hardlink": "Hard-linked", "copy": "Copied"}
+# Staged files get renamed and converted, so the default never shares an inode with the archive original;
+# hard links ("auto"/"hardlink") are opt-in
+DEFAULT_STAGE_MODE = "reflink"
+# Linux ioctl that clones a file's extents (Btrfs, XFS with reflink=1, bcachefs, OCFS2)
+FICLONE = 0x40049409
+
+HAS_COPY_FILE_RANGE = hasattr(os, "copy_file_range")
+HAS_SENDFILE = hasattr(os, "sendfile")
+
+# errnos meaning "this syscall can't do this pair of files", as opposed to a real I/O error
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP,
+                errno.EBADF, errno.ENOTSOCK, errno.EPERM}
+
+
+class CopyJob(NamedTuple):
+    src: Path
+    dst: Path
+    size: int
+
+
+# --- In-kernel copy from the current offset; returns bytes copied before it finished or gave up ---
+def _kernel_copy(src_fd: int, dst_fd: int, on_bytes: Callable[[int], None] | None) -> tuple[int, bool]:
+    copied = 0
+    for method in ("copy_file_range", "sendfile"):
+        if method == "copy_file_range" and not HAS_COPY_FILE_RANGE:
+            continue
+        if method == "sendfile" and not HAS_SENDFILE:
+            continue
+        try:
+            while True:
+                if method == "copy_file_range":
+                    sent = os.copy_file_range(src_fd, dst_fd, CHUNK_SIZE)
+                else:
+                    sent = os.sendfile(dst_fd, src_fd, copied, CHUNK_SIZE)
+                if sent == 0:
+                    if copied == 0:
+                        # Some filesystems (FUSE, network mounts, procfs-like files) report 0 on
+                        # the first call whatever the size: let the next method decide
+                        break
+                    return copied, True
+                copied += sent
+                if on_bytes is not None:
+                    on_bytes(sent)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            # Fall through to the next method, resuming where this one stopped
+            os.lseek(src_fd, copied, os.SEEK_SET)
+            os.lseek(dst_fd, copied, os.SEEK_SET)
+    return copied, False
+
+
+# --- Copy contents (copy_file_range -> sendfile -> buffered) and metadata, like shutil.copy2 ---
+def copy_file(src, dst, on_bytes: Callable[[int], None] | None = None) -> int:
+    if not (HAS_COPY_FILE_RANGE or HAS_SENDFILE):
+        # Windows: shutil already uses the platform's fastest path
+        try:
+            shutil.copy2(src, dst)
+        except BaseException:
+            _discard(dst)
+            raise
+        size = os.path.getsize(dst)
+        if on_bytes is not None:
+            on_bytes(size)
+        return size
+
+    with open(src, "rb") as fsrc:
+        with open(dst, "wb") as fdst:
+            try:
+                copied, done = _kernel_copy(fsrc.fileno(), fdst.fileno(), on_bytes)
+                if not done:
+                    fsrc.seek(copied)
+                    fdst.seek(copied)
+                    while chunk := fsrc.read(CHUNK_SIZE):
+                        fdst.write(chunk)
+                        copied += len(chunk)
+                        if on_bytes is not None:
+                            on_bytes(len(chunk))
+            except BaseException:
+                # Never leave a truncated copy behind that looks like a finished one
+                fdst.close()
+                _discard(dst)
+                raise
+    shutil.copystat(src, dst)
+    return copied
+
+
+def _discard(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+# --- Clone src's extents into a new dst (copy-on-write); raises OSError where the filesystem can't ---
+def reflink(src, dst):
+    if not HAS_FCNTL:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+# --- Stage src at dst without duplicating bytes when possible; returns the method used ---
+def stage_file(src, dst, mode: str = DEFAULT_STAGE_MODE, on_bytes: Callable[[int], None] | None = None) -> str:
+    """reflink = reflink, else copy; auto = reflink, else hard link, else copy; hardlink = hard link, else copy.
+
+    A hard-linked copy *is* the original file under a second name, so anything that
+    writes to it in place changes the source too; reflinks and copies are independent.
+    """
+    if mode in ("auto", "reflink"):
+        try:
+            reflink(src, dst)
+            return "reflink"
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED | {errno.ENOTTY}:
+                raise
+    if mode in ("auto", "hardlink"):
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError as e:
+            # EXDEV: other device; EPERM/EOPNOTSUPP: FAT/exFAT and friends; EMLINK: link count limit
+            if e.errno not in _UNSUPPORTED | {errno.EMLINK}:
+                raise
+    copy_file(src, dst, on_bytes)
+    return "copy"
+
+
+# --- Spinning disk? Reads /sys on Linux; None when it can't tell ---
+def is_rotational(path) -> bool | None:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        dev = os.stat(path).st_dev
+        block = Path(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+        for queue_dir in (block / "queue", block / ".." / "queue"):
+            flag = queue_dir / "rotational"
+            if flag.exists():
+                return flag.read_text().strip() == "1"
+    except OSError:
+        pass
+    return None
+
+
+# --- Worker counts for a destination: HDDs want few streams, SSDs/network shares tolerate many ---
+def default_copy_workers(dest) -> tuple[int, int]:
+    """Return (small-file workers, large-file workers) for the device holding dest."""
+    probe = Path(dest)
+    while not probe.exists() and probe != probe.parent:
+        probe = probe.parent
+    rotational = is_rotational(probe)
+    if rotational:
+        return 2, 1
+    if rotational is False:
+        return 8, 2
+    return 4, 1
+
+
+class NameRegistry:
+    """Hands out unique names per destination folder, listing each folder once instead of probing per collision."""
+
+    def __init__(self):
+        self._taken = {}
+        self._lock = threading.Lock()
+
+    def claim(self, dest_dir: Path, name: str, flag: str = "") -> str:
+        """Reserve name in dest_dir, or on collision name<flag>, name<flag>_1, name<flag>_2, …"""
+        with self._lock:
+            taken = self._taken.get(dest_dir)
+            if taken is None:
+                dest_dir.mkdir(parents=True, exist_ok=True)
+                taken = self._taken[dest_dir] = set(os.listdir(dest_dir))
+            candidate = name
+            stem, ext = os.path.splitext(name)
+            if candidate in taken and flag:
+                stem = f"{stem}{flag}"
+                candidate = f"{stem}{ext}"
+            counter = 0
+            while candidate in taken:
+                counter += 1
+                candidate = f"{stem}_{counter}{ext}"
+            taken.add(candidate)
+            return candidate
+
+
+def _format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+
+class ProgressMeter:
+    """Thread-safe byte/file counter that prints throughput every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, total_files: int = 0, total_bytes: int = 0, interval: float = PROGRESS_INTERVAL,
+                 label: str | None = None):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.interval = interval
+        # Labelled meters share the terminal with others, so they print whole lines instead of redrawing one
+        self.label = label
+        self.started = time.monotonic()
+        self._last = self.started
+        self._lock = threading.Lock()
+
+    def add_bytes(self, n: int):
+        with self._lock:
+            self.bytes += n
+            now = time.monotonic()
+            if now - self._last >= self.interval:
+                self._last = now
+                self._print(now)
+
+    def file_done(self):
+        with self._lock:
+            self.files += 1
+
+    def _print(self, now: float, end: str = ""):
+        rate = self.bytes / max(now - self.started, 1e-6)
+        files = f"{self.files}/{self.total_files}" if self.total_files else str(self.files)
+        total = f" / {_format_bytes(self.total_bytes)}" if self.total_bytes else ""
+        line = f"📦 {files} files, {_format_bytes(self.bytes)}{total} at {_format_bytes(rate)}/s"
+        if self.label:
+            print(f"[{self.label}] {line}", flush=True)
+        else:
+            print(f"\r{line}", end=end, flush=True)
+
+    def finish(self):
+        with self._lock:
+            self._print(time.monotonic(), end="\n")
+
+
+class CopyEngine:
+    """Copies jobs on two thread pools: many workers for small files, a narrow lane for large ones.
+
+    Small files are latency-bound and overlap well; large files are bandwidth-bound,
+    and running many at once only makes a spinning disk seek between them.
+    """
+
+    def __init__(self, workers: int | None = None, large_workers: int | None = None, dest=None,
+                 progress: bool = True, mode: str = "copy", label: str | None = None):
+        default_small, default_large = default_copy_workers(dest or ".")
+        self.workers = max(1, workers or default_small)
+        self.large_workers = max(1, large_workers or min(default_large, self.workers))
+        self.progress = progress
+        self.mode = mode
+        self.label = label
+        self.methods = Counter()
+        self._lock = threading.Lock()
+
+    # --- Yield (job, error) as each copy finishes; error is None on success ---
+    def run(self, jobs: Iterable[CopyJob]) -> Iterator[tuple[CopyJob, Exception | None]]:
+        jobs = list(jobs)
+        meter = ProgressMeter(len(jobs), sum(job.size for job in jobs), label=self.label) if self.progress else None
+        on_bytes = meter.add_bytes if meter is not None else None
+
+        def do_copy(job):
+            method = stage_file(job.src, job.dst, self.mode, on_bytes)
+            with self._lock:
+                self.methods[method] += 1
+            if meter is not None:
+                meter.file_done()
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="copy") as small_pool, \
+                ThreadPoolExecutor(max_workers=self.large_workers, thread_name_prefix="copy-large") as large_pool:
+            futures = {
+                (large_pool if job.size >= LARGE_FILE_SIZE else small_pool).submit(do_copy, job): job
+                for job in jobs
+            }
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], future.exception()
+            finally:
+                for future in futures:
+                    future.cancel()
+                if meter is not None:
+                    meter.finish()
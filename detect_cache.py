@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable
+
+# --- Default location, next to the quarantine and log folders ---
+DEFAULT_CACHE_PATH = Path("workspace/detect_cache.sqlite")
+
+
+# --- Identity of a file's contents: (device, inode, size, mtime) ---
+def file_key(path: str, stat: os.stat_result) -> tuple[int, int, int, int] | None:
+    # DirEntry.stat() on Windows leaves st_ino/st_dev at 0, so ask the filesystem directly
+    if not stat.st_ino:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+    if not stat.st_ino:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class DetectionCache:
+    """Persistent store of libmagic/ffprobe results for unchanged files.
+
+    Rows are keyed by detector kind plus (device, inode); a hit also requires the
+    stored size and mtime to match, so edited files are simply re-detected.
+    Safe to share between threads.
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, batch_size: int = 1000):
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS detections (
+                kind TEXT NOT NULL,
+                dev INTEGER NOT NULL,
+                ino INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                PRIMARY KEY (kind, dev, ino)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def get(self, kind: str, key) -> str | None:
+        if key is None:
+            return None
+        dev, ino, size, mtime_ns = key
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM detections WHERE kind = ? AND dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                (kind, dev, ino, size, mtime_ns)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, kind: str, key, result: str):
+        if key is None:
+            return
+        with self._lock:
+            self._pending.append((kind, *key, result))
+            if len(self._pending) >= self.batch_size:
+                self._flush_locked()
+
+    # --- Return the cached result, or compute and store it (None results are never cached) ---
+    def lookup(self, kind: str, path: str, stat: os.stat_result | None, compute: Callable[[], str | None]) -> str | None:
+        key = file_key(path, stat) if stat is not None else None
+        result = self.get(kind, key)
+        # Called from the detection worker pool: += on a shared attribute is not atomic
+        with self._lock:
+            if result is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if result is not None:
+            return result
+        result = compute()
+        if result is not None:
+            self.put(kind, key, result)
+        return result
+
+    def _flush_locked(self):
+        if self._pending:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO detections (kind, dev, ino, size, mtime_ns, result) VALUES (?, ?, ?, ?, ?, ?)",
+                self._pending
+            )
+            self._conn.commit()
+            self._pending.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,133 @@
+import re
+from pathlib import Path
+from typing import Iterable
+
+import yaml
+
+try:
+    import ahocorasick
+    HAS_AHOCORASICK = True
+except ImportError:
+    HAS_AHOCORASICK = False
+
+DEFAULT_MAPPING_PATH = Path(__file__).with_name("extension_map.yaml")
+_WORD = re.compile(r"[^\W_]")  # A letter or digit
+
+
+# --- Whole-word edges: a keyword edge that is a letter/digit must not continue into one in the text ---
+def _is_bounded(text: str, start: int, end: int) -> bool:
+    if start > 0 and _WORD.match(text[start - 1]) and _WORD.match(text[start]):
+        return False
+    return not (end < len(text) and _WORD.match(text[end - 1]) and _WORD.match(text[end]))
+
+
+def _bounded_pattern(keyword: str) -> str:
+    before = r"(?<![^\W_])" if _WORD.match(keyword[0]) else ""
+    after = r"(?![^\W_])" if _WORD.match(keyword[-1]) else ""
+    return f"{before}{re.escape(keyword)}{after}"
+
+
+class KeywordMatcher:
+    """Case-insensitive whole-word lookup over many keywords; the earliest-listed keyword found wins.
+
+    A keyword only matches where it isn't run into surrounding letters or digits, so
+    "Word" doesn't fire on the Keywords or Password fields of a CDF description.
+    Uses an Aho–Corasick automaton when pyahocorasick is installed (one pass over the
+    text however many keywords there are), otherwise one compiled alternation regex.
+
+    >>> matcher = KeywordMatcher({"Word": "doc", "Composite Document File": "xls"})
+    >>> matcher.match("Composite Document File V2 Document, Little Endian, Keywords: budget")
+    'xls'
+    >>> matcher.match("Composite Document File V2 Document, Title: Password list")
+    'xls'
+    >>> matcher.match("Microsoft Word 2007+")
+    'doc'
+    >>> matcher.match("Passwords") is None
+    True
+    """
+
+    def __init__(self, keywords: dict[str, str]):
+        # keyword → value, in priority order; a repeated keyword keeps its first value
+        self._priority = {}
+        self._values = []
+        for keyword, value in keywords.items():
+            keyword = keyword.lower()
+            if keyword and keyword not in self._priority:
+                self._priority[keyword] = len(self._values)
+                self._values.append(value)
+
+        self._automaton = None
+        self._pattern = None
+        if not self._values:
+            return
+        if HAS_AHOCORASICK:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, priority in self._priority.items():
+                self._automaton.add_word(keyword, (priority, keyword))
+            self._automaton.make_automaton()
+        else:
+            # The lookahead reports a match at every position, overlapping ones included;
+            # at each position the alternation tries keywords in priority order
+            alternation = "|".join(_bounded_pattern(keyword) for keyword in self._priority)
+            self._pattern = re.compile(f"(?=({alternation}))")
+
+    def match(self, text: str) -> str | None:
+        text = text.lower()
+        best = None
+        if self._automaton is not None:
+            priorities = (priority for end, (priority, keyword) in self._automaton.iter(text)
+                          if _is_bounded(text, end + 1 - len(keyword), end + 1))
+        elif self._pattern is not None:
+            priorities = (self._priority[m.group(1)] for m in self._pattern.finditer(text))
+        else:
+            return None
+        for priority in priorities:
+            if best is None or priority < best:
+                best = priority
+                if best == 0:
+                    break
+        return None if best is None else self._values[best]
+
+
+class ExtensionMap:
+    """Compiled extension_map.yaml: libmagic/MIME keywords, exact libmagic results and ffprobe formats."""
+
+    def __init__(self, config: dict, generic_ext: str | None = None, exact: bool = True,
+                 extensions: Iterable[str] | None = None):
+        """exact=False drops the whole-result fallbacks (e.g. "data" → xls); extensions, if
+        given, keeps only the keywords that map to one of them (plus the generic OLE2 entries)."""
+        keywords = dict(config.get("magic") or {})
+        if extensions is not None:
+            extensions = set(extensions)
+            keywords = {keyword: ext for keyword, ext in keywords.items() if ext in extensions}
+        generic_ext = generic_ext or config.get("generic_ext") or "unknown"
+        for keyword in config.get("ole2_generic") or []:
+            keywords.setdefault(keyword, generic_ext)
+        self.keywords = KeywordMatcher(keywords)
+        self.exact = {}
+        if exact:
+            self.exact = {str(result).lower(): ext for result, ext in (config.get("exact") or {}).items()}
+
+        # Precomputed format → extension, so a probe result costs one dict lookup per listed format
+        self.formats = {}
+        for ext, formats in (config.get("ffprobe") or {}).items():
+            for fmt in formats:
+                self.formats.setdefault(str(fmt).strip().lower(), ext)
+
+    # --- Extension for a libmagic description or MIME type (None if unknown) ---
+    def from_magic(self, file_type: str) -> str | None:
+        return self.keywords.match(file_type) or self.exact.get(file_type.strip().lower())
+
+    # --- Extension for an ffprobe format_name string such as "mov,mp4,m4a,3gp,3g2,mj2" ---
+    def from_ffprobe(self, fmt_string: str) -> str | None:
+        for fmt in fmt_string.split(","):
+            ext = self.formats.get(fmt.strip().lower())
+            if ext:
+                return ext
+        return None
+
+
+def load_extension_map(path=DEFAULT_MAPPING_PATH, generic_ext: str | None = None, exact: bool = True,
+                       extensions: Iterable[str] | None = None) -> ExtensionMap:
+    with open(path, encoding="utf-8") as f:
+        return ExtensionMap(yaml.safe_load(f) or {}, generic_ext, exact, extensions)
@@ -1,8 +1,16 @@
 import csv
+import json
+import os
+import argparse
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
+from scan_engine import scan_files, scan_changed, DirState, DEFAULT_WORKERS
+from detect_cache import DetectionCache
+from catalogue import Catalogue
+
 try:
     import magic
     HAS_MAGIC = True
@@ -10,6 +18,13 @@ except ImportError:
     HAS_MAGIC = False
     print("⚠️ python-magic not installed. MIME types will be empty.")
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
 # Map legacy file extensions to modern equivalents
 CONVERSION_MAP = {
     '.xls': 'xlsx',
@@ -20,6 +35,34 @@ CONVERSION_MAP = {
     '.mpg': 'mp4'
 }
 
+INVENTORY_COLUMNS = [
+    'Full_Path',
+    'File_Name',
+    'Extension',
+    'Has_Multiple_Dots',
+    'Needs_Conversion',
+    'Convert_To',
+    'Mime_Type',
+    'Is_Empty',
+    'Size_(bytes)',
+    'Creation_Time',
+    'Modification_Time',
+    'Source',
+    'Review_Notes'
+]
+CHANGE_COLUMNS = ['Change'] + INVENTORY_COLUMNS
+
+# --- Parquet output: Yes/No flags become booleans, sizes int64, times timestamps (null = unknown/denied) ---
+BOOL_COLUMNS = {'Has_Multiple_Dots', 'Needs_Conversion', 'Is_Empty'}
+INT_COLUMNS = {'Size_(bytes)'}
+TIME_COLUMNS = {'Creation_Time', 'Modification_Time'}
+PARQUET_ROW_GROUP_SIZE = 100_000
+
+IGNORE_FOLDERS = {
+    '.fseventsd', '.Spotlight-V100', '.TemporaryItems', '.Trashes',
+    '.DS_Store', '$RECYCLE.BIN', 'System Volume Information', 'Recovery', 'Config.Msi'
+}
+
 # Summary counters
 total_files = 0
 empty_files = 0
@@ -27,138 +70,428 @@ multiple_dots = 0
 needs_conversion = 0
 conversion_targets = {}
 unknown_mime = 0
+added_files = 0
+removed_files = 0
+modified_files = 0
+reused_rows = 0
+
+
+# --- Prune hidden/system folders and the output's own folder before descending ---
+def make_filters(output_csv_path):
+    workspace_key = os.path.normcase(str(Path(output_csv_path).resolve().parent))
+
+    def prune_dir(entry):
+        return (
+            entry.name.startswith('.') or
+            entry.name.startswith('$') or
+            entry.name in IGNORE_FOLDERS or
+            os.path.normcase(entry.path) == workspace_key
+        )
+
+    def skip_file(entry):
+        return (
+            entry.name.startswith('.') or
+            entry.name.startswith('$') or
+            entry.name in IGNORE_FOLDERS
+        )
+
+    return prune_dir, skip_file
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+# --- Build one inventory row for a scanned file; None if the row can't be built ---
+def build_row(entry, cache=None):
+    path = Path(entry.path)
+    try:
+        # File stats
+        try:
+            stat = entry.stat
+            if stat is None:
+                raise OSError(f"could not stat {path}")
+            size = stat.st_size
+            creation_time = format_time(stat.st_ctime)
+            modification_time = format_time(stat.st_mtime)
+            is_empty = 'Yes' if size == 0 else 'No'
+        except (PermissionError, OSError, FileNotFoundError):
+            size = ''
+            creation_time = 'ACCESS DENIED'
+            modification_time = 'ACCESS DENIED'
+            is_empty = 'Unknown'
+
+        dynamic_label = entry.rel_parts[0] if entry.rel_parts else ''
+
+        # Extension and dot logic
+        ext = path.suffix.lower()
+        dot_count = path.name.count('.')
+        has_multiple_dots = 'Yes' if dot_count >= 2 else 'No'
 
+        # Conversion logic
+        convert_to = CONVERSION_MAP.get(ext, '')
+        needs_conv = 'Yes' if convert_to else 'No'
 
-def get_file_inventory(root_dir, output_csv_path):
+        # MIME type (reused from the detection cache when the file is unchanged)
+        if HAS_MAGIC:
+            try:
+                if cache is not None:
+                    mime_type = cache.lookup('mime', entry.path, entry.stat,
+                                             lambda: magic.from_file(str(path), mime=True))
+                else:
+                    mime_type = magic.from_file(str(path), mime=True)
+            except Exception:
+                mime_type = ''
+        else:
+            mime_type = ''
+
+        return [
+            entry.path,
+            path.name,
+            ext,
+            has_multiple_dots,
+            needs_conv,
+            convert_to,
+            mime_type,
+            is_empty,
+            size,
+            creation_time,
+            modification_time,
+            dynamic_label,
+            ''  # Review notes (blank)
+        ]
+
+    except (ValueError, RuntimeError):
+        return None
+
+
+# --- Update the summary counters from a finished row ---
+def count_row(row):
     global total_files, empty_files, multiple_dots, needs_conversion, conversion_targets, unknown_mime
 
-    workspace_dir = Path(output_csv_path).resolve().parent
+    total_files += 1
+    if row[7] == 'Yes':
+        empty_files += 1
+    if row[3] == 'Yes':
+        multiple_dots += 1
+    if row[4] == 'Yes':
+        needs_conversion += 1
+        conversion_targets[row[5]] = conversion_targets.get(row[5], 0) + 1
+    if HAS_MAGIC and not row[6]:
+        unknown_mime += 1
+
+
+def get_file_inventory(root_dir, output_csv_path, workers=DEFAULT_WORKERS, cache=None, catalogue=None):
+    # Resolve once up front; every entry path is built from the resolved root
+    root_path = Path(root_dir).resolve()
+    prune_dir, skip_file = make_filters(output_csv_path)
+    if catalogue is not None:
+        catalogue.begin_scan(root_path)
+
+    with open_inventory(output_csv_path) as writer:
+        for entry in scan_files(root_path, prune_dir=prune_dir, skip_file=skip_file, workers=workers):
+            row = build_row(entry, cache)
+            if row is not None:
+                count_row(row)
+                writer.writerow(row)
+                if catalogue is not None:
+                    catalogue.add(row)
+
+    if catalogue is not None:
+        catalogue.finish_scan(root_path)
+
+
+# === Parquet output, written one row group at a time while scanning ===
+def _parquet_type(column):
+    if column in BOOL_COLUMNS:
+        return pa.bool_()
+    if column in INT_COLUMNS:
+        return pa.int64()
+    if column in TIME_COLUMNS:
+        return pa.timestamp('us')
+    return pa.string()
+
+
+def _to_typed(column, values):
+    if column in BOOL_COLUMNS:
+        return [{'Yes': True, 'No': False}.get(v) for v in values]
+    if column in INT_COLUMNS:
+        return [None if v == '' else int(v) for v in values]
+    if column in TIME_COLUMNS:
+        return [None if v in ('', 'ACCESS DENIED') else datetime.fromisoformat(v) for v in values]
+    return list(values)
+
+
+def _from_typed(column, value):
+    if column in BOOL_COLUMNS:
+        return {True: 'Yes', False: 'No'}.get(value, 'Unknown')
+    if column in INT_COLUMNS:
+        return '' if value is None else str(value)
+    if column in TIME_COLUMNS:
+        return 'ACCESS DENIED' if value is None else value.isoformat()
+    return '' if value is None else value
+
+
+def is_parquet(path):
+    return Path(path).suffix.lower() == '.parquet'
 
-    ignore_folders = {
-        '.fseventsd', '.Spotlight-V100', '.TemporaryItems', '.Trashes',
-        '.DS_Store', '$RECYCLE.BIN', 'System Volume Information', 'Recovery', 'Config.Msi'
-    }
 
-    with open(output_csv_path, mode='w', newline='', encoding='utf-8') as csvfile:
+class ParquetInventoryWriter:
+    """Drop-in for csv.writer: buffers rows and writes each full batch as one row group."""
+
+    def __init__(self, path, row_group_size=PARQUET_ROW_GROUP_SIZE):
+        self.schema = pa.schema([(column, _parquet_type(column)) for column in INVENTORY_COLUMNS])
+        self.writer = pq.ParquetWriter(str(path), self.schema, compression='zstd')
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def writerow(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = zip(*self.rows)
+        arrays = [pa.array(_to_typed(name, values), type=_parquet_type(name))
+                  for name, values in zip(INVENTORY_COLUMNS, columns)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+# --- Open an inventory for writing: Parquet if the path ends in .parquet, CSV otherwise ---
+@contextmanager
+def open_inventory(path):
+    if is_parquet(path):
+        writer = ParquetInventoryWriter(path)
+        try:
+            yield writer
+        finally:
+            writer.close()
+        return
+    with open(path, mode='w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow([
-            'Full_Path',
-            'File_Name',
-            'Extension',
-            'Has_Multiple_Dots',
-            'Needs_Conversion',
-            'Convert_To',
-            'Mime_Type',
-            'Is_Empty',
-            'Size_(bytes)',
-            'Creation_Time',
-            'Modification_Time',
-            'Source',
-            'Review_Notes'
-        ])
-
-        for path in Path(root_dir).rglob('*'):
-            if path.is_file():
-                try:
-                    resolved_path = path.resolve()
-                    relative_parts = resolved_path.relative_to(Path(root_dir).resolve()).parts
-
-                    if workspace_dir in resolved_path.parents:
-                        continue
+        writer.writerow(INVENTORY_COLUMNS)
+        yield writer
 
-                    if any(
-                        part.startswith('.') or
-                        part.startswith('$') or
-                        part in ignore_folders
-                        for part in relative_parts
-                    ):
-                        continue
 
-                    # File stats
-                    try:
-                        stat = path.stat()
-                        size = stat.st_size
-                        creation_time = datetime.fromtimestamp(stat.st_ctime).isoformat()
-                        modification_time = datetime.fromtimestamp(stat.st_mtime).isoformat()
-                        is_empty = 'Yes' if size == 0 else 'No'
-                    except (PermissionError, OSError, FileNotFoundError):
-                        size = ''
-                        creation_time = 'ACCESS DENIED'
-                        modification_time = 'ACCESS DENIED'
-                        is_empty = 'Unknown'
-
-                    dynamic_label = relative_parts[0] if relative_parts else ''
-
-                    # Extension and dot logic
-                    ext = path.suffix.lower()
-                    dot_count = path.name.count('.')
-                    has_multiple_dots = 'Yes' if dot_count >= 2 else 'No'
-
-                    # Conversion logic
-                    convert_to = CONVERSION_MAP.get(ext, '')
-                    needs_conv = 'Yes' if convert_to else 'No'
-
-                    # MIME type
-                    if HAS_MAGIC:
+# === Incremental mode: reuse the previous inventory and directory listings ===
+def dir_state_path_for(output_csv_path):
+    return Path(output_csv_path).with_suffix('.dirs.json')
+
+
+def changes_path_for(output_csv_path):
+    output_csv_path = Path(output_csv_path)
+    return output_csv_path.with_name(f"{output_csv_path.stem}_changes.csv")
+
+
+# --- Selected columns of a CSV or Parquet inventory, as the strings the CSV would hold ---
+def read_inventory_columns(path, columns: list[str]) -> dict[str, list]:
+    if is_parquet(path):
+        if not HAS_ARROW:
+            raise RuntimeError("pyarrow is required to read a Parquet inventory (pip install pyarrow)")
+        table = pq.read_table(path, columns=columns)
+        return {name: [_from_typed(name, value) for value in table.column(name).to_pylist()] for name in columns}
+    values = {name: [] for name in columns}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            for name in columns:
+                values[name].append(row[name])
+    return values
+
+
+def load_previous_inventory(inventory_csv):
+    inventory_csv = Path(inventory_csv)
+    if not inventory_csv.exists():
+        return {}
+    if is_parquet(inventory_csv):
+        table = pq.read_table(inventory_csv)
+        # Extra trailing columns (e.g. Content_Hash from find_duplicates.py) are dropped, as for CSV
+        if table.column_names[:len(INVENTORY_COLUMNS)] != INVENTORY_COLUMNS:
+            print(f"⚠️ {inventory_csv} has unexpected columns; treating every file as new.")
+            return {}
+        columns = [[_from_typed(name, value) for value in table.column(name).to_pylist()]
+                   for name in INVENTORY_COLUMNS]
+        return {row[0]: list(row) for row in zip(*columns)}
+    with open(inventory_csv, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        # Extra trailing columns (e.g. Content_Hash from find_duplicates.py) are dropped
+        width = len(INVENTORY_COLUMNS)
+        if (next(reader, None) or [])[:width] != INVENTORY_COLUMNS:
+            print(f"⚠️ {inventory_csv} has unexpected columns; treating every file as new.")
+            return {}
+        return {row[0]: row[:width] for row in reader if len(row) >= width}
+
+
+def load_dir_state(state_path):
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {path: DirState(mtime_ns, tuple(subdirs), tuple(files))
+            for path, (mtime_ns, subdirs, files) in raw.items()}
+
+
+def save_dir_state(state_path, dir_state):
+    state_path = Path(state_path)
+    tmp_path = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({path: [state.mtime_ns, state.subdirs, state.files] for path, state in dir_state.items()}, f)
+    os.replace(tmp_path, state_path)
+
+
+# --- A previous row still describes the file if its size and modification time are unchanged ---
+def row_is_current(row, stat):
+    return (
+        stat is not None and
+        row[8] == str(stat.st_size) and
+        row[10] == format_time(stat.st_mtime)
+    )
+
+
+def update_file_inventory(root_dir, output_csv_path, workers=DEFAULT_WORKERS, cache=None, trust_dir_mtime=False,
+                          catalogue=None):
+    """Refresh output_csv_path in place, only re-reading what changed since the last run.
+
+    Rows for files whose size and mtime are unchanged are copied from the previous
+    inventory (keeping their Review_Notes); everything else is rebuilt. Added,
+    removed and modified files are also written to <output>_changes.csv.
+    """
+    global added_files, removed_files, modified_files, reused_rows
+
+    root_path = Path(root_dir).resolve()
+    output_csv_path = Path(output_csv_path)
+    prune_dir, skip_file = make_filters(output_csv_path)
+
+    previous = load_previous_inventory(output_csv_path)
+    state_path = dir_state_path_for(output_csv_path)
+    known_dirs = load_dir_state(state_path) if previous else {}
+    dir_state = {}
+    seen = set()
+    if catalogue is not None:
+        catalogue.begin_scan(root_path)
+
+    # Keep the suffix so the temp file is written in the same format
+    tmp_path = output_csv_path.with_name(output_csv_path.stem + '.tmp' + output_csv_path.suffix)
+    with open_inventory(tmp_path) as writer, \
+            open(changes_path_for(output_csv_path), mode='w', newline='', encoding='utf-8') as changesfile:
+        changes = csv.writer(changesfile)
+        changes.writerow(CHANGE_COLUMNS)
+
+        for scan in scan_changed(root_path, known_dirs, prune_dir=prune_dir, skip_file=skip_file,
+                                 workers=workers, stat_unchanged=not trust_dir_mtime):
+            if scan.state is not None:
+                dir_state[scan.path] = scan.state
+
+            for entry in scan.files:
+                seen.add(entry.path)
+                old_row = previous.get(entry.path)
+                if old_row is not None and (row_is_current(old_row, entry.stat) or
+                                            (trust_dir_mtime and not scan.listed)):
+                    row = old_row
+                    reused_rows += 1
+                else:
+                    if entry.stat is None and not scan.listed:
+                        # Trusted directory, but this file was never inventoried
                         try:
-                            mime_type = magic.from_file(str(path), mime=True)
-                        except Exception:
-                            mime_type = ''
+                            entry = entry._replace(stat=os.stat(entry.path))
+                        except OSError:
+                            pass
+                    row = build_row(entry, cache)
+                    if row is None:
+                        continue
+                    if old_row is None:
+                        added_files += 1
+                        changes.writerow(['Added'] + row)
                     else:
-                        mime_type = ''
-
-                    # Update counters
-                    total_files += 1
-                    if is_empty == 'Yes':
-                        empty_files += 1
-                    if has_multiple_dots == 'Yes':
-                        multiple_dots += 1
-                    if needs_conv == 'Yes':
-                        needs_conversion += 1
-                        conversion_targets[convert_to] = conversion_targets.get(convert_to, 0) + 1
-                    if HAS_MAGIC and not mime_type:
-                        unknown_mime += 1
-
-                    # Write row
-                    writer.writerow([
-                        str(resolved_path),
-                        path.name,
-                        ext,
-                        has_multiple_dots,
-                        needs_conv,
-                        convert_to,
-                        mime_type,
-                        is_empty,
-                        size,
-                        creation_time,
-                        modification_time,
-                        dynamic_label,
-                        ''  # Review notes (blank)
-                    ])
-
-                except (ValueError, RuntimeError):
-                    continue
+                        row[-1] = old_row[-1]
+                        modified_files += 1
+                        changes.writerow(['Modified'] + row)
+
+                count_row(row)
+                writer.writerow(row)
+                if catalogue is not None:
+                    catalogue.add(row)
+
+        for path, old_row in previous.items():
+            if path not in seen:
+                removed_files += 1
+                changes.writerow(['Removed'] + old_row)
+
+    os.replace(tmp_path, output_csv_path)
+    save_dir_state(state_path, dir_state)
+    if catalogue is not None:
+        catalogue.finish_scan(root_path)
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 3:
-        print("Usage: python file_inventory.py [root_folder] [output_csv_path]")
-    else:
-        root_folder = sys.argv[1]
-        output_csv_path = sys.argv[2]
-        get_file_inventory(root_folder, output_csv_path)
-
-        # Summary
-        print("\n✅ Inventory complete!")
-        print(f"📄 Output saved to: {output_csv_path}")
-        print("\n📊 Inventory Summary:")
-        print(f"   📁 Total files scanned: {total_files}")
-        print(f"   🧹 Empty files: {empty_files}")
-        print(f"   🌀 Files with multiple dots: {multiple_dots}")
-        print(f"   🔁 Files needing conversion: {needs_conversion}")
-        for fmt, count in conversion_targets.items():
-            print(f"      ↳ Convert to .{fmt}: {count}")
-        if HAS_MAGIC:
-            print(f"   ❓ Files with unknown MIME type: {unknown_mime}")
+    parser = argparse.ArgumentParser(description="Generate a CSV or Parquet inventory of all files under a folder.")
+    parser.add_argument("root_folder", help="Root folder or drive to inventory")
+    parser.add_argument("output_csv_path", help="Where to write the inventory (.csv, or .parquet for typed columns)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of directories scanned concurrently (1 = serial walk)")
+    parser.add_argument("--cache", help="SQLite file caching MIME results between runs "
+                                        "(default: detect_cache.sqlite next to the output)")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-detect every file")
+    parser.add_argument("--catalogue", nargs="?", const="",
+                        help="Also keep an indexed SQLite catalogue up to date "
+                             "(default: catalogue.sqlite next to the output)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Update an existing inventory, re-listing only folders whose mtime changed "
+                             "and writing added/removed/modified files to <output>_changes.csv")
+    parser.add_argument("--trust-dir-mtime", action="store_true",
+                        help="With --incremental, keep rows in unchanged folders without re-statting each file "
+                             "(faster, but misses files edited in place)")
+    args = parser.parse_args()
+
+    output_csv_path = args.output_csv_path
+    if is_parquet(output_csv_path) and not HAS_ARROW:
+        print("❌ Error: pyarrow is required for .parquet output (pip install pyarrow).")
+        sys.exit(1)
+    detect_cache = None
+    if HAS_MAGIC and not args.no_cache:
+        detect_cache = DetectionCache(args.cache or Path(output_csv_path).resolve().parent / "detect_cache.sqlite")
+    catalogue = None
+    if args.catalogue is not None:
+        catalogue = Catalogue(args.catalogue or Path(output_csv_path).resolve().parent / "catalogue.sqlite")
+    try:
+        if args.incremental:
+            update_file_inventory(args.root_folder, output_csv_path, workers=args.workers, cache=detect_cache,
+                                  trust_dir_mtime=args.trust_dir_mtime, catalogue=catalogue)
         else:
-            print("   ⚠️ MIME type detection was skipped (python-magic not installed).")
+            get_file_inventory(args.root_folder, output_csv_path, workers=args.workers, cache=detect_cache,
+                               catalogue=catalogue)
+    finally:
+        if detect_cache is not None:
+            detect_cache.close()
+        if catalogue is not None:
+            catalogue.close()
+
+    # Summary
+    print("\n✅ Inventory complete!")
+    print(f"📄 Output saved to: {output_csv_path}")
+    if catalogue is not None:
+        print(f"🗂️ Catalogue updated: {catalogue.db_path}")
+    print("\n📊 Inventory Summary:")
+    print(f"   📁 Total files scanned: {total_files}")
+    if args.incremental:
+        print(f"   🔄 Changes: {added_files} added, {removed_files} removed, {modified_files} modified "
+              f"({reused_rows} rows reused)")
+        print(f"   📝 Change list saved to: {changes_path_for(output_csv_path)}")
+    print(f"   🧹 Empty files: {empty_files}")
+    print(f"   🌀 Files with multiple dots: {multiple_dots}")
+    print(f"   🔁 Files needing conversion: {needs_conversion}")
+    for fmt, count in conversion_targets.items():
+        print(f"      ↳ Convert to .{fmt}: {count}")
+    if HAS_MAGIC:
+        print(f"   ❓ Files with unknown MIME type: {unknown_mime}")
+        if detect_cache is not None:
+            print(f"   🗃️ Detection cache: {detect_cache.hits} hits, {detect_cache.misses} misses")
+    else:
+        print("   ⚠️ MIME type detection was skipped (python-magic not installed).")
@@ -0,0 +1,242 @@
+import csv
+import hashlib
+import os
+import argparse
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from scan_engine import scan_files, DEFAULT_WORKERS
+from file_inventory import is_parquet, read_inventory_columns, PARQUET_ROW_GROUP_SIZE
+from catalogue import Catalogue
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+try:
+    import xxhash
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+# --- Bytes read from each end of a file for the partial-hash prefilter ---
+PARTIAL_SIZE = 64 * 1024
+# --- Read size for full hashes ---
+CHUNK_SIZE = 4 * 1024 * 1024
+# --- Hashing is disk-bound; a few threads keep the queue full without thrashing spinning disks ---
+DEFAULT_HASH_WORKERS = 4
+
+HASH_COLUMN = 'Content_Hash'
+
+
+def _new_hasher():
+    if HAS_XXHASH:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_name() -> str:
+    return 'xxh3_128' if HAS_XXHASH else 'blake2b-128'
+
+
+# --- Hash the first and last PARTIAL_SIZE bytes; small files are read whole, so this is already the full hash ---
+def partial_hash(path: str, size: int) -> str:
+    hasher = _new_hasher()
+    with open(path, 'rb') as f:
+        if size <= 2 * PARTIAL_SIZE:
+            hasher.update(f.read())
+        else:
+            hasher.update(f.read(PARTIAL_SIZE))
+            f.seek(-PARTIAL_SIZE, os.SEEK_END)
+            hasher.update(f.read(PARTIAL_SIZE))
+    return hasher.hexdigest()
+
+
+# --- Stream the whole file through the hasher in large chunks ---
+def full_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        if not HAS_XXHASH:
+            return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+        hasher = _new_hasher()
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+
+# --- Run func(*job) for each job on a thread pool; unreadable files map to None ---
+def _hash_all(func, jobs, workers):
+    def safe(job):
+        try:
+            return func(*job)
+        except OSError as e:
+            print(f"⚠️ Could not hash {job[0]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(safe, jobs))
+
+
+# --- Bucket by size -> partial hash -> full hash; returns {path: content_hash} for every duplicated file ---
+def find_duplicates(sizes: dict[str, int], workers: int = DEFAULT_HASH_WORKERS, hash_all: bool = False):
+    by_size = defaultdict(list)
+    for path, size in sizes.items():
+        if size > 0:
+            by_size[size].append(path)
+
+    # Stage 1: only sizes shared by 2+ files can hold duplicates
+    candidates = [(path, size) for size, paths in by_size.items()
+                  if len(paths) > 1 or hash_all for path in paths]
+    print(f"🔎 {len(candidates)} of {len(sizes)} files share a size with another file")
+
+    # Stage 2: head+tail hash splits same-size buckets cheaply
+    partials = _hash_all(partial_hash, candidates, workers)
+    by_partial = defaultdict(list)
+    for (path, size), digest in zip(candidates, partials):
+        if digest is not None:
+            by_partial[(size, digest)].append(path)
+
+    hashes = {}
+    to_hash = []
+    for (size, digest), paths in by_partial.items():
+        if size <= 2 * PARTIAL_SIZE:
+            # Whole file was already read
+            if len(paths) > 1 or hash_all:
+                hashes.update((path, digest) for path in paths)
+        elif len(paths) > 1 or hash_all:
+            to_hash.extend(paths)
+
+    # Stage 3: full hash only for files that still collide
+    print(f"🧮 Fully hashing {len(to_hash)} files ({hash_name()})")
+    for path, digest in zip(to_hash, _hash_all(full_hash, [(path,) for path in to_hash], workers)):
+        if digest is not None:
+            hashes[path] = digest
+    return hashes
+
+
+# --- Group paths that share a content hash; groups are numbered like automate_grouping.py ---
+def build_groups(hashes: dict[str, str], sizes: dict[str, int]):
+    by_hash = defaultdict(list)
+    for path, digest in hashes.items():
+        by_hash[digest].append(path)
+
+    groups = []
+    dup_groups = sorted((sorted(paths) for paths in by_hash.values() if len(paths) > 1), key=lambda p: p[0])
+    for counter, paths in enumerate(dup_groups, start=1):
+        group_id = f"grp_{counter:04d}"
+        for path in paths:
+            groups.append((group_id, path, sizes[path], hashes[path]))
+    return groups
+
+
+def load_inventory_sizes(inventory_path) -> dict[str, int]:
+    columns = read_inventory_columns(inventory_path, ['Full_Path', 'Size_(bytes)'])
+    sizes = {}
+    for path, size in zip(columns['Full_Path'], columns['Size_(bytes)']):
+        try:
+            sizes[path] = int(size)
+        except (ValueError, TypeError):
+            continue
+    return sizes
+
+
+def scan_sizes(root, workers: int = DEFAULT_WORKERS) -> dict[str, int]:
+    def prune_dir(entry):
+        return entry.name.startswith('.') or entry.name.startswith('$') or entry.name == 'workspace'
+
+    def skip_file(entry):
+        return entry.name.startswith('.') or entry.name.startswith('$')
+
+    return {
+        entry.path: entry.stat.st_size
+        for entry in scan_files(Path(root).resolve(), prune_dir=prune_dir, skip_file=skip_file, workers=workers)
+        if entry.stat is not None
+    }
+
+
+def _write_parquet_hashes(inventory_path, hashes: dict[str, str], output_path: Path, tmp_path: Path):
+    table = pq.read_table(inventory_path)
+    paths = table.column('Full_Path').to_pylist()
+    if HASH_COLUMN in table.column_names:
+        previous = table.column(HASH_COLUMN).to_pylist()
+        table = table.drop_columns([HASH_COLUMN])
+    else:
+        previous = [None] * len(paths)
+    digests = pa.array([hashes.get(path, old) for path, old in zip(paths, previous)], type=pa.string())
+    pq.write_table(table.append_column(HASH_COLUMN, digests), str(tmp_path), compression='zstd',
+                   row_group_size=PARQUET_ROW_GROUP_SIZE)
+    os.replace(tmp_path, output_path)
+
+
+# --- Rewrite the inventory with a Content_Hash column (atomic replace when writing in place) ---
+def write_inventory_hashes(inventory_csv, hashes: dict[str, str], output_csv=None):
+    output_csv = Path(output_csv or inventory_csv)
+    tmp_path = output_csv.with_name(output_csv.name + '.tmp')
+    if is_parquet(inventory_csv):
+        _write_parquet_hashes(inventory_csv, hashes, output_csv, tmp_path)
+        return
+    with open(inventory_csv, newline='', encoding='utf-8') as src, \
+            open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+        reader = csv.DictReader(src)
+        fieldnames = list(reader.fieldnames or [])
+        if HASH_COLUMN not in fieldnames:
+            fieldnames.append(HASH_COLUMN)
+        writer = csv.DictWriter(dst, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in reader:
+            digest = hashes.get(row['Full_Path'])
+            if digest is not None:
+                row[HASH_COLUMN] = digest
+            else:
+                row.setdefault(HASH_COLUMN, '')
+            writer.writerow(row)
+    os.replace(tmp_path, output_csv)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find byte-identical files by size, partial hash and full hash.")
+    parser.add_argument("source", help="Inventory (.csv or .parquet) from file_inventory.py, or a folder to scan")
+    parser.add_argument("--output", default="duplicate_groups.csv", help="Where to write the duplicate groups")
+    parser.add_argument("--inventory-out", help="Write the hashed inventory here instead of updating it in place")
+    parser.add_argument("--workers", type=int, default=DEFAULT_HASH_WORKERS, help="Files hashed concurrently")
+    parser.add_argument("--hash-all", action="store_true",
+                        help="Fully hash every file, not just ones that could be duplicates")
+    parser.add_argument("--catalogue", help="Store content hashes in this SQLite catalogue (from file_inventory.py)")
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    if not source.exists():
+        print(f"❌ Error: {source} does not exist.")
+        sys.exit(1)
+
+    from_inventory = source.is_file()
+    sizes = load_inventory_sizes(source) if from_inventory else scan_sizes(source)
+    hashes = find_duplicates(sizes, workers=args.workers, hash_all=args.hash_all)
+    groups = build_groups(hashes, sizes)
+
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Group_ID', 'File_Path', 'Size_(bytes)', HASH_COLUMN])
+        writer.writerows(groups)
+
+    if from_inventory:
+        write_inventory_hashes(source, hashes, args.inventory_out)
+        print(f"📄 Hashes written to: {args.inventory_out or source}")
+    if args.catalogue:
+        with Catalogue(args.catalogue) as catalogue:
+            catalogue.set_hashes(hashes)
+        print(f"🗂️ Hashes stored in catalogue: {args.catalogue}")
+
+    # Every copy after the first in a group is reclaimable
+    seen_groups = set()
+    wasted = 0
+    for group_id, _, size, _ in groups:
+        if group_id in seen_groups:
+            wasted += size
+        seen_groups.add(group_id)
+    print(f"\n✅ Done. Duplicate groups saved to: {args.output}")
+    print(f"📊 Summary: {len(seen_groups)} groups, {len(groups)} files, {wasted / 1_048_576:.1f} MB reclaimable")
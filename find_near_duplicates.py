@@ -0,0 +1,431 @@
+import argparse
+import csv
+import os
+import re
+import sys
+import zipfile
+import zlib
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path, PurePath
+from typing import Iterator
+
+import numpy as np
+
+from catalogue import Catalogue
+
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+try:
+    from pypdf import PdfReader
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+try:
+    import olefile
+    HAS_OLEFILE = True
+except ImportError:
+    HAS_OLEFILE = False
+
+try:
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+# --- Inventory columns read (CSV, Parquet or catalogue) ---
+INVENTORY_FIELDS = ['Full_Path', 'Extension', 'Mime_Type', 'Size_(bytes)', 'Modification_Time']
+GROUP_COLUMNS = ['Group_ID', 'File_Path', 'Kind', 'Size_(bytes)', 'Modification_Time']
+
+# --- Feature families: which files get which signature ---
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.tga', '.psd', '.webp'}
+TEXT_EXTENSIONS = {'.pdf', '.doc', '.docx'}
+OLE2_EXTENSIONS = {'.ppt', '.msg', '.mdb', '.pub', '.vsd'}
+TEXT_MIMES = {
+    'application/pdf',
+    'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+OLE2_MIMES = {'application/x-ole-storage', 'application/cdfv2', 'application/vnd.ms-office',
+              'application/vnd.ms-powerpoint', 'application/vnd.ms-outlook'}
+# Spreadsheets have their own pipeline (automate_grouping.py + compare_spreadsheets.py)
+SPREADSHEET_EXTENSIONS = {'.xls', '.xlsx', '.xlsm', '.csv'}
+SPREADSHEET_MIMES = {'application/vnd.ms-excel',
+                     'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}
+
+# --- Image signature: 64-bit difference hash, banded into four 16-bit words for LSH ---
+# Pairs differing in at most 3 bits always share a band; up to --max-distance are kept once compared
+DHASH_BITS = 64
+IMAGE_BANDS = 4
+DEFAULT_MAX_DISTANCE = 6
+
+# --- Text/stream signature: MinHash over word shingles (or OLE2 stream hashes) ---
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16  # 4 rows per band: pairs around 0.5 Jaccard or better become candidates
+DEFAULT_THRESHOLD = 0.8
+MAX_PDF_PAGES = 20
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(20240601)  # Fixed seed: signatures must agree across processes and runs
+PERM_A = _rng.integers(1, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+PERM_B = _rng.integers(0, 1 << 31, MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+# --- Buckets bigger than this are not expanded into pairs: they are split again on the columns their band
+# --- didn't use, and buckets of identical signatures (blank scans, flat images) are chained by size instead ---
+MAX_BUCKET = 500
+DEFAULT_MIN_SIZE_RATIO = 0.5
+FEATURE_CHUNKSIZE = 64
+
+_WORD = re.compile(r"\w+")
+_ASCII_RUN = re.compile(rb"[\x20-\x7e]{4,}")
+_UTF16_RUN = re.compile(rb"(?:[\x20-\x7e]\x00){4,}")
+_XML_TAG = re.compile(r"<[^>]+>")
+
+
+# === Classification from inventory metadata ===
+def classify(extension: str, mime: str) -> str | None:
+    extension, mime = extension.lower(), mime.lower()
+    if extension in SPREADSHEET_EXTENSIONS or mime in SPREADSHEET_MIMES:
+        return None
+    if mime.startswith('image/') or extension in IMAGE_EXTENSIONS:
+        return 'image'
+    if mime in TEXT_MIMES or extension in TEXT_EXTENSIONS:
+        return 'text'
+    if mime in OLE2_MIMES or extension in OLE2_EXTENSIONS:
+        return 'ole2'
+    return None
+
+
+# === Feature extraction (runs in worker processes) ===
+def image_dhash(path: str) -> np.ndarray:
+    with Image.open(path) as img:
+        img.draft('L', (64, 64))  # JPEG: let the decoder downscale instead of decoding full size
+        small = img.convert('L').resize((9, 8), Image.Resampling.BILINEAR)
+        pixels = np.asarray(small, dtype=np.int16)
+    bits = np.packbits((pixels[:, 1:] > pixels[:, :-1]).ravel())
+    return bits.view('>u2').astype(np.uint16)  # Four 16-bit words
+
+
+def _text_runs(data: bytes) -> str:
+    runs = [m.group().decode('ascii') for m in _ASCII_RUN.finditer(data)]
+    runs += [m.group().decode('utf-16-le') for m in _UTF16_RUN.finditer(data)]
+    return " ".join(runs)
+
+
+def extract_text(path: str) -> str:
+    suffix = PurePath(path).suffix.lower()
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(b'%PDF'):
+        if not HAS_PYPDF:
+            return ""
+        reader = PdfReader(path)
+        return " ".join(page.extract_text() or "" for page in reader.pages[:MAX_PDF_PAGES])
+    if head.startswith(b'PK') or suffix == '.docx':
+        with zipfile.ZipFile(path) as z:
+            return _XML_TAG.sub(" ", z.read('word/document.xml').decode('utf-8', 'replace'))
+    if HAS_OLEFILE and olefile.isOleFile(path):
+        with olefile.OleFileIO(path) as ole:
+            if ole.exists('WordDocument'):
+                return _text_runs(ole.openstream('WordDocument').read())
+    with open(path, 'rb') as f:
+        return _text_runs(f.read())
+
+
+def minhash(values: np.ndarray) -> np.ndarray | None:
+    values = np.unique(values.astype(np.uint64))
+    if values.size == 0:
+        return None
+    signature = np.full(MINHASH_PERMUTATIONS, MERSENNE_PRIME, dtype=np.uint64)
+    for start in range(0, values.size, 8192):
+        chunk = values[start:start + 8192]
+        hashed = (PERM_A[:, None] * chunk[None, :] + PERM_B[:, None]) % MERSENNE_PRIME
+        np.minimum(signature, hashed.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def text_signature(path: str) -> np.ndarray | None:
+    words = _WORD.findall(extract_text(path).lower())
+    if not words:
+        return None
+    span = min(SHINGLE_WORDS, len(words))
+    shingles = [zlib.crc32(" ".join(words[i:i + span]).encode('utf-8'))
+                for i in range(len(words) - span + 1)]
+    return minhash(np.array(shingles, dtype=np.uint64))
+
+
+def ole2_signature(path: str) -> np.ndarray | None:
+    hashes = []
+    with olefile.OleFileIO(path) as ole:
+        for entry in ole.listdir(streams=True, storages=False):
+            # \x05SummaryInformation and friends change on every save; skip property sets
+            if entry[-1].startswith('\x05'):
+                continue
+            name = "/".join(entry).encode('utf-8')
+            hashes.append(zlib.crc32(ole.openstream(entry).read(), zlib.crc32(name)))
+    return minhash(np.array(hashes, dtype=np.uint64))
+
+
+def extract_features(job: tuple[int, str, str]) -> tuple[int, np.ndarray | None, str | None]:
+    index, path, kind = job
+    try:
+        if kind == 'image':
+            return index, image_dhash(path), None
+        if kind == 'text':
+            return index, text_signature(path), None
+        return index, ole2_signature(path), None
+    except Exception as e:
+        return index, None, f"{type(e).__name__}: {e}"
+
+
+# === Clustering ===
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int):
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def _band_keys(band: np.ndarray) -> np.ndarray:
+    keys = np.zeros(band.shape[0], dtype=np.uint64)
+    for column in band.T:
+        keys = keys * np.uint64(1_000_003) ^ column.astype(np.uint64)
+    return keys
+
+
+def _hamming(words: np.ndarray) -> np.ndarray:
+    """Pairwise Hamming distance between rows of 16-bit words: (m, 4) -> (m, m)."""
+    xor = words[:, None, :] ^ words[None, :, :]
+    return np.unpackbits(xor.view(np.uint8), axis=-1).sum(axis=-1)
+
+
+def _buckets(keys: np.ndarray) -> Iterator[np.ndarray]:
+    """Positions sharing a key, for every key held by two or more rows."""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    ends = np.r_[starts[1:], len(order)]
+    for start, end in zip(starts, ends):
+        if end - start >= 2:
+            yield order[start:end]
+
+
+def cluster(indices: np.ndarray, signatures: np.ndarray, sizes: np.ndarray, uf: UnionFind, columns: np.ndarray,
+            bands: int, similar, min_size_ratio: float, fixed_band_count: bool = False) -> Counter:
+    """Sort-based LSH: per band of `columns`, files with equal band keys form a bucket; pairs in a bucket are verified.
+
+    An oversized bucket is re-bucketed on the columns its band did not use: cut into
+    `bands` narrower bands when fixed_band_count (dHash bits, so pairs within the
+    guaranteed distance still share a band), otherwise into bands of the same width
+    (MinHash rows). Recursion stops when a bucket is small enough or out of columns.
+    """
+    stats = Counter()
+    rows = columns.shape[1] // bands
+
+    def band_columns(available: np.ndarray) -> list[np.ndarray]:
+        count = bands if fixed_band_count else len(available) // rows
+        if count == 0 or len(available) < count:
+            return []
+        return np.array_split(available, count)
+
+    def verify(members: np.ndarray, identical: bool = False):
+        if len({uf.find(indices[m]) for m in members}) == 1:
+            return  # Already one group through earlier bands
+        member_sizes = sizes[members].astype(np.float64)
+        if identical:
+            # Identical signatures: sorted by size, neighbours within the ratio connect exactly
+            # the components the pairwise check would, without the m x m matrix
+            by_size = members[np.argsort(member_sizes, kind='stable')]
+            sorted_sizes = np.sort(member_sizes)
+            linked = sorted_sizes[:-1] / np.maximum(sorted_sizes[1:], 1) >= min_size_ratio
+            for a in np.flatnonzero(linked):
+                uf.union(indices[by_size[a]], indices[by_size[a + 1]])
+            stats['similar pairs'] += int(linked.sum())
+            return
+        ok = similar(signatures[members])
+        ratio = np.minimum.outer(member_sizes, member_sizes) / np.maximum(
+            np.maximum.outer(member_sizes, member_sizes), 1)
+        ok &= ratio >= min_size_ratio
+        stats['candidate pairs'] += len(members) * (len(members) - 1) // 2
+        for a, b in zip(*np.nonzero(np.triu(ok, 1))):
+            uf.union(indices[members[a]], indices[members[b]])
+            stats['similar pairs'] += 1
+
+    def visit(members: np.ndarray, available: np.ndarray):
+        for band in band_columns(available):
+            keys = _band_keys(columns[members][:, band])
+            for bucket in _buckets(keys):
+                bucket = members[bucket]
+                if len(bucket) <= MAX_BUCKET:
+                    verify(bucket)
+                    continue
+                bucket_signatures = signatures[bucket]
+                if (bucket_signatures == bucket_signatures[0]).all():
+                    stats['identical buckets'] += 1
+                    verify(bucket, identical=True)
+                    continue
+                remaining = np.setdiff1d(available, band)
+                if band_columns(remaining):
+                    stats['split buckets'] += 1
+                    visit(bucket, remaining)
+                else:
+                    stats['oversized buckets'] += 1
+
+    visit(np.arange(len(indices)), np.arange(columns.shape[1]))
+    return stats
+
+
+# === Inventory input ===
+def load_records(source) -> list[tuple[str, str, int, str]]:
+    """(path, kind, size, modification time) for every file with a feature family, from CSV, Parquet or catalogue."""
+    suffix = Path(source).suffix.lower()
+    if suffix in ('.sqlite', '.db'):
+        with Catalogue(source) as catalogue:
+            _, rows = catalogue.inventory_rows(INVENTORY_FIELDS)
+            rows = list(rows)
+    elif suffix == '.parquet':
+        if not HAS_ARROW:
+            raise RuntimeError("pyarrow is required to read a Parquet inventory (pip install pyarrow)")
+        table = pq.read_table(source, columns=INVENTORY_FIELDS)
+        rows = zip(*(table.column(name).to_pylist() for name in INVENTORY_FIELDS))
+    else:
+        with open(source, newline='', encoding='utf-8') as f:
+            rows = [tuple(row.get(name) for name in INVENTORY_FIELDS) for row in csv.DictReader(f)]
+
+    records = []
+    for path, extension, mime, size, mtime in rows:
+        kind = classify(extension or PurePath(path).suffix, mime or '')
+        try:
+            size = int(size)
+        except (TypeError, ValueError):
+            continue
+        if kind is not None and size > 0:
+            records.append((path, kind, size, '' if mtime is None else str(mtime)))
+    return records
+
+
+def find_near_duplicates(records, workers: int = os.cpu_count() or 1, threshold: float = DEFAULT_THRESHOLD,
+                         max_distance: int = DEFAULT_MAX_DISTANCE,
+                         min_size_ratio: float = DEFAULT_MIN_SIZE_RATIO) -> list[list[int]]:
+    """Return groups (lists of record indices, 2+ files each) of near-duplicate files."""
+    kinds = Counter(kind for _, kind, _, _ in records)
+    skipped = set()
+    if not HAS_PIL and kinds['image']:
+        print("⚠️ Pillow not installed; skipping images (pip install pillow)")
+        skipped.add('image')
+    if not HAS_OLEFILE and kinds['ole2']:
+        print("⚠️ olefile not installed; skipping OLE2 stream hashes (pip install olefile)")
+        skipped.add('ole2')
+    if not HAS_PYPDF and kinds['text']:
+        print("⚠️ pypdf not installed; PDFs will have no text signature (pip install pypdf)")
+
+    jobs = [(i, path, kind) for i, (path, kind, _, _) in enumerate(records) if kind not in skipped]
+    print(f"🔬 Extracting features from {len(jobs)} files "
+          f"({', '.join(f'{n} {k}' for k, n in kinds.items() if k not in skipped)}) on {workers} processes")
+
+    signatures = {'image': ([], []), 'text': ([], []), 'ole2': ([], [])}
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, (index, signature, error) in enumerate(
+                pool.map(extract_features, jobs, chunksize=FEATURE_CHUNKSIZE), start=1):
+            if error is not None:
+                failures += 1
+            elif signature is not None:
+                kind_indices, kind_signatures = signatures[records[index][1]]
+                kind_indices.append(index)
+                kind_signatures.append(signature)
+            if done % 10_000 == 0:
+                print(f"   {done}/{len(jobs)} files")
+    if failures:
+        print(f"⚠️ {failures} files could not be read")
+
+    sizes = np.array([size for _, _, size, _ in records], dtype=np.int64)
+    uf = UnionFind(len(records))
+    for kind, (kind_indices, kind_signatures) in signatures.items():
+        if len(kind_indices) < 2:
+            continue
+        indices = np.array(kind_indices)
+        stacked = np.vstack(kind_signatures)
+        if kind == 'image':
+            # Bands are cut from the 64 hash bits, so oversized buckets can be split into narrower bands
+            bits = np.unpackbits(stacked.astype('>u2').view(np.uint8), axis=1)
+            stats = cluster(indices, stacked, sizes[indices], uf, bits, IMAGE_BANDS,
+                            lambda words: _hamming(words) <= max_distance, min_size_ratio, fixed_band_count=True)
+        else:
+            stats = cluster(indices, stacked, sizes[indices], uf, stacked, MINHASH_BANDS,
+                            lambda sigs: (sigs[:, None, :] == sigs[None, :, :]).mean(axis=-1) >= threshold,
+                            min_size_ratio)
+        print(f"🧩 {kind}: {len(kind_indices)} signatures, {stats['candidate pairs']} candidate pairs, "
+              f"{stats['similar pairs']} similar" +
+              (f", {stats['split buckets']} oversized buckets split" if stats['split buckets'] else "") +
+              (f", {stats['identical buckets']} identical-signature buckets" if stats['identical buckets'] else "") +
+              (f", {stats['oversized buckets']} oversized buckets skipped" if stats['oversized buckets'] else ""))
+
+    components = defaultdict(list)
+    for i in range(len(records)):
+        components[uf.find(i)].append(i)
+    return [members for members in components.values() if len(members) > 1]
+
+
+# --- Write groups like find_duplicates.py / automate_grouping.py: grp_0001, oldest file first ---
+def write_groups(groups, records, output):
+    groups = sorted((sorted(members, key=lambda i: (records[i][3], records[i][0])) for members in groups),
+                    key=lambda members: records[members[0]][0])
+    rows = []
+    for counter, members in enumerate(groups, start=1):
+        group_id = f"grp_{counter:04d}"
+        for i in members:
+            path, kind, size, mtime = records[i]
+            rows.append([group_id, path, kind, size, mtime])
+
+    if Path(output).suffix.lower() == '.xlsx':
+        import pandas as pd
+        pd.DataFrame(rows, columns=GROUP_COLUMNS).to_excel(output, index=False)
+    else:
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(GROUP_COLUMNS)
+            writer.writerows(rows)
+    return len(groups), len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Group near-duplicate images, PDFs, Word and OLE2 files using perceptual hashes and MinHash LSH.")
+    parser.add_argument("inventory", help="Inventory from file_inventory.py (.csv, .parquet) or catalogue.sqlite")
+    parser.add_argument("--output", default="near_duplicate_groups.csv",
+                        help="Group_ID/File_Path list (.csv, or .xlsx for batch_compare_groups.py --input)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Feature extraction processes")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Minimum estimated Jaccard similarity for text and OLE2 files")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE,
+                        help=f"Maximum differing bits between image hashes (of {DHASH_BITS})")
+    parser.add_argument("--min-size-ratio", type=float, default=DEFAULT_MIN_SIZE_RATIO,
+                        help="Smaller/larger file size must be at least this (0 disables the size check)")
+    args = parser.parse_args()
+
+    if not Path(args.inventory).exists():
+        print(f"❌ Error: {args.inventory} does not exist.")
+        sys.exit(1)
+
+    records = load_records(args.inventory)
+    groups = find_near_duplicates(records, workers=args.workers, threshold=args.threshold,
+                                  max_distance=args.max_distance, min_size_ratio=args.min_size_ratio)
+    group_count, file_count = write_groups(groups, records, args.output)
+    print(f"\n✅ Done. Near-duplicate groups saved to: {args.output}")
+    print(f"📊 Summary: {group_count} groups, {file_count} files")
@@ -1,51 +1,30 @@
 import magic
 import subprocess
-from pathlib import Path
+from pathlib import Path, PurePath
 import csv
 import sys
 import argparse
 import os
-
-# --- Extension mapping based on libmagic keywords ---
-EXTENSION_MAP = {
-    # Office/doc formats
-    "Excel": "xls",
-    "Word": "doc",
-    "PowerPoint": "ppt",
-    "Access": "mdb",
-    "Outlook": "msg",
-    "Composite Document File": "xls",
-    "PDF document": "pdf",
-
-    # Image formats
-    "TIFF image": "tif",
-    "Targa image": "tga",
-    "JPEG image": "jpg",
-    "JFIF": "jpg",
-    "PNG image": "png",
-    "GIF image": "gif",
-    "PC bitmap": "bmp",
-    "Bitmap": "bmp",
-    "Photoshop": "psd",
-    "PostScript": "eps",
-    "Camera Raw": "cr2",
-    "Canon CR3": "cr3",
-    "Nikon": "nef",
-    "Sony": "arw",
-    "Fujifilm": "raf",
-    "Olympus": "orf",
-}
-
-# --- Video format mapping based on ffprobe results ---
-VIDEO_EXT_MAP = {
-    'mov,mp4,m4a,3gp,3g2,mj2': 'mp4',
-    'avi': 'avi',
-    'mpeg': 'mpg',
-    'vob': 'vob',
-    'matroska,webm': 'mkv',
-    'mod': 'mod',
-    'mts,m2ts': 'mts',
-}
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import NamedTuple
+
+from extension_map import load_extension_map, DEFAULT_MAPPING_PATH
+from copy_engine import NameRegistry, stage_file, STAGE_MODES
+from rename_engine import (Rename, RenameJournal, apply_renames, execute_renames, undo_renames, journal_runs,
+                           new_run_id, DEFAULT_JOURNAL_PATH, DEFAULT_RENAME_WORKERS, LATEST_RUN, ALL_RUNS)
+from scan_engine import scan_files, ordered_map, DEFAULT_WORKERS
+from detect_cache import DetectionCache, DEFAULT_CACHE_PATH
+from header_sniff import sniff_file
+
+# --- Extension mapping (libmagic keywords, MIME types, ffprobe formats) from extension_map.yaml ---
+EXTENSIONS = load_extension_map()
+
+# --- ffprobe runs on a bounded pool; each probe still gets its own timeout (seconds) ---
+DEFAULT_PROBE_WORKERS = min(8, os.cpu_count() or 1)
+FFPROBE_TIMEOUT = 3
 
 # --- Directory and file filters to skip known junk or system folders ---
 EXCLUDED_DIRS = {
@@ -64,209 +43,514 @@ SKIP_FILENAMES = {
 }
 
 
-# --- Append a flag to the name and resolve conflicts by adding counters if needed ---
-def resolve_conflict_with_flag(target_path: Path, flag: str = "__DUPLICATE") -> Path:
-    stem = target_path.stem
-    suffix = target_path.suffix
-    parent = target_path.parent
-    new_stem = f"{stem}{flag}"
-    new_path = parent / f"{new_stem}{suffix}"
-    counter = 1
-    while new_path.exists():
-        new_path = parent / f"{new_stem}_{counter}{suffix}"
-        counter += 1
-    return new_path
+# --- Quarantine: every unknown file gets a manifest row; "manifest" mode stops there, the others also place it ---
+# --- in the quarantine folder by reflink, hard link or streamed copy (auto tries them in that order) ---
+QUARANTINE_DIR = Path("workspace/quarantine")
+QUARANTINE_MODES = ("manifest",) + STAGE_MODES
+MANIFEST_COLUMNS = ["Original Path", "Quarantine Path", "Size", "Modified", "Detection Method", "Method"]
+
+
+class Quarantine:
+    """Quarantine folder plus its manifest.csv; thread-safe, and appended to across runs."""
+
+    def __init__(self, root=QUARANTINE_DIR, mode: str = "auto"):
+        self.root = Path(root)
+        self.mode = mode
+        self.manifest_path = self.root / "manifest.csv"
+        self.names = NameRegistry()
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._writer = None
+        self._listed = None  # Original path -> quarantine path ('' if manifest only), read from manifest.csv
+
+    # --- Quarantine path recorded for file by this or an earlier run ('' if manifest only), or None if not listed ---
+    def listed(self, file: Path) -> str | None:
+        with self._lock:
+            if self._listed is None:
+                self._listed = {}
+                if self.manifest_path.exists():
+                    with open(self.manifest_path, newline='', encoding='utf-8') as f:
+                        for row in csv.DictReader(f):
+                            self._listed[row["Original Path"]] = row["Quarantine Path"]
+            return self._listed.get(str(file))
+
+    # --- Record (and unless mode is "manifest", place) one file; returns (quarantine path or None, method) ---
+    def add(self, file: Path, detection_method: str) -> tuple[Path | None, str]:
+        stat = file.stat()
+        target = None
+        method = "manifest"
+        if self.mode != "manifest":
+            # Collisions resolve against the folder listing held in memory, not an exists() probe per name
+            target = self.root / self.names.claim(self.root, file.name, flag="__DUPLICATE")
+            method = stage_file(file, target, self.mode)
+        with self._lock:
+            if self._writer is None:
+                self.root.mkdir(parents=True, exist_ok=True)
+                new = not self.manifest_path.exists() or self.manifest_path.stat().st_size == 0
+                self._manifest = open(self.manifest_path, 'a', newline='', encoding='utf-8')
+                self._writer = csv.writer(self._manifest)
+                if new:
+                    self._writer.writerow(MANIFEST_COLUMNS)
+            self._writer.writerow([file, target or "", stat.st_size,
+                                   datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+                                   detection_method, method])
+            if self._listed is not None:
+                self._listed[str(file)] = str(target or "")
+        return target, method
+
+    def close(self):
+        with self._lock:
+            if self._manifest is not None:
+                self._manifest.close()
+                self._manifest = self._writer = None
 
 
 # --- Try to assign an extension using magic's output string ---
 def get_extension_magic(file_type: str) -> str | None:
-    file_type = file_type.lower()
-    for keyword, ext in EXTENSION_MAP.items():
-        if keyword.lower() in file_type:
-            return ext
-    if file_type.strip() in {"data", "data file"}:
-        return "xls"
-    return None
+    return EXTENSIONS.from_magic(file_type)
 
 
-# --- Try to assign a video extension using ffprobe ---
-def guess_extension_ffprobe(file_path: Path) -> tuple[str, str] | None:
+# --- Run ffprobe and return its raw format string ('' if it found nothing, None if ffprobe is unavailable or timed out) ---
+# --- None is never cached, so a probe that timed out on a busy drive is retried next run ---
+def probe_format(file_path: Path) -> str | None:
     try:
         result = subprocess.run(
             ['ffprobe', '-v', 'error', '-show_entries', 'format=format_name',
              '-of', 'default=noprint_wrappers=1:nokey=1', str(file_path)],
-            capture_output=True, text=True, timeout=3
+            capture_output=True, text=True, timeout=FFPROBE_TIMEOUT
         )
-        fmt_string = result.stdout.strip().lower()
-        formats = [f.strip() for f in fmt_string.split(',')]
-        for f in formats:
-            for key, ext in VIDEO_EXT_MAP.items():
-                key_formats = [k.strip() for k in key.split(',')]
-                if f in key_formats:
-                    return ext, f"ffprobe: {fmt_string}"
+        return result.stdout.strip().lower()
+    except subprocess.TimeoutExpired:
+        return None
     except subprocess.SubprocessError:
-        pass
-    return None
+        return ""
+    except OSError:
+        return None
+
 
+# --- Map an ffprobe format string to a video extension ---
+def ffprobe_extension(fmt_string: str | None) -> tuple[str, str] | None:
+    if not fmt_string:
+        return None
+    ext = EXTENSIONS.from_ffprobe(fmt_string)
+    return (ext, f"ffprobe: {fmt_string}") if ext else None
 
-# --- Main file fixing function ---
-def fix_unix_files(scan_dir: Path, dry_run: bool):
+
+# --- Try to assign a video extension using ffprobe ---
+def guess_extension_ffprobe(file_path: Path) -> tuple[str, str] | None:
+    return ffprobe_extension(probe_format(file_path))
+
+
+# --- Run a detector through the cache when one is configured ---
+def cached_detect(cache: DetectionCache | None, kind: str, entry, compute):
+    if cache is None:
+        return compute()
+    return cache.lookup(kind, entry.path, entry.stat, compute)
+
+
+# --- Try to assign an extension from the file's magic number (cached as "ext<TAB>label", "" for no match) ---
+def sniff_extension(cache: DetectionCache | None, entry) -> tuple[str, str] | None:
+    def sniff():
+        match = sniff_file(entry.path)
+        return "\t".join(match) if match else ""
+
+    cached = cached_detect(cache, "header", entry, sniff)
+    if not cached:
+        return None
+    ext, label = cached.split("\t", 1)
+    return ext, f"header: {label}"
+
+
+# --- Detect one extensionless file on the probe pool: (assigned_ext, detection_method, libmagic type or None) ---
+# --- Returns None when the file is not writable, since there is nothing we could fix ---
+def detect_file_type(entry, cache: DetectionCache | None) -> tuple[str | None, str, str | None] | None:
+    if entry.stat is None:
+        raise OSError("could not stat file")
+    if not os.access(entry.path, os.W_OK):
+        return None
+
+    # Classify from the file header in-process; ffprobe only runs for unrecognised headers
+    detected = (
+            sniff_extension(cache, entry) or
+            ffprobe_extension(cached_detect(cache, "ffprobe", entry, lambda: probe_format(Path(entry.path))))
+    )
+    if detected:
+        return detected[0], detected[1], None
+
+    # Fallback to libmagic detection
+    file_type = cached_detect(cache, "magic", entry, lambda: magic.from_file(entry.path))
+    return get_extension_magic(file_type), f"magic: {file_type}", file_type
+
+
+# --- Walker filters: skip excluded/system folders before descending, and system or hidden files ---
+def _prune_dir(entry: os.DirEntry) -> bool:
+    name = entry.name
+    lowered = name.lower()
+    return (
+            name in EXCLUDED_DIRS or
+            name == "workspace" or
+            any(skip in lowered for skip in SKIP_PATH_PARTS)
+    )
+
+
+def _skip_file(entry: os.DirEntry) -> bool:
+    name = entry.name
+    lowered = name.lower()
+    return (
+            name.startswith('.') or
+            lowered in SKIP_FILENAMES or
+            any(skip in lowered for skip in SKIP_PATH_PARTS)
+    )
+
+
+# --- Only non-empty extensionless files go on to detection (unreadable stats are reported as errors) ---
+def _is_candidate(entry) -> bool:
+    if entry.stat is None:
+        return True
+    return entry.stat.st_size > 0 and not PurePath(entry.name).suffix
+
+
+# --- One planned fix: a dry run writes these to rename_plan.csv, --apply executes them ---
+DEFAULT_PLAN_PATH = "rename_plan.csv"
+PLAN_COLUMNS = ["Action", "Original Path", "New Path", "Detection Method", "Assigned Extension"]
+LOG_COLUMNS = ["Original Path", "New Path", "Detection Method", "Assigned Extension", "Status"]
+RENAME_ACTIONS = {"rename", "rename_flagged", "mark_delete"}
+
+DRY_RUN_STATUS = {
+    "skip": "Skipped – no write permission",
+    "mark_delete": "Dry run – would rename (resource fork)",
+    "quarantine": "Dry run – would quarantine (no known extension)",
+    "rename": "Dry run – not renamed",
+    "rename_flagged": "Dry run – flagged potential duplicate",
+}
+# --- Work an earlier, interrupted run already did: logged but neither redone nor added to undo_log.csv ---
+ALREADY_RENAMED_STATUS = "Already renamed (earlier run)"
+ALREADY_QUARANTINED_STATUS = "Already quarantined (listed in manifest)"
+APPLIED_STATUS = {
+    "mark_delete": "Marked for Deletion (Resource Fork)",
+    "rename": "Renamed",
+    "rename_flagged": "Renamed (flagged potential duplicate)",
+}
+
+
+class PlannedFix(NamedTuple):
+    action: str  # skip | mark_delete | quarantine | rename | rename_flagged
+    src: Path
+    dst: Path | None
+    method: str
+    ext: str
+
+
+class FixLog:
+    """Writer for renamed_unix_files_log.csv that keeps the summary counters in memory; thread-safe."""
+
+    def __init__(self, file):
+        self._writer = csv.writer(file)
+        self._writer.writerow(LOG_COLUMNS)
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def write(self, src, dst, method: str, ext: str, status: str):
+        with self._lock:
+            self._writer.writerow([src, dst or "", method, ext, status])
+            self.counts["total"] += 1
+            match status.lower():
+                case s if s.startswith("error"):
+                    self.counts["errors"] += 1
+                case s if s.startswith("already"):
+                    self.counts["already done"] += 1
+                case s if "rename" in s:
+                    self.counts["renamed"] += 1
+                case s if "quarantine" in s:
+                    self.counts["quarantined"] += 1
+                case s if "skip" in s:
+                    self.counts["skipped"] += 1
+
+
+# --- Decide what to do with one detected file; target names are reserved in names so planned renames can't collide ---
+def plan_fix(file: Path, detection: tuple[str | None, str, str | None] | None, names: NameRegistry) -> PlannedFix:
+    # Skip files without write permission
+    if detection is None:
+        return PlannedFix("skip", file, None, "", "")
+
+    assigned_ext, detection_method, file_type = detection
+
+    # Special case for HFS resource fork
+    if file_type and "Apple HFS/HFS+ resource fork" in file_type:
+        new_name = names.claim(file.parent, file.name + ".TODELETE")
+        return PlannedFix("mark_delete", file, file.parent / new_name, detection_method, ".TODELETE")
+
+    # Quarantine unknown types
+    if not assigned_ext:
+        return PlannedFix("quarantine", file, None, detection_method, "")
+
+    # Assign new filename with extension, flagging a potential duplicate on conflict
+    wanted = f"{file.name}.{assigned_ext}"
+    new_name = names.claim(file.parent, wanted, flag="__DUPLICATE")
+    action = "rename" if new_name == wanted else "rename_flagged"
+    return PlannedFix(action, file, file.parent / new_name, detection_method, assigned_ext)
+
+
+def log_dry_run(fix: PlannedFix, log: FixLog):
+    match fix.action:
+        case "skip":
+            print(f"⚠️ Skipped (no write permission): {fix.src}")
+        case "mark_delete":
+            print(f"[DRY RUN] Would rename resource fork: {fix.src} → {fix.dst}")
+        case "quarantine":
+            print(f"[DRY RUN] Would quarantine: {fix.src} → workspace/quarantine/")
+        case "rename_flagged":
+            print(f"[DRY RUN] Would rename (conflict flagged): {fix.src} → {fix.dst} [{fix.method}]")
+        case _:
+            print(f"[DRY RUN] Would rename: {fix.src} → {fix.dst} [{fix.method}]")
+    log.write(fix.src, fix.dst, fix.method, fix.ext, DRY_RUN_STATUS[fix.action])
+
+
+def log_renamed(fix: PlannedFix, log: FixLog, undo_writer):
+    if fix.action == "mark_delete":
+        print(f"🗑️ Marked for deletion: {fix.src} → {fix.dst}")
+    log.write(fix.src, fix.dst, fix.method, fix.ext, APPLIED_STATUS[fix.action])
+    undo_writer.writerow([fix.dst, fix.src])
+
+
+def log_already_renamed(fix: PlannedFix, log: FixLog):
+    print(f"↪️ Already renamed: {fix.src} → {fix.dst}")
+    log.write(fix.src, fix.dst, fix.method, fix.ext, ALREADY_RENAMED_STATUS)
+
+
+def log_rename_failed(fix: PlannedFix, log: FixLog, error: Exception):
+    print(f"⚠️ Failed to rename: {fix.src} → {fix.dst}: {error}")
+    log.write(fix.src, "", fix.method, fix.ext, f"Error: failed to rename: {error}")
+
+
+def log_rename_outcome(fix: PlannedFix, outcome: str, error: Exception | None, log: FixLog, undo_writer):
+    if error is not None:
+        log_rename_failed(fix, log, error)
+    elif outcome == "already renamed":
+        log_already_renamed(fix, log)
+    else:
+        log_renamed(fix, log, undo_writer)
+
+
+# --- Apply one planned fix immediately, renames through an open journal; returns the file's path afterwards ---
+def apply_fix(fix: PlannedFix, log: FixLog, undo_writer, quarantine: Quarantine,
+              journal: RenameJournal | None = None, journalled: set[Rename] = frozenset()) -> Path:
+    if fix.action == "skip":
+        print(f"⚠️ Skipped (no write permission): {fix.src}")
+        log.write(fix.src, "", "", "", DRY_RUN_STATUS["skip"])
+        return fix.src
+
+    if fix.action == "quarantine":
+        # A re-run of an interrupted --apply must not place the file (and list it) a second time
+        previous = quarantine.listed(fix.src)
+        if previous is not None:
+            print(f"☣️ Already quarantined: {fix.src}")
+            log.write(fix.src, previous, fix.method, "", ALREADY_QUARANTINED_STATUS)
+            return fix.src
+        try:
+            quarantine_path, method = quarantine.add(fix.src, fix.method)
+            if quarantine_path is None:
+                print(f"☣️ Quarantined (manifest only): {fix.src}")
+                status = "Quarantined (no known extension, manifest only)"
+            else:
+                print(f"☣️ Quarantined ({method}): {fix.src} → {quarantine_path}")
+                status = "Quarantined (no known extension)"
+            log.write(fix.src, quarantine_path, fix.method, "", status)
+        except Exception as e:
+            print(f"⚠️ Failed to quarantine {fix.src}: {e}")
+            log.write(fix.src, "", fix.method, "", f"Error: failed to quarantine: {e}")
+        return fix.src
+
+    [(_, outcome, error)] = apply_renames([Rename(fix.src, fix.dst)], journal, journalled=journalled)
+    log_rename_outcome(fix, outcome, error, log, undo_writer)
+    return fix.src if error is not None else fix.dst
+
+
+# --- Execute a whole plan: quarantines on a pool, renames per directory through the fsync'd journal ---
+def execute_plan(plan: list[PlannedFix], log: FixLog, undo_writer, quarantine: Quarantine,
+                 journal_path=DEFAULT_JOURNAL_PATH, workers: int = DEFAULT_RENAME_WORKERS, run_id: str | None = None):
+    renames = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="quarantine") as pool:
+        pending = []
+        for fix in plan:
+            if fix.action in RENAME_ACTIONS:
+                renames[Rename(fix.src, fix.dst)] = fix
+            elif fix.action == "quarantine":
+                pending.append(pool.submit(apply_fix, fix, log, None, quarantine))
+            else:
+                apply_fix(fix, log, None, quarantine)
+        for future in pending:
+            future.result()
+
+    for rename, outcome, error in execute_renames(renames, journal_path, workers, run_id=run_id):
+        log_rename_outcome(renames[rename], outcome, error, log, undo_writer)
+
+
+def save_plan(plan: list[PlannedFix], plan_path):
+    with open(plan_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(PLAN_COLUMNS)
+        writer.writerows([fix.action, fix.src, fix.dst or "", fix.method, fix.ext] for fix in plan)
+
+
+def load_plan(plan_path) -> list[PlannedFix]:
+    with open(plan_path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)  # skip header
+        return [PlannedFix(action, Path(src), Path(dst) if dst else None, method, ext)
+                for action, src, dst, method, ext in reader]
+
+
+# --- Print the outcome counters collected while logging ---
+def print_summary(counts: Counter):
+    print(f"📊 Summary: Total processed: {counts['total']} | Renamed: {counts['renamed']} | "
+          f"Quarantined: {counts['quarantined']} | Already done: {counts['already done']} | "
+          f"Skipped: {counts['skipped']} | Errors: {counts['errors']}")
+
+
+# --- Run fixes (or, with a plan, only execute it) and write the rename/undo logs ---
+def _run_fixes(make_plan, dry_run: bool, quarantine_mode: str, rename_workers: int, journal_path, plan_path):
     rename_log = "renamed_unix_files_log.csv"
     undo_log = "undo_log.csv"
+    quarantine = Quarantine(QUARANTINE_DIR, quarantine_mode)
+    run_id = new_run_id()
 
     # --- Open logs for writing ---
     with open(rename_log, 'w', newline='', encoding='utf-8') as rename_logfile, \
             open(undo_log, 'w', newline='', encoding='utf-8') as undo_logfile:
 
-        rename_writer = csv.writer(rename_logfile)
+        log = FixLog(rename_logfile)
         undo_writer = csv.writer(undo_logfile)
-
-        rename_writer.writerow(["Original Path", "New Path", "Detection Method", "Assigned Extension", "Status"])
         undo_writer.writerow(["New Path", "Original Path"])
 
-        # --- Scan files recursively ---
-        for file in scan_dir.rglob("*"):
+        plan = make_plan(log)
+        if dry_run:
+            for fix in plan:
+                log_dry_run(fix, log)
+        else:
+            execute_plan(plan, log, undo_writer, quarantine, journal_path, rename_workers, run_id)
+    quarantine.close()
+
+    if dry_run:
+        print(f"📝 Plan saved to: {plan_path} (run with --apply {plan_path} to execute it)")
+    else:
+        print(f"🧾 Journal: {journal_path}, run {run_id} (roll back with --undo {journal_path})")
+    print(f"✅ Done.Logs saved to: {rename_log}, {undo_log}")
+    print_summary(log.counts)
+
+
+# --- Main file fixing function: phase 1 scans and plans, phase 2 executes the plan ---
+def fix_unix_files(scan_dir: Path, dry_run: bool, workers: int = DEFAULT_WORKERS,
+                   cache: DetectionCache | None = None, probe_workers: int = DEFAULT_PROBE_WORKERS,
+                   quarantine_mode: str = "auto", rename_workers: int = DEFAULT_RENAME_WORKERS,
+                   journal_path=DEFAULT_JOURNAL_PATH, plan_path=DEFAULT_PLAN_PATH):
+    def make_plan(log):
+        plan = []
+        names = NameRegistry()
+        # --- Scan recursively, detecting extensionless files on a bounded pool (results stay in scan order) ---
+        candidates = (entry for entry in scan_files(scan_dir, prune_dir=_prune_dir, skip_file=_skip_file,
+                                                    workers=workers) if _is_candidate(entry))
+        for entry, pending in ordered_map(lambda e: detect_file_type(e, cache), candidates, workers=probe_workers):
+            file = Path(entry.path)
             try:
-                # Skip excluded directories, system files, or zero-byte files
-                if any(part in EXCLUDED_DIRS for part in file.parts):
-                    continue
-                if "workspace" in file.relative_to(scan_dir).parts:
-                    continue
-                if (
-                        file.name.startswith("._") or
-                        file.name.startswith('.') or
-                        file.name.lower() in SKIP_FILENAMES or
-                        file.stat().st_size == 0 or
-                        any(skip in part.lower() for skip in SKIP_PATH_PARTS for part in file.parts)
-                ):
-                    continue
-
-                # --- Process extensionless files only ---
-                if file.is_file() and not file.suffix:
-                    # Skip files without write permission
-                    if not os.access(file, os.W_OK):
-                        print(f"⚠️ Skipped (no write permission): {file}")
-                        rename_writer.writerow([file, "", "", "", "Skipped – no write permission"])
-                        continue
-
-                    # Try detecting video format using ffprobe first
-                    ffprobe_result = guess_extension_ffprobe(file)
-                    if ffprobe_result:
-                        assigned_ext, detection_method = ffprobe_result
-                    else:
-                        # Fallback to libmagic detection
-                        file_type = magic.from_file(str(file))
-                        detection_method = f"magic: {file_type}"
-
-                        # Special case for HFS resource fork
-                        if "Apple HFS/HFS+ resource fork" in file_type:
-                            new_path = file.with_name(file.name + ".TODELETE")
-                            if dry_run:
-                                print(f"[DRY RUN] Would rename resource fork: {file} → {new_path}")
-                                rename_writer.writerow([file, new_path, detection_method, ".TODELETE",
-                                                        "Dry run – would rename (resource fork)"])
-                            else:
-                                try:
-                                    file.rename(new_path)
-                                    print(f"🗑️ Marked for deletion: {file} → {new_path}")
-                                    rename_writer.writerow([file, new_path, detection_method, ".TODELETE",
-                                                            "Marked for Deletion (Resource Fork)", "No"])
-
-                                    undo_writer.writerow([new_path, file])
-                                except (OSError, IOError, PermissionError) as e:
-                                    print(f"⚠️ Failed to rename resource fork: {file} → {new_path}: {e}")
-                                    rename_writer.writerow(
-                                        [file, "", detection_method, ".TODELETE", f"Error: failed to rename: {e}",
-                                         "No"])
-                            continue
-
-                        assigned_ext = get_extension_magic(file_type)
-
-                    # --- Quarantine unknown types ---
-                    if not assigned_ext:
-                        if dry_run:
-                            print(f"[DRY RUN] Would quarantine: {file} → workspace/quarantine/")
-                            rename_writer.writerow(
-                                [file, "", detection_method, "", "Dry run – would quarantine (no known extension)"])
-                        else:
-                            quarantine_dir = Path("workspace/quarantine")
-                            quarantine_dir.mkdir(parents=True, exist_ok=True)
-                            quarantine_copy = quarantine_dir / file.name
-                            if quarantine_copy.exists():
-                                quarantine_copy = resolve_conflict_with_flag(quarantine_copy)
-                            try:
-                                quarantine_copy.write_bytes(file.read_bytes())
-                                print(f"☣️ Quarantined: {file} → {quarantine_copy}")
-                                rename_writer.writerow(
-                                    [file, quarantine_copy, detection_method, "", "Quarantined (no known extension)"])
-                            except Exception as e:
-                                print(f"⚠️ Failed to copy {file} to quarantine: {e}")
-                                rename_writer.writerow(
-                                    [file, "", detection_method, "", f"Error: failed to quarantine: {e}"])
-                        continue
-
-                    # --- Assign new filename with extension ---
-                    new_path = file.with_name(file.name + f".{assigned_ext}")
-
-                    # Handle conflict by adding duplicate marker
-                    if new_path.exists():
-                        resolved_path = resolve_conflict_with_flag(new_path)
-                        if dry_run:
-                            print(
-                                f"[DRY RUN] Would rename (conflict flagged): {file} → {resolved_path} [{detection_method}]")
-                            rename_writer.writerow([file, resolved_path, detection_method, assigned_ext,
-                                                    "Dry run – flagged potential duplicate"])
-                        else:
-                            file.rename(resolved_path)
-                            rename_writer.writerow([file, resolved_path, detection_method, assigned_ext,
-                                                    "Renamed (flagged potential duplicate)"])
-                            undo_writer.writerow([resolved_path, file])
-                        continue
-
-                    # --- Standard renaming ---
-                    if dry_run:
-                        print(f"[DRY RUN] Would rename: {file} → {new_path} [{detection_method}]")
-                        rename_writer.writerow(
-                            [file, new_path, detection_method, assigned_ext, "Dry run – not renamed"])
-                    else:
-                        file.rename(new_path)
-                        rename_writer.writerow([file, new_path, detection_method, assigned_ext, "Renamed"])
-                        undo_writer.writerow([new_path, file])
-
+                plan.append(plan_fix(file, pending.result(), names))
             except Exception as e:
-                rename_writer.writerow([file, "", "", "", f"Error: {e}"])
-
-    print(f"✅ Done.Logs saved to: {rename_log}, {undo_log}")
-
-    # --- Summary stats ---
-    total = renamed = quarantined = skipped = 0
-    with open(rename_log, newline='', encoding='utf-8') as f:
-        next(f)  # skip header
-        for row in csv.reader(f):
-            total += 1
-            match row[4].lower():
-                case s if "rename" in s:
-                    renamed += 1
-                case s if "quarantine" in s:
-                    quarantined += 1
-                case s if "skip" in s:
-                    skipped += 1
-
-    print(f"📊 Summary: Total processed: {total} | Renamed: {renamed} | Quarantined: {quarantined} | Skipped: {skipped}")
-
-    # --- CLI Entry Point ---
-
-
+                log.write(file, "", "", "", f"Error: {e}")
+        save_plan(plan, plan_path)
+        return plan
+
+    _run_fixes(make_plan, dry_run, quarantine_mode, rename_workers, journal_path, plan_path)
+
+
+# --- Execute a plan saved by --dry-run, without rescanning ---
+def apply_plan(plan_path, quarantine_mode: str = "auto", rename_workers: int = DEFAULT_RENAME_WORKERS,
+               journal_path=DEFAULT_JOURNAL_PATH):
+    _run_fixes(lambda log: load_plan(plan_path), False, quarantine_mode, rename_workers, journal_path, plan_path)
+
+
+# --- Replay one run of the journal backwards (the latest unless told otherwise), one worker per directory ---
+def undo_fixes(journal_path=DEFAULT_JOURNAL_PATH, rename_workers: int = DEFAULT_RENAME_WORKERS,
+               run: str = LATEST_RUN):
+    runs = journal_runs(journal_path)
+    if run == LATEST_RUN:
+        if not runs:
+            print(f"⚠️ No renames recorded in {journal_path}")
+            return
+        run = runs[-1]
+    elif run != ALL_RUNS and run not in runs:
+        raise SystemExit(f"❌ Error: run {run} is not in {journal_path} (runs: {', '.join(runs) or 'none'})")
+    print(f"↩️ Rolling back {'every run' if run == ALL_RUNS else f'run {run}'} of {journal_path}")
+    counts = Counter()
+    for rename, outcome, error in undo_renames(journal_path, rename_workers, run=run):
+        counts[outcome] += 1
+        if error is not None:
+            print(f"⚠️ Failed to restore {rename.dst} → {rename.src}: {error}")
+    print(f"↩️ Undo: {counts['restored']} restored, {counts['already restored']} already in place, "
+          f"{counts['failed']} failed ({journal_path})")
+
+
+# --- CLI Entry Point ---
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Fix Unix-like extensionless files with proper extensions.")
-    parser.add_argument("path", help="Root folder or drive to scan")
-    parser.add_argument("--dry-run", action="store_true", help="Preview changes without renaming or quarantining files")
+    parser.add_argument("path", nargs="?", help="Root folder or drive to scan")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only write the rename plan (--plan); nothing is renamed or quarantined")
+    parser.add_argument("--plan", default=DEFAULT_PLAN_PATH, help="Where the rename plan is written")
+    parser.add_argument("--apply", metavar="PLAN", help="Execute a plan written by --dry-run instead of scanning")
+    parser.add_argument("--undo", metavar="JOURNAL", nargs="?", const=DEFAULT_JOURNAL_PATH,
+                        help=f"Roll back the renames of one run recorded in a journal (default {DEFAULT_JOURNAL_PATH})")
+    parser.add_argument("--run", default=LATEST_RUN,
+                        help=f"Which run --undo rolls back: a run id printed by --apply, "
+                             f"'{LATEST_RUN}' (default) or '{ALL_RUNS}'")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH, help="Append-only journal of applied renames")
+    parser.add_argument("--rename-workers", type=int, default=DEFAULT_RENAME_WORKERS,
+                        help="Directories renamed (or rolled back) concurrently")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Number of directories scanned concurrently (1 = serial walk)")
+    parser.add_argument("--probe-workers", type=int, default=DEFAULT_PROBE_WORKERS,
+                        help="Number of files detected concurrently (max ffprobe processes in flight)")
+    parser.add_argument("--cache", default=str(DEFAULT_CACHE_PATH),
+                        help="SQLite file caching ffprobe/libmagic results between runs")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-detect every file")
+    parser.add_argument("--mapping", help=f"YAML file mapping libmagic/MIME/ffprobe results to extensions "
+                                          f"(default {DEFAULT_MAPPING_PATH.name})")
+    parser.add_argument("--quarantine-mode", choices=QUARANTINE_MODES, default="auto",
+                        help="manifest = only list unknown files in workspace/quarantine/manifest.csv; "
+                             "otherwise also reflink, hard link or copy them there (auto tries in that order)")
 
     args = parser.parse_args()
+
+    if args.undo:
+        if not Path(args.undo).exists():
+            print(f"❌ Error: {args.undo} does not exist.")
+            sys.exit(1)
+        undo_fixes(args.undo, args.rename_workers, args.run)
+        sys.exit(0)
+
+    if args.apply:
+        if not Path(args.apply).exists():
+            print(f"❌ Error: {args.apply} does not exist.")
+            sys.exit(1)
+        apply_plan(args.apply, args.quarantine_mode, args.rename_workers, args.journal)
+        sys.exit(0)
+
+    if not args.path:
+        print("Usage: python fix_unix.py /path/to/scan  (or --apply rename_plan.csv, or --undo)")
+        sys.exit(1)
     scan_path = Path(args.path)
 
     if not scan_path.exists():
         print(f"❌ Error: {scan_path} does not exist.")
         sys.exit(1)
 
-    fix_unix_files(scan_path, dry_run=args.dry_run)
+    if args.mapping:
+        EXTENSIONS = load_extension_map(args.mapping)
+    detect_cache = None if args.no_cache else DetectionCache(args.cache)
+    try:
+        fix_unix_files(scan_path, dry_run=args.dry_run, workers=args.workers, cache=detect_cache,
+                       probe_workers=args.probe_workers, quarantine_mode=args.quarantine_mode,
+                       rename_workers=args.rename_workers, journal_path=args.journal, plan_path=args.plan)
+    finally:
+        if detect_cache is not None:
+            detect_cache.close()
+            print(f"🗃️ Detection cache: {detect_cache.hits} hits, {detect_cache.misses} misses ({detect_cache.db_path})")
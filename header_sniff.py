@@ -0,0 +1,219 @@
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+# --- How much of each file is read up front; every signature below fits in this ---
+HEADER_SIZE = 4096
+
+OLE2_MAGIC = b"\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1"
+
+# --- OLE2/CFB stream names that identify the Office application ---
+OLE2_STREAMS = {
+    "Workbook": ("xls", "Excel workbook"),
+    "Book": ("xls", "Excel 5 workbook"),
+    "WordDocument": ("doc", "Word document"),
+    "PowerPoint Document": ("ppt", "PowerPoint presentation"),
+    "VisioDocument": ("vsd", "Visio drawing"),
+}
+OLE2_STREAM_PREFIXES = {
+    "__substg1.0_": ("msg", "Outlook message"),
+}
+
+# --- ISO base media (ftyp) major brands; anything else is treated as MP4 ---
+FTYP_BRANDS = {
+    b"qt  ": ("mov", "QuickTime movie"),
+    b"crx ": ("cr3", "Canon CR3 raw"),
+    b"M4A ": ("m4a", "MPEG-4 audio"),
+    b"M4V ": ("m4v", "MPEG-4 video"),
+    b"heic": ("heic", "HEIF image"),
+    b"heix": ("heic", "HEIF image"),
+    b"mif1": ("heic", "HEIF image"),
+    b"msf1": ("heic", "HEIF image sequence"),
+    b"avif": ("avif", "AVIF image"),
+    b"mjp2": ("mj2", "Motion JPEG 2000"),
+}
+QUICKTIME_ATOMS = {b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+# Padding atoms: four common English words, so a second atom header must follow them
+QUICKTIME_PADDING_ATOMS = {b"wide", b"free", b"skip"}
+
+RIFF_FORMS = {
+    b"AVI ": ("avi", "RIFF AVI video"),
+    b"WAVE": ("wav", "RIFF WAVE audio"),
+    b"WEBP": ("webp", "RIFF WebP image"),
+}
+
+BMP_DIB_SIZES = {12, 40, 52, 56, 64, 108, 124}
+
+# Limits for walking the CFB directory chain
+_MAX_DIR_SECTORS = 16
+_CFB_END = 0xFFFFFFFA
+
+
+class HeaderMatch(NamedTuple):
+    ext: str
+    label: str
+
+
+# --- Walk the first few CFB directory sectors and return the stream/storage names ---
+def _ole2_entry_names(f: BinaryIO, head: bytes) -> list[str]:
+    if len(head) < 512:
+        return []
+    sector_shift = struct.unpack_from("<H", head, 0x1E)[0]
+    if sector_shift not in (9, 12):
+        return []
+    sector_size = 1 << sector_shift
+    first_dir = struct.unpack_from("<I", head, 0x30)[0]
+    difat = struct.unpack_from("<109I", head, 0x4C)
+    ids_per_fat = sector_size // 4
+
+    def read_sector(sid: int) -> bytes:
+        f.seek((sid + 1) * sector_size)
+        return f.read(sector_size)
+
+    names = []
+    sid = first_dir
+    for _ in range(_MAX_DIR_SECTORS):
+        if sid >= _CFB_END:
+            break
+        sector = read_sector(sid)
+        for offset in range(0, len(sector) - 127, 128):
+            name_len = struct.unpack_from("<H", sector, offset + 0x40)[0]
+            if 2 <= name_len <= 64:
+                names.append(sector[offset:offset + name_len - 2].decode("utf-16-le", "replace"))
+
+        # Follow the FAT chain to the next directory sector (header DIFAT only)
+        fat_index = sid // ids_per_fat
+        if fat_index >= len(difat) or difat[fat_index] >= _CFB_END:
+            break
+        fat_sector = read_sector(difat[fat_index])
+        slot = (sid % ids_per_fat) * 4
+        if slot + 4 > len(fat_sector):
+            break
+        sid = struct.unpack_from("<I", fat_sector, slot)[0]
+    return names
+
+
+def _sniff_ole2(f: BinaryIO | None, head: bytes) -> HeaderMatch:
+    names = _ole2_entry_names(f, head) if f is not None else []
+    for name in names:
+        if name in OLE2_STREAMS:
+            ext, label = OLE2_STREAMS[name]
+            return HeaderMatch(ext, f"OLE2 {label}")
+        for prefix, (ext, label) in OLE2_STREAM_PREFIXES.items():
+            if name.startswith(prefix):
+                return HeaderMatch(ext, f"OLE2 {label}")
+    # Same fallback as libmagic's "Composite Document File" mapping
+    return HeaderMatch("xls", "OLE2 compound document")
+
+
+def _is_mpeg_ts(head: bytes, offset: int, packet: int) -> bool:
+    positions = [offset + packet * i for i in range(3)]
+    available = [p for p in positions if p < len(head)]
+    return len(available) >= 2 and all(head[p] == 0x47 for p in available)
+
+
+def _is_atom_size(size: int, remaining: int | None) -> bool:
+    """0 = runs to end of file, 1 = 64-bit size follows; otherwise a header-sized atom that fits in the file."""
+    return size in (0, 1) or (size >= 8 and (remaining is None or size <= remaining))
+
+
+def _atom_header(head: bytes, f: BinaryIO | None, offset: int) -> bytes:
+    if offset + 8 <= len(head):
+        return head[offset:offset + 8]
+    if f is None:
+        return b""
+    f.seek(offset)
+    return f.read(8)
+
+
+def _is_quicktime(head: bytes, f: BinaryIO | None, file_size: int | None) -> bool:
+    """Top-level QuickTime atom at offset 0; padding atoms must be followed by another valid atom.
+
+    >>> _is_quicktime(b"\\x00\\x00\\x00\\x08wide\\x00\\x00\\x10\\x00mdat", None, 8192)
+    True
+    >>> _is_quicktime(b"The free software in this folder is licensed under the GPL.", None, 60)
+    False
+    >>> _is_quicktime(b"\\x00\\x00\\x00\\x10skip........Some text", None, 200)
+    False
+    """
+    size = struct.unpack_from(">I", head)[0]
+    if not _is_atom_size(size, file_size):
+        return False
+    if head[4:8] not in QUICKTIME_PADDING_ATOMS:
+        return True
+    if size < 8:
+        return False
+    second = _atom_header(head, f, size)
+    if len(second) < 8 or second[4:8] not in QUICKTIME_ATOMS | {b"ftyp"}:
+        return False
+    remaining = None if file_size is None else file_size - size
+    return _is_atom_size(struct.unpack_from(">I", second)[0], remaining)
+
+
+def _is_bmp(head: bytes) -> bool:
+    if len(head) < 18 or head[6:10] != b"\x00\x00\x00\x00":
+        return False
+    return struct.unpack_from("<I", head, 14)[0] in BMP_DIB_SIZES
+
+
+# --- Classify a file from its leading bytes; f is only used to follow OLE2 sectors and QuickTime atoms ---
+def sniff_header(head: bytes, f: BinaryIO | None = None, file_size: int | None = None) -> HeaderMatch | None:
+    if head.startswith(OLE2_MAGIC):
+        return _sniff_ole2(f, head)
+    if b"%PDF-" in head[:1024]:
+        return HeaderMatch("pdf", "PDF document")
+    if head[:4] in (b"II*\x00", b"MM\x00*", b"II+\x00"):
+        if head[8:10] == b"CR":
+            return HeaderMatch("cr2", "Canon CR2 raw")
+        return HeaderMatch("tif", "TIFF image")
+    if head.startswith(b"\xFF\xD8\xFF"):
+        return HeaderMatch("jpg", "JPEG image")
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return HeaderMatch("png", "PNG image")
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return HeaderMatch("gif", "GIF image")
+    if head.startswith(b"8BPS"):
+        return HeaderMatch("psd", "Photoshop image")
+    if head.startswith(b"BM") and _is_bmp(head):
+        return HeaderMatch("bmp", "PC bitmap")
+    if head.startswith(b"RIFF") and head[8:12] in RIFF_FORMS:
+        ext, label = RIFF_FORMS[head[8:12]]
+        return HeaderMatch(ext, label)
+    if head.startswith(b"\x00\x00\x01\xBA"):
+        return HeaderMatch("mpg", "MPEG program stream")
+    if _is_mpeg_ts(head, 0, 188):
+        return HeaderMatch("mts", "MPEG transport stream")
+    if _is_mpeg_ts(head, 4, 192):
+        return HeaderMatch("mts", "MPEG-2 transport stream (M2TS)")
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in FTYP_BRANDS:
+            ext, label = FTYP_BRANDS[brand]
+        elif brand.startswith(b"3g2"):
+            ext, label = "3g2", "3GPP2 video"
+        elif brand.startswith(b"3gp"):
+            ext, label = "3gp", "3GPP video"
+        else:
+            ext, label = "mp4", "MPEG-4 video"
+        return HeaderMatch(ext, f"{label} (ftyp {brand.decode('latin-1').strip()})")
+    if head[4:8] in QUICKTIME_ATOMS and _is_quicktime(head, f, file_size):
+        return HeaderMatch("mov", "QuickTime movie")
+    if head.startswith(b"\x1A\x45\xDF\xA3"):
+        if b"webm" in head[:64]:
+            return HeaderMatch("webm", "WebM video")
+        return HeaderMatch("mkv", "Matroska video")
+    if head.startswith(b"%!PS") or head.startswith(b"\xC5\xD0\xD3\xC6"):
+        return HeaderMatch("eps", "PostScript")
+    if head[4:19] == b"Standard Jet DB":
+        return HeaderMatch("mdb", "Access database")
+    if head[4:19] == b"Standard ACE DB":
+        return HeaderMatch("accdb", "Access database")
+    return None
+
+
+# --- Read the header of a file once and classify it ---
+def sniff_file(file_path: Path | str) -> HeaderMatch | None:
+    with open(file_path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+        return sniff_header(head, f, os.fstat(f.fileno()).st_size)
@@ -0,0 +1,466 @@
+import argparse
+import csv
+import os
+import queue
+import sys
+import threading
+from contextlib import ExitStack
+from pathlib import Path
+from typing import NamedTuple
+
+import fix_unix
+import file_inventory
+from scan_engine import scan_files, ScanEntry, DEFAULT_WORKERS
+from detect_cache import DetectionCache, DEFAULT_CACHE_PATH
+from catalogue import Catalogue
+from copy_engine import NameRegistry, ProgressMeter, stage_file, DEFAULT_STAGE_MODE, STAGE_MODES
+from batch_copy_by_type import TypeSelector, staged_name, MIME_CLASSES, LOG_NAME
+from rename_engine import RenameJournal, journalled_renames, new_run_id, DEFAULT_JOURNAL_PATH
+
+# --- Records buffered between two stages; a slow stage blocks the ones before it instead of filling memory ---
+DEFAULT_QUEUE_SIZE = 1000
+
+_DONE = object()
+
+
+# --- One file flowing through the pipeline; each stage fills in its own fields ---
+class FileRecord:
+    __slots__ = ("entry", "path", "candidate", "detection", "error")
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.path = Path(entry.path)  # Current location; the fix stage updates it after a rename
+        self.candidate = False        # Extensionless file that went through detection
+        self.detection = None         # detect_file_type() result
+        self.error = None             # First exception raised by any stage
+
+    # --- The scan entry for the file's current location, re-statted after a fix-stage rename ---
+    def current_entry(self) -> ScanEntry:
+        if str(self.path) == self.entry.path:
+            return self.entry
+        try:
+            stat = self.path.stat()
+        except OSError:
+            stat = None
+        return ScanEntry(str(self.path), self.path.name, self.entry.rel_parts[:-1] + (self.path.name,), stat)
+
+
+# --- Stand-in for the os.DirEntry a walk filter expects (the filters only read name and path) ---
+class _WalkEntry(NamedTuple):
+    name: str
+    path: str
+
+
+class Stage:
+    """One pipeline step. process() runs on `workers` threads; open() and close() run once.
+
+    prune_dir/skip_file are the stage's own walk filters (as passed to scan_files);
+    files they would have left out are passed on without calling process().
+    """
+
+    name = "stage"
+
+    def __init__(self, workers: int = 1, prune_dir=None, skip_file=None):
+        self.workers = max(1, workers)
+        self.prune_dir = prune_dir
+        self.skip_file = skip_file
+        self.failures = 0
+        self._failure_lock = threading.Lock()
+        self._pruned = {}  # Folder -> whether prune_dir drops it or one of its ancestors
+
+    def open(self, root: Path):
+        pass
+
+    def process(self, record: FileRecord):
+        pass
+
+    # --- completed is False when the run was interrupted or a stage crashed ---
+    def close(self, completed: bool):
+        pass
+
+    # --- Would this stage's own filters have left the file out of the walk? ---
+    def excludes(self, record: FileRecord) -> bool:
+        entry = record.entry
+        if self.prune_dir is not None:
+            folder = os.path.dirname(entry.path)
+            pruned = self._pruned.get(folder)
+            if pruned is None:
+                # Only the folders below the scanned root, which the walk itself would have tested
+                folders = Path(entry.path).parents[:len(entry.rel_parts) - 1]
+                pruned = any(self.prune_dir(_WalkEntry(p.name, str(p))) for p in folders)
+                self._pruned[folder] = pruned
+            if pruned:
+                return True
+        if self.skip_file is None:
+            return False
+        entry = record.current_entry()
+        return self.skip_file(_WalkEntry(entry.name, entry.path))
+
+    # --- process() raised for this file: later stages see record.error and leave the file alone ---
+    def fail(self, record: FileRecord, error: Exception):
+        with self._failure_lock:
+            self.failures += 1
+        print(f"❌ {self.name}: {record.path}: {error}", file=sys.stderr)
+
+
+# === Stages ===
+class DetectStage(Stage):
+    """Header sniff -> ffprobe -> libmagic for extensionless files (same rules as fix_unix.py)."""
+
+    name = "detect"
+
+    def __init__(self, cache: DetectionCache | None, workers: int = fix_unix.DEFAULT_PROBE_WORKERS):
+        super().__init__(workers, fix_unix._prune_dir, fix_unix._skip_file)
+        self.cache = cache
+
+    def process(self, record):
+        if fix_unix._is_candidate(record.entry):
+            record.candidate = True
+            record.detection = fix_unix.detect_file_type(record.entry, self.cache)
+
+    def fail(self, record, error):
+        # Reported (and counted) by the fix stage, which logs the file as an error
+        pass
+
+
+class InventoryStage(Stage):
+    """Writes the file_inventory.py row (CSV or Parquet) and, optionally, the catalogue entry."""
+
+    name = "inventory"
+
+    def __init__(self, output_path, cache: DetectionCache | None, catalogue: Catalogue | None = None,
+                 workers: int = 2):
+        super().__init__(workers, *file_inventory.make_filters(output_path))
+        self.output_path = output_path
+        self.cache = cache
+        self.catalogue = catalogue
+        self._lock = threading.Lock()
+        self._stack = None
+        self._writer = None
+        self._root = None
+
+    def open(self, root):
+        self._root = root
+        self._stack = ExitStack()
+        self._writer = self._stack.enter_context(file_inventory.open_inventory(self.output_path))
+        if self.catalogue is not None:
+            self.catalogue.begin_scan(root)
+
+    def process(self, record):
+        # Runs after the fix stage, so renamed files are listed under their new path and extension.
+        # MIME sniffing happens outside the lock; only the write is serialised
+        row = file_inventory.build_row(record.current_entry(), self.cache)
+        if row is None:
+            return
+        with self._lock:
+            file_inventory.count_row(row)
+            self._writer.writerow(row)
+        if self.catalogue is not None:
+            self.catalogue.add(row)
+
+    def close(self, completed):
+        self._stack.close()
+        if self.failures:
+            print(f"⚠️ {self.failures} files could not be added to the inventory")
+        # A partial scan must not delete catalogue rows it never got to
+        if self.catalogue is not None and completed:
+            self.catalogue.finish_scan(self._root)
+
+
+class FixStage(Stage):
+    """Renames or quarantines detected files like fix_unix.py: the same rename/undo logs and quarantine manifest,
+    renames recorded in the rename journal under this run's id, and --dry-run writing the rename plan.
+    """
+
+    name = "fix"
+
+    def __init__(self, dry_run: bool, rename_log="renamed_unix_files_log.csv", undo_log="undo_log.csv",
+                 workers: int = 1, quarantine_mode: str = "auto", journal_path=DEFAULT_JOURNAL_PATH,
+                 plan_path=fix_unix.DEFAULT_PLAN_PATH):
+        super().__init__(workers, fix_unix._prune_dir, fix_unix._skip_file)
+        self.dry_run = dry_run
+        self.quarantine = fix_unix.Quarantine(fix_unix.QUARANTINE_DIR, quarantine_mode)
+        self.rename_log = rename_log
+        self.undo_log = undo_log
+        self.journal_path = journal_path
+        self.plan_path = plan_path
+        self.run_id = new_run_id()
+        self._lock = threading.Lock()
+        self._files = []
+        self._plan = []
+        self._journal = None
+        self._journalled = frozenset()
+
+    def open(self, root):
+        self._files = [open(self.rename_log, 'w', newline='', encoding='utf-8'),
+                       open(self.undo_log, 'w', newline='', encoding='utf-8')]
+        self._log = fix_unix.FixLog(self._files[0])
+        self._undo_writer = csv.writer(self._files[1])
+        self._undo_writer.writerow(["New Path", "Original Path"])
+        self._names = NameRegistry()
+        if not self.dry_run:
+            # Lets a re-run after an interruption recognise renames the earlier run already made
+            self._journalled = journalled_renames(self.journal_path)
+            self._journal = RenameJournal(self.journal_path, self.run_id)
+
+    def process(self, record):
+        if not record.candidate:
+            return
+        # Fixes are serialised so the undo log rows stay in order
+        with self._lock:
+            if record.error:
+                self._log.write(record.path, "", "", "", f"Error: {record.error}")
+                return
+            try:
+                fix = fix_unix.plan_fix(record.path, record.detection, self._names)
+                if self.dry_run:
+                    fix_unix.log_dry_run(fix, self._log)
+                    self._plan.append(fix)
+                else:
+                    record.path = fix_unix.apply_fix(fix, self._log, self._undo_writer, self.quarantine,
+                                                     self._journal, self._journalled)
+            except Exception as e:
+                self._log.write(record.path, "", "", "", f"Error: {e}")
+
+    def close(self, completed):
+        for f in self._files:
+            f.close()
+        self.quarantine.close()
+        if self.dry_run:
+            fix_unix.save_plan(self._plan, self.plan_path)
+            print(f"📝 Plan saved to: {self.plan_path} (run fix_unix.py --apply {self.plan_path} to execute it)")
+        elif self._journal is not None:
+            self._journal.close()
+            print(f"🧾 Journal: {self.journal_path}, run {self.run_id} "
+                  f"(roll back with fix_unix.py --undo {self.journal_path})")
+        print(f"✅ Fix logs saved to: {self.rename_log}, {self.undo_log}")
+        fix_unix.print_summary(self._log.counts)
+
+
+class CopyByTypeStage(Stage):
+    """Copies files with the chosen extensions (or MIME classes) into staging/<ext>/, named after their relative path.
+
+    Selection and naming are batch_copy_by_type.py's, so both produce the same staging layout.
+    """
+
+    name = "copy"
+
+    def __init__(self, staging_root, extensions, dry_run: bool = False, workers: int = 4, mode: str = "copy",
+                 mime_classes=(), cache: DetectionCache | None = None):
+        super().__init__(workers)
+        self.mode = mode
+        self.staging_root = Path(staging_root).resolve()
+        self.selector = TypeSelector(extensions, mime_classes, cache)
+        self.dry_run = dry_run
+        self.copied = 0
+        self.names = NameRegistry()
+        self.meter = ProgressMeter()
+        self._lock = threading.Lock()
+        self._log = None
+
+    def open(self, root):
+        self.staging_root.mkdir(parents=True, exist_ok=True)
+        # Like batch_copy_by_type.py: never re-stage the workspace or the staging folder, wherever it is
+        excluded = {os.path.normcase(str(root / "workspace")), os.path.normcase(str(self.staging_root))}
+        self.prune_dir = lambda entry: os.path.normcase(entry.path) in excluded
+        self._log = open(self.staging_root / LOG_NAME, 'w', newline='', encoding='utf-8')
+        self._log_writer = csv.writer(self._log)
+        self._log_writer.writerow(["original_path", "new_path"])
+
+    def process(self, record):
+        if record.error:
+            return
+        entry = record.current_entry()
+        folder = self.selector.folder_for(entry.path, entry.stat)
+        if folder is None:
+            return
+        # Encode provenance into the filename, using the name after any fix-stage rename
+        ext_dir = self.staging_root / folder
+        dest_path = ext_dir / self.names.claim(ext_dir, staged_name(entry.rel_parts))
+        if not self.dry_run:
+            stage_file(record.path, dest_path, self.mode, self.meter.add_bytes)
+            self.meter.file_done()
+        with self._lock:
+            self._log_writer.writerow([str(record.path), str(dest_path)])
+            self.copied += 1
+
+    def fail(self, record, error):
+        super().fail(record, error)
+        with self._lock:
+            self._log_writer.writerow([str(record.path), f"Error: {error}"])
+
+    def close(self, completed):
+        self._log.close()
+        if not self.dry_run:
+            self.meter.finish()
+        action = "would be copied" if self.dry_run else "copied"
+        print(f"📦 {self.copied} files {action} to {self.staging_root}")
+        if self.failures:
+            print(f"⚠️ {self.failures} files failed to copy (listed in {self.staging_root / LOG_NAME})")
+
+
+# === Runner ===
+def _stage_worker(stage: Stage, inbox: queue.Queue, outbox: queue.Queue | None, remaining: list, lock):
+    while True:
+        record = inbox.get()
+        if record is _DONE:
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if not last:
+                inbox.put(_DONE)  # Wake the next sibling worker
+            elif outbox is not None:
+                outbox.put(_DONE)
+            return
+        try:
+            if not stage.excludes(record):
+                stage.process(record)
+        except Exception as e:
+            if record.error is None:
+                record.error = f"{stage.name}: {e}"
+            stage.fail(record, e)
+        if outbox is not None:
+            outbox.put(record)
+
+
+def run_pipeline(root, stages: list[Stage], prune_dir=None, skip_file=None,
+                 scan_workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE) -> int:
+    """Walk root once and push every file through the stages in order; returns the number of files seen.
+
+    The walk prunes what every stage's filters exclude, plus anything prune_dir/skip_file drop.
+    """
+    root = Path(root).resolve()
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads = []
+    completed = False
+    seen = 0
+
+    opened = []
+    try:
+        for stage in stages:
+            stage.open(root)
+            opened.append(stage)
+        for index, stage in enumerate(stages):
+            outbox = queues[index + 1] if index + 1 < len(stages) else None
+            remaining, lock = [stage.workers], threading.Lock()
+            for n in range(stage.workers):
+                thread = threading.Thread(target=_stage_worker, name=f"{stage.name}-{n}", daemon=True,
+                                          args=(stage, queues[index], outbox, remaining, lock))
+                thread.start()
+                threads.append(thread)
+
+        stage_prune, stage_skip = make_filters(stages)
+        walk_prune = stage_prune if prune_dir is None else lambda entry: prune_dir(entry) or stage_prune(entry)
+        walk_skip = stage_skip if skip_file is None else lambda entry: skip_file(entry) or stage_skip(entry)
+        for entry in scan_files(root, prune_dir=walk_prune, skip_file=walk_skip, workers=scan_workers):
+            queues[0].put(FileRecord(entry))
+            seen += 1
+        queues[0].put(_DONE)
+        for thread in threads:
+            thread.join()
+        completed = True
+    finally:
+        for stage in opened:
+            stage.close(completed)
+    return seen
+
+
+# --- Walk filters for a set of stages: drop only what every stage excludes (a stage without a filter keeps all) ---
+def make_filters(stages: list[Stage]):
+    prunes = [stage.prune_dir for stage in stages]
+    skips = [stage.skip_file for stage in stages]
+    prune_all = bool(prunes) and None not in prunes
+    skip_all = bool(skips) and None not in skips
+
+    def prune_dir(entry):
+        return prune_all and all(prune(entry) for prune in prunes)
+
+    def skip_file(entry):
+        return skip_all and all(skip(entry) for skip in skips)
+
+    return prune_dir, skip_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Walk an archive once and run detection, inventory, extension fixing and copy-by-type together.")
+    parser.add_argument("path", help="Root folder or drive to process")
+    parser.add_argument("--inventory", help="Write the inventory here (.csv or .parquet)")
+    parser.add_argument("--catalogue", help="Also update this SQLite catalogue (needs --inventory)")
+    parser.add_argument("--fix", action="store_true", help="Rename/quarantine extensionless files like fix_unix.py")
+    parser.add_argument("--quarantine-mode", choices=fix_unix.QUARANTINE_MODES, default="auto",
+                        help="How --fix quarantines unknown files: manifest only, or reflink/hard link/copy")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help="Append-only journal of --fix renames (roll back with fix_unix.py --undo)")
+    parser.add_argument("--plan", default=fix_unix.DEFAULT_PLAN_PATH, help="Where --fix --dry-run writes the rename plan")
+    parser.add_argument("--copy-ext", help="Copy these extensions (comma-separated, no dots) to the staging folder")
+    parser.add_argument("--copy-mime", help=f"Also copy these MIME classes ({', '.join(MIME_CLASSES)})")
+    parser.add_argument("--staging", help="Staging folder for --copy-ext (default: <path>/workspace/staging)")
+    parser.add_argument("--stage-mode", choices=STAGE_MODES, default=DEFAULT_STAGE_MODE,
+                        help="How --copy-ext stages files: reflink else copy (default), or auto to also try a hard link")
+    parser.add_argument("--dry-run", action="store_true", help="Log fixes and copies without touching any file")
+    parser.add_argument("--scan-workers", type=int, default=DEFAULT_WORKERS, help="Directories listed concurrently")
+    parser.add_argument("--detect-workers", type=int, default=fix_unix.DEFAULT_PROBE_WORKERS,
+                        help="Files detected concurrently (max ffprobe processes in flight)")
+    parser.add_argument("--inventory-workers", type=int, default=2, help="Inventory rows built concurrently")
+    parser.add_argument("--copy-workers", type=int, default=4, help="Files copied concurrently")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="Records buffered between stages")
+    parser.add_argument("--cache", default=str(DEFAULT_CACHE_PATH),
+                        help="SQLite file caching detection results between runs")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-detect every file")
+    args = parser.parse_args()
+
+    scan_path = Path(args.path)
+    if not scan_path.exists():
+        print(f"❌ Error: {scan_path} does not exist.")
+        sys.exit(1)
+    if not (args.inventory or args.fix or args.copy_ext or args.copy_mime):
+        print("❌ Error: nothing to do; pass --inventory, --fix and/or --copy-ext/--copy-mime.")
+        sys.exit(1)
+    if args.inventory and file_inventory.is_parquet(args.inventory) and not file_inventory.HAS_ARROW:
+        print("❌ Error: pyarrow is required for .parquet output (pip install pyarrow).")
+        sys.exit(1)
+
+    detect_cache = None if args.no_cache else DetectionCache(args.cache)
+    catalogue = Catalogue(args.catalogue) if args.catalogue and args.inventory else None
+
+    # Stages run in this order; detection only feeds the fix stage, and inventory/copy see post-fix paths
+    stages = []
+    if args.fix:
+        stages.append(DetectStage(detect_cache, workers=args.detect_workers))
+        stages.append(FixStage(args.dry_run, quarantine_mode=args.quarantine_mode, journal_path=args.journal,
+                               plan_path=args.plan))
+    if args.inventory:
+        stages.append(InventoryStage(args.inventory, detect_cache, catalogue, workers=args.inventory_workers))
+    staging_key = None
+    if args.copy_ext or args.copy_mime:
+        staging = args.staging or scan_path.resolve() / "workspace" / "staging"
+        # Files appear in the staging folder while the walk is running, so no stage may pick them up
+        staging_key = os.path.normcase(str(Path(staging).resolve()))
+        stages.append(CopyByTypeStage(staging, (args.copy_ext or "").split(","), dry_run=args.dry_run,
+                                      workers=args.copy_workers, mode=args.stage_mode,
+                                      mime_classes=(args.copy_mime or "").split(",") if args.copy_mime else (),
+                                      cache=detect_cache))
+
+    def prune_dir(entry):
+        return os.path.normcase(entry.path) == staging_key
+
+    try:
+        total = run_pipeline(scan_path, stages, prune_dir=prune_dir,
+                             scan_workers=args.scan_workers, queue_size=args.queue_size)
+    finally:
+        if detect_cache is not None:
+            detect_cache.close()
+        if catalogue is not None:
+            catalogue.close()
+
+    print(f"\n✅ Pipeline complete: {total} files walked once through {', '.join(s.name for s in stages)}")
+    if args.inventory:
+        print(f"📄 Inventory saved to: {args.inventory} ({file_inventory.total_files} rows)")
+    if detect_cache is not None:
+        print(f"🗃️ Detection cache: {detect_cache.hits} hits, {detect_cache.misses} misses ({detect_cache.db_path})")
+
+    failed = sum(stage.failures for stage in stages)
+    if failed:
+        print(f"❌ {failed} files failed in {', '.join(s.name for s in stages if s.failures)}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,212 @@
+import csv
+import errno
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+# --- Renames per journal commit: one fsync covers a whole batch of intents, across as many small directories ---
+# --- as it takes to fill it; outcomes ride along with the next commit (or the final sync on close) ---
+JOURNAL_BATCH = 1000
+DEFAULT_RENAME_WORKERS = 8
+DEFAULT_JOURNAL_PATH = "rename_journal.csv"
+# --- Run selectors for undo: the most recent apply, or everything ever journalled ---
+LATEST_RUN = "latest"
+ALL_RUNS = "all"
+
+
+class Rename(NamedTuple):
+    src: Path
+    dst: Path
+
+
+# --- Sortable id for one apply (or undo) run, e.g. 20240131T154502-4711 ---
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+
+class RenameJournal:
+    """Append-only CSV of (run, state, src, dst) rows, fsync'd before every batch is renamed.
+
+    "begin" rows are synced before a batch is renamed; "done"/"failed" rows after it are
+    only written, and reach the disk with the next batch's sync or on close. An interrupted
+    run therefore leaves at worst begun renames whose outcome can be read back off the
+    filesystem. Rollbacks append "undone" rows. Every row carries the id of the run that
+    wrote it, so an undo can be limited to one run.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, run_id: str | None = None):
+        self.path = Path(path)
+        self.run_id = run_id or new_run_id()
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._lock = threading.Lock()
+
+    # --- sync=False leaves the rows to the next synced write or close() ---
+    def write(self, rows: Iterable[tuple[str, Path, Path]], sync: bool = True):
+        rows = [(self.run_id, *row) for row in rows]
+        if not rows:
+            return
+        with self._lock:
+            self._writer.writerows(rows)
+            if sync:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _journal_rows(path) -> Iterator[tuple[str, str, Rename]]:
+    if not os.path.exists(path):
+        return
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if len(row) == 4:
+                run_id, state, src, dst = row
+            elif len(row) == 3:
+                run_id, (state, src, dst) = "", row  # Journal written before rows carried a run id
+            else:
+                continue  # Torn final line from an interrupted write
+            yield run_id, state, Rename(Path(src), Path(dst))
+
+
+# --- Every journalled rename with the run that last began it and its latest state, oldest first ---
+def _journal_state(path) -> dict[Rename, tuple[str, str]]:
+    last_state = {}
+    for run_id, state, rename in _journal_rows(path):
+        if state == "begin":
+            # Re-inserting moves a re-applied rename to its latest position, under its latest run
+            last_state.pop(rename, None)
+            last_state[rename] = (run_id, state)
+        elif rename in last_state:
+            last_state[rename] = (last_state[rename][0], state)
+    return last_state
+
+
+# --- Ids of the runs that applied renames, oldest first ---
+def journal_runs(path=DEFAULT_JOURNAL_PATH) -> list[str]:
+    runs = {}
+    for run_id, state, _ in _journal_rows(path):
+        if state == "begin":
+            runs.pop(run_id, None)
+            runs[run_id] = True
+    return list(runs)
+
+
+# --- Renames an earlier run began and nothing has rolled back: the only ones that may already be applied ---
+def journalled_renames(path=DEFAULT_JOURNAL_PATH) -> set[Rename]:
+    return set(read_journal(path, ALL_RUNS))
+
+
+# --- Renames a rollback should reverse, oldest first: begun by the chosen run and not since failed or undone ---
+def read_journal(path=DEFAULT_JOURNAL_PATH, run: str = LATEST_RUN) -> list[Rename]:
+    if run == LATEST_RUN:
+        runs = journal_runs(path)
+        if not runs:
+            return []
+        run = runs[-1]
+    return [rename for rename, (run_id, state) in _journal_state(path).items()
+            if state in ("begin", "done") and run in (ALL_RUNS, run_id)]
+
+
+# --- Work units: a directory's renames stay together and in order on one worker, and small directories are ---
+# --- packed into units of up to batch_size renames so they share a journal sync; units still cover every worker ---
+def _by_directory(renames: Iterable[Rename], workers: int, batch_size: int) -> list[list[Rename]]:
+    directories = defaultdict(list)
+    for rename in renames:
+        directories[rename.dst.parent].append(rename)
+    total = sum(len(group) for group in directories.values())
+    unit_size = max(1, min(batch_size, -(-total // max(1, workers))))
+    units = [[]]
+    for group in directories.values():
+        if units[-1] and len(units[-1]) + len(group) > unit_size:
+            units.append([])
+        units[-1].extend(group)
+    return [unit for unit in units if unit]
+
+
+# --- Apply renames through an open journal, in order; batch_size renames per sync ---
+def apply_renames(renames: list[Rename], journal: RenameJournal, batch_size: int = JOURNAL_BATCH,
+                  journalled: set[Rename] = frozenset()) -> list[tuple]:
+    results = []
+    for start in range(0, len(renames), batch_size):
+        batch = renames[start:start + batch_size]
+        journal.write(("begin", *rename) for rename in batch)
+        outcomes = []
+        for rename in batch:
+            try:
+                if os.path.lexists(rename.dst):
+                    if rename in journalled and not os.path.lexists(rename.src):
+                        # Applied by an earlier, interrupted run of the same plan; without a
+                        # journalled begin, dst is some other file (e.g. from a stale plan)
+                        outcomes.append(("done", rename, "already renamed", None))
+                        continue
+                    raise FileExistsError(errno.EEXIST, "target already exists", str(rename.dst))
+                os.rename(rename.src, rename.dst)
+                outcomes.append(("done", rename, "renamed", None))
+            except OSError as e:
+                outcomes.append(("failed", rename, "failed", e))
+        journal.write(((state, *rename) for state, rename, _, _ in outcomes), sync=False)
+        results.extend((rename, outcome, error) for _, rename, outcome, error in outcomes)
+    return results
+
+
+def _undo_group(renames: list[Rename], journal: RenameJournal, batch_size: int, journalled=None) -> list[tuple]:
+    results = []
+    for start in range(0, len(renames), batch_size):
+        batch = renames[start:start + batch_size]
+        undone = []
+        for rename in batch:
+            try:
+                if os.path.lexists(rename.src):
+                    # Never applied, or already rolled back by an interrupted undo
+                    results.append((rename, "already restored", None))
+                    continue
+                os.rename(rename.dst, rename.src)
+                undone.append(rename)
+                results.append((rename, "restored", None))
+            except OSError as e:
+                results.append((rename, "failed", e))
+        # Unsynced like apply outcomes: a lost "undone" row is read back as "already restored"
+        journal.write((("undone", *rename) for rename in undone), sync=False)
+    return results
+
+
+def _run(work, renames: list[Rename], journal: RenameJournal, workers: int, batch_size: int,
+         journalled: set[Rename] | None = None) -> Iterator:
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="rename") as pool:
+        futures = [pool.submit(work, unit, journal, batch_size, journalled)
+                   for unit in _by_directory(renames, workers, batch_size)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+# --- Apply renames through the journal; yields (rename, outcome, error) with outcome renamed/already renamed/failed ---
+def execute_renames(renames: Iterable[Rename], journal_path=DEFAULT_JOURNAL_PATH,
+                    workers: int = DEFAULT_RENAME_WORKERS, batch_size: int = JOURNAL_BATCH,
+                    run_id: str | None = None) -> Iterator[tuple]:
+    journalled = journalled_renames(journal_path)
+    with RenameJournal(journal_path, run_id) as journal:
+        yield from _run(apply_renames, renames, journal, workers, batch_size, journalled)
+
+
+# --- Roll back one run's renames (the latest by default, or ALL_RUNS), newest first; safe to re-run ---
+def undo_renames(journal_path=DEFAULT_JOURNAL_PATH, workers: int = DEFAULT_RENAME_WORKERS,
+                 batch_size: int = JOURNAL_BATCH, run: str = LATEST_RUN) -> Iterator[tuple]:
+    renames = read_journal(journal_path, run)
+    renames.reverse()
+    with RenameJournal(journal_path) as journal:
+        yield from _run(_undo_group, renames, journal, workers, batch_size)
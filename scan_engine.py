@@ -0,0 +1,175 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+# --- Default number of directories listed concurrently ---
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+# --- One file found by the walker; stat comes from the DirEntry (None if it could not be read) ---
+class ScanEntry(NamedTuple):
+    path: str
+    name: str
+    rel_parts: tuple[str, ...]
+    stat: os.stat_result | None
+
+
+# --- List a single directory: return its kept files and the subdirectories still to descend ---
+def _scan_dir(dir_path: str, rel_parts: tuple[str, ...],
+              prune_dir: Callable[[os.DirEntry], bool] | None,
+              skip_file: Callable[[os.DirEntry], bool] | None):
+    files = []
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if prune_dir is None or not prune_dir(entry):
+                            subdirs.append((entry.path, rel_parts + (entry.name,)))
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+
+                if skip_file is not None and skip_file(entry):
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    stat = None
+                files.append(ScanEntry(entry.path, entry.name, rel_parts + (entry.name,), stat))
+    except OSError:
+        # Unreadable directory (permissions, vanished drive, etc.)
+        pass
+    return files, subdirs
+
+
+# --- Breadth-first fan-out shared by the walkers: visit(dir_path, rel_parts) -> (result, subdirs) ---
+def _walk(root: str, visit: Callable, workers: int) -> Iterator:
+    if workers <= 1:
+        stack = [(root, ())]
+        while stack:
+            result, subdirs = visit(*stack.pop())
+            yield result
+            stack.extend(reversed(subdirs))
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        pending = {pool.submit(visit, root, ())}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, subdirs = future.result()
+                for dir_path, rel_parts in subdirs:
+                    pending.add(pool.submit(visit, dir_path, rel_parts))
+                yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# --- Walk a tree with os.scandir, pruning directories before descending into them ---
+def scan_files(root, prune_dir: Callable[[os.DirEntry], bool] | None = None,
+               skip_file: Callable[[os.DirEntry], bool] | None = None,
+               workers: int = DEFAULT_WORKERS) -> Iterator[ScanEntry]:
+    """Yield every regular file under root that survives prune_dir/skip_file.
+
+    Subtrees are listed concurrently on a thread pool when workers > 1, so the
+    order of the yielded entries is not deterministic across runs.
+    """
+    def visit(dir_path, rel_parts):
+        return _scan_dir(dir_path, rel_parts, prune_dir, skip_file)
+
+    for files in _walk(os.fspath(root), visit, workers):
+        yield from files
+
+
+# --- What a directory held when it was last listed; an unchanged mtime means the same entries ---
+class DirState(NamedTuple):
+    mtime_ns: int
+    subdirs: tuple[str, ...]
+    files: tuple[str, ...]
+
+
+# --- One directory visited by scan_changed; listed is False when its entries came from DirState ---
+class DirScan(NamedTuple):
+    path: str
+    state: DirState | None
+    files: list[ScanEntry]
+    listed: bool
+
+
+# --- Rebuild a directory's entries from its last DirState, optionally re-statting each file ---
+def _known_files(dir_path: str, rel_parts: tuple[str, ...], names: tuple[str, ...], stat_files: bool):
+    files = []
+    for name in names:
+        path = os.path.join(dir_path, name)
+        stat = None
+        if stat_files:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            except OSError:
+                pass
+        files.append(ScanEntry(path, name, rel_parts + (name,), stat))
+    return files
+
+
+# --- Walk a tree, re-listing only directories whose mtime moved since known[dir_path] was recorded ---
+def scan_changed(root, known: dict[str, DirState],
+                 prune_dir: Callable[[os.DirEntry], bool] | None = None,
+                 skip_file: Callable[[os.DirEntry], bool] | None = None,
+                 workers: int = DEFAULT_WORKERS, stat_unchanged: bool = True) -> Iterator[DirScan]:
+    """Yield a DirScan for every directory under root.
+
+    Adding, removing or renaming an entry bumps its parent directory's mtime, so a
+    directory whose mtime matches its DirState still holds the same names and is
+    not listed again. Editing a file in place does not touch the directory, which
+    is why files in unchanged directories are re-statted unless stat_unchanged is
+    False (their ScanEntry.stat is then None). Every directory is still stat'ed,
+    because a change deep in a subtree does not propagate to its ancestors.
+    """
+    def visit(dir_path, rel_parts):
+        try:
+            mtime_ns = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            return DirScan(dir_path, None, [], True), []
+
+        state = known.get(dir_path)
+        if state is not None and state.mtime_ns == mtime_ns:
+            files = _known_files(dir_path, rel_parts, state.files, stat_unchanged)
+            subdirs = [(os.path.join(dir_path, name), rel_parts + (name,)) for name in state.subdirs]
+            return DirScan(dir_path, state, files, False), subdirs
+
+        files, subdirs = _scan_dir(dir_path, rel_parts, prune_dir, skip_file)
+        state = DirState(mtime_ns, tuple(parts[-1] for _, parts in subdirs), tuple(f.name for f in files))
+        return DirScan(dir_path, state, files, True), subdirs
+
+    yield from _walk(os.fspath(root), visit, workers)
+
+
+# --- Run fn over items on a bounded pool, yielding (item, future) in input order ---
+def ordered_map(fn: Callable, items: Iterable, workers: int, window: int | None = None) -> Iterator[tuple]:
+    """Keep at most `window` calls in flight and hand results back in the order items arrived.
+
+    Callers call future.result() themselves, so an exception raised by fn surfaces
+    at the matching item instead of aborting the whole run.
+    """
+    window = window or workers * 4
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="detect") as pool:
+        in_flight = deque()
+        try:
+            for item in items:
+                in_flight.append((item, pool.submit(fn, item)))
+                if len(in_flight) >= window:
+                    yield in_flight.popleft()
+            while in_flight:
+                yield in_flight.popleft()
+        finally:
+            for _, future in in_flight:
+                future.cancel()
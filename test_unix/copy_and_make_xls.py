@@ -1,11 +1,18 @@
+import argparse
 import csv
-import shutil
 from pathlib import Path
 
+from copy_engine import stage_file, DEFAULT_STAGE_MODE, STAGE_MODES, STAGE_VERBS
+
 input_csv = "unix_files.csv"
 output_dir = Path("D:/workspace/staging/xls")
 log_csv = "copied_and_renamed_log.csv"
 
+parser = argparse.ArgumentParser(description="Stage extensionless files from unix_files.csv as .xls copies.")
+parser.add_argument("--mode", choices=STAGE_MODES, default=DEFAULT_STAGE_MODE,
+                    help="reflink (default) = reflink, else copy; auto also tries a hard link, which shares the original")
+args = parser.parse_args()
+
 output_dir.mkdir(parents=True, exist_ok=True)
 
 with open(input_csv, newline='', encoding='utf-8') as infile, \
@@ -33,8 +40,8 @@ with open(input_csv, newline='', encoding='utf-8') as infile, \
                 writer.writerow([original_path, dest_path, "Skipped (already exists)"])
                 continue
 
-            shutil.copy2(original_path, dest_path)
-            writer.writerow([original_path, dest_path, "Copied and renamed"])
+            method = stage_file(original_path, dest_path, args.mode)
+            writer.writerow([original_path, dest_path, f"{STAGE_VERBS[method]} and renamed"])
         except Exception as e:
             writer.writerow([original_path, "", f"Error: {e}"])
 
@@ -1,8 +1,16 @@
-import magic
+import argparse
 from pathlib import Path
 import csv
 import sys
 
+from catalogue import Catalogue
+
+try:
+    import magic
+    HAS_MAGIC = True
+except ImportError:
+    HAS_MAGIC = False
+
 
 def scan_for_excel_like_unix_files(scan_path: Path, output_file: str):
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
@@ -21,15 +29,40 @@ def scan_for_excel_like_unix_files(scan_path: Path, output_file: str):
     print(f"\n✅ Scan complete. Results saved to: {output_file}")
 
 
+# --- Same list from the inventory catalogue: an indexed lookup on (extension, MIME type), no rescan ---
+def list_excel_like_unix_files(catalogue_path, output_file: str):
+    with Catalogue(catalogue_path) as catalogue, open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Full Path", "File Name", "Detected Type"])
+        count = 0
+        for row in catalogue.extensionless_excel_like():
+            writer.writerow(row)
+            count += 1
+
+    print(f"\n✅ {count} files found in catalogue. Results saved to: {output_file}")
+
+
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python is_unix.py /path/to/scan")
+    parser = argparse.ArgumentParser(description="List extensionless files that look like Excel/OLE2 workbooks.")
+    parser.add_argument("scan_path", nargs="?", help="Folder to scan with libmagic")
+    parser.add_argument("--catalogue", help="Query this SQLite catalogue from file_inventory.py instead of scanning")
+    parser.add_argument("--output", default="unix_files.csv", help="Where to write the list")
+    args = parser.parse_args()
+
+    if args.catalogue:
+        list_excel_like_unix_files(args.catalogue, args.output)
+        sys.exit(0)
+
+    if not args.scan_path:
+        print("Usage: python is_unix.py /path/to/scan  (or --catalogue workspace/catalogue.sqlite)")
         sys.exit(1)
 
-    scan_dir = Path(sys.argv[1])
+    scan_dir = Path(args.scan_path)
     if not scan_dir.exists():
         print(f"❌ Error: {scan_dir} does not exist.")
         sys.exit(1)
+    if not HAS_MAGIC:
+        print("❌ Error: python-magic is required to scan (or use --catalogue).")
+        sys.exit(1)
 
-    output_csv = "unix_files.csv"
-    scan_for_excel_like_unix_files(scan_dir, output_csv)
+    scan_for_excel_like_unix_files(scan_dir, args.output)
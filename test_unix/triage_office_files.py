@@ -1,21 +1,27 @@
+import argparse
 import csv
-import shutil
 from pathlib import Path
 
+from copy_engine import stage_file, DEFAULT_STAGE_MODE, STAGE_MODES, STAGE_VERBS
+from extension_map import load_extension_map, DEFAULT_MAPPING_PATH
+
 # Input and output paths
 input_csv = "unix_files.csv"
 base_output_dir = Path("D:/workspace/staging/")
 log_csv = "triage_log.csv"
 
-# Map detected strings to extension
-EXTENSION_MAP = {
-    "Excel": "xls",
-    "Word": "doc",
-    "PowerPoint": "ppt",
-    "Access": "mdb",
-    "Outlook": "msg",
-    "Composite Document File": "unknown",  # could be anything Office
-}
+parser = argparse.ArgumentParser(description="Stage files from unix_files.csv into per-type folders with an assigned extension.")
+parser.add_argument("--mode", choices=STAGE_MODES, default=DEFAULT_STAGE_MODE,
+                    help="reflink (default) = reflink, else copy; auto also tries a hard link, which shares the original")
+parser.add_argument("--mapping", default=DEFAULT_MAPPING_PATH,
+                    help="YAML file mapping detected types to extensions")
+args = parser.parse_args()
+
+# Detected type (libmagic description or MIME type) → extension, from extension_map.yaml.
+# Only the Office formats are triaged, and without fix_unix.py's whole-result fallbacks
+# ("data" → xls); generic OLE2 containers and everything else go to "unknown"
+OFFICE_EXTENSIONS = ("xls", "doc", "ppt", "mdb", "msg")
+EXTENSIONS = load_extension_map(args.mapping, generic_ext="unknown", exact=False, extensions=OFFICE_EXTENSIONS)
 
 # Fallback if nothing matches
 DEFAULT_EXT = "unknown"
@@ -46,11 +52,7 @@ with open(input_csv, newline='', encoding='utf-8') as infile, \
             continue
 
         # Determine best match extension
-        assigned_ext = DEFAULT_EXT
-        for keyword, ext in EXTENSION_MAP.items():
-            if keyword in file_type:
-                assigned_ext = ext
-                break
+        assigned_ext = EXTENSIONS.from_magic(file_type) or DEFAULT_EXT
 
         output_subdir = base_output_dir / assigned_ext
         output_subdir.mkdir(parents=True, exist_ok=True)
@@ -63,8 +65,8 @@ with open(input_csv, newline='', encoding='utf-8') as infile, \
                 writer.writerow([original_path, dest_path, file_type, assigned_ext, "Skipped (already exists)"])
                 continue
 
-            shutil.copy2(original_path, dest_path)
-            writer.writerow([original_path, dest_path, file_type, assigned_ext, "Copied and renamed"])
+            method = stage_file(original_path, dest_path, args.mode)
+            writer.writerow([original_path, dest_path, file_type, assigned_ext, f"{STAGE_VERBS[method]} and renamed"])
         except Exception as e:
             writer.writerow([original_path, "", file_type, assigned_ext, f"Error: {e}"])
 